@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Bounded LRU/TTL cache of generated answers, looked up by meaning.
+
+    Entries are scoped to the set of documents a query searched. A lookup
+    is a nearest-neighbour search over the cached query embeddings of that
+    scope; it is a hit only when the best cosine similarity reaches
+    min_similarity and the answer was generated from the same grounded
+    chunks, so a paraphrase that retrieves different evidence still goes
+    to the LLM. Entries for a document must be invalidated whenever its
+    content changes.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 3600, min_similarity: float = 0.95):
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.min_similarity = min_similarity
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        # scope -> (entry keys, stacked query vectors), rebuilt lazily
+        self._matrices = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, entry):
+        return self.ttl_seconds is not None and time.monotonic() - entry["stored_at"] > self.ttl_seconds
+
+    def _drop(self, keys):
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._matrices.pop(entry["scope"], None)
+
+    def _matrix(self, scope):
+        if scope not in self._matrices:
+            keys = [key for key, entry in self._entries.items() if entry["scope"] == scope]
+            vectors = (
+                np.vstack([self._entries[key]["vector"] for key in keys])
+                if keys else np.zeros((0, 0), dtype=np.float32)
+            )
+            self._matrices[scope] = (keys, vectors)
+
+        return self._matrices[scope]
+
+    def get(self, scope, query_vector, chunk_keys):
+        """
+        Cached answer for a query embedding in a document scope,
+        or None. chunk_keys are the (doc_id, chunk_id) grounding it.
+        """
+        scope = tuple(scope)
+        chunk_keys = frozenset(chunk_keys)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+
+        with self._lock:
+            keys, vectors = self._matrix(scope)
+
+            if keys:
+                similarities = vectors @ query_vector
+
+                for position in np.argsort(-similarities):
+                    if similarities[position] < self.min_similarity:
+                        break
+
+                    key = keys[position]
+                    entry = self._entries[key]
+
+                    if self._expired(entry):
+                        continue
+
+                    if entry["chunk_keys"] == chunk_keys:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return entry["answer"]
+
+                self._drop([key for key in keys if self._expired(self._entries[key])])
+
+            self.misses += 1
+            return None
+
+    def put(self, scope, query_vector, chunk_keys, answer):
+        scope = tuple(scope)
+
+        with self._lock:
+            self._entries[self._next_key] = {
+                "scope": scope,
+                "vector": np.asarray(query_vector, dtype=np.float32),
+                "chunk_keys": frozenset(chunk_keys),
+                "answer": answer,
+                "stored_at": time.monotonic(),
+            }
+            self._next_key += 1
+            self._matrices.pop(scope, None)
+
+            while len(self._entries) > self.max_size:
+                self._drop([next(iter(self._entries))])
+
+    def invalidate_document(self, doc_id) -> int:
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if doc_id in entry["scope"]]
+            self._drop(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "min_similarity": self.min_similarity,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Process-wide answer cache, or None when RAG_ANSWER_CACHE_SIZE is 0.
+    """
+    global _answer_cache
+
+    max_size = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "2048"))
+
+    if max_size <= 0:
+        return None
+
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                max_size=max_size,
+                ttl_seconds=float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600")),
+                min_similarity=float(os.getenv("RAG_ANSWER_CACHE_MIN_SIMILARITY", "0.95")),
+            )
+
+    return _answer_cache
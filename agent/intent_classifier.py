@@ -1,4 +1,17 @@
-from llm.response_generator import generate_text
+import json
+import os
+import threading
+
+import numpy as np
+
+from llm.response_generator import agenerate_text, generate_text
+from retrieval.model_registry import MODEL_NAME, get_embedding_model
+from retrieval.query_cache import get_query_cache
+from utils import tracing
+
+INTENT_LABELS = ("ACTION", "INFORMATION")
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.json")
 
 INTENT_PROMPT = """
 You are an enterprise IT assistant.
@@ -13,10 +26,162 @@ User input:
 Return ONLY the category name.
 """
 
+
+def intent_mode() -> str:
+    """
+    RAG_INTENT_CLASSIFIER: "off" (default, always INFORMATION), "local"
+    (embedding classifier, LLM for low-confidence queries) or "llm"
+    (every query). Run evaluation/eval_intent.py and set
+    RAG_INTENT_MIN_MARGIN from its report before enabling "local".
+    """
+    mode = os.getenv("RAG_INTENT_CLASSIFIER", "off").strip().lower()
+    return mode if mode in {"local", "llm", "off"} else "off"
+
+
+def load_examples(path=EXAMPLES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        examples = json.load(f)
+
+    return {label: list(examples.get(label, [])) for label in INTENT_LABELS}
+
+
+def _parse_intent(result: str):
+    # None when the LLM is unreachable or answers off-script
+    result = result.strip().upper()
+    return result if result in INTENT_LABELS else None
+
+
+def _llm_intent(query: str):
+    return _parse_intent(generate_text(INTENT_PROMPT.format(query=query), max_new_tokens=8))
+
+
+async def allm_intent(query: str):
+    """
+    _llm_intent() on the async client, so the fallback never holds a thread.
+    """
+    return _parse_intent(await agenerate_text(INTENT_PROMPT.format(query=query), max_new_tokens=8))
+
+
+def classify_intent_llm(query: str) -> str:
+    return _llm_intent(query) or "INFORMATION"
+
+
+class LocalIntentClassifier:
+    """
+    Nearest-centroid intent classifier over the shared query embedder.
+
+    Each label's centroid is the normalized mean embedding of its labeled
+    examples. Confidence is the cosine margin between the best and second
+    best centroid; below min_margin the caller asks the LLM instead.
+    Query vectors go through the query embedding cache, so the retrieval
+    that follows an INFORMATION decision does not encode the query again.
+    """
+
+    def __init__(self, examples=None, model_name=MODEL_NAME, min_margin=None):
+        if min_margin is None:
+            min_margin = float(os.getenv("RAG_INTENT_MIN_MARGIN", "0.02"))
+
+        self.model_name = model_name
+        self.model = get_embedding_model(model_name)
+        self.min_margin = min_margin
+        self.query_cache = get_query_cache()
+
+        examples = examples if examples is not None else load_examples()
+        self.labels = [label for label in INTENT_LABELS if examples.get(label)]
+
+        if len(self.labels) < 2:
+            raise ValueError("intent examples need at least two labels")
+
+        centroids = []
+        for label in self.labels:
+            vectors = self.model.encode(examples[label], normalize_embeddings=True)
+            centroid = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+
+        self.centroids = np.vstack(centroids)
+
+    def _encode(self, query):
+        vector = self.query_cache.get(self.model_name, query) if self.query_cache is not None else None
+
+        if vector is None:
+            vector = np.asarray(
+                self.model.encode([query], normalize_embeddings=True),
+                dtype=np.float32,
+            )[0]
+            if self.query_cache is not None:
+                self.query_cache.put(self.model_name, query, vector)
+
+        return vector
+
+    def predict(self, query: str):
+        """
+        (label, margin) for one query.
+        """
+        scores = self.centroids @ self._encode(query)
+        order = np.argsort(-scores)
+
+        return self.labels[order[0]], float(scores[order[0]] - scores[order[1]])
+
+    def is_confident(self, margin: float) -> bool:
+        return margin >= self.min_margin
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> LocalIntentClassifier:
+    """
+    Process-wide classifier; example centroids are embedded on first use.
+    """
+    global _classifier
+
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = LocalIntentClassifier()
+
+    return _classifier
+
+
+def llm_fallback_enabled() -> bool:
+    return os.getenv("RAG_INTENT_LLM_FALLBACK", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+
+def local_intent(query: str):
+    """
+    (label, ask_llm): the local decision, and whether it should be
+    replaced by the LLM's answer (LLM-only mode or a low-confidence query).
+    """
+    mode = intent_mode()
+
+    if mode == "off":
+        return "INFORMATION", False
+
+    if mode == "llm":
+        return "INFORMATION", True
+
+    classifier = get_intent_classifier()
+    label, margin = classifier.predict(query)
+    tracing.annotate(margin=round(margin, 4))
+
+    ask_llm = not classifier.is_confident(margin) and llm_fallback_enabled()
+
+    if ask_llm:
+        tracing.annotate(fallback="llm")
+
+    return label, ask_llm
+
+
 def classify_intent(query: str) -> str:
-    result = generate_text(INTENT_PROMPT.format(query=query), max_new_tokens=8).strip().upper()
+    """
+    ACTION or INFORMATION. Locally classified queries cost one (cached)
+    embedding; only low-confidence ones make the LLM round-trip.
+    """
+    label, ask_llm = local_intent(query)
 
-    if result not in ("ACTION", "INFORMATION"):
-        return "INFORMATION"
+    if ask_llm:
+        label = _llm_intent(query) or label
 
-    return result
+    return label
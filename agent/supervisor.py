@@ -1,17 +1,37 @@
+import asyncio
+import contextvars
+import functools
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from agent.answer_cache import get_answer_cache
+from agent.intent_classifier import allm_intent, classify_intent, local_intent
 from agent.prompt_builder import build_prompt
 from agent.refusal import refusal_response
 
+from ingestion.document_cache import (
+    add_removed_chunks,
+    add_supplement,
+    delete_runtime_payload,
+    list_persisted_documents,
+    load_runtime_payload,
+)
 from llm.client_factory import create_generation_client
+from llm.token_counter import get_token_counter
 
-from retrieval.retriever import Retriever
+from retrieval.document_store import DocumentStore
+from retrieval.rerank_cache import get_rerank_cache
+from retrieval.rerank_cascade import RerankCascade
 from retrieval.reranker import Reranker
-from retrieval.context_builder import build_context
+from retrieval.context_builder import ContextPacker, build_context
+from utils import tracing
+from utils.helpers import text_digest
 
 
-def classify_intent(_query: str) -> str:
-    return "INFORMATION"
+def _releasable(answer, refusal):
+    # Streamed output that may still turn into the refusal sentence is held back
+    return not refusal.startswith(answer.strip())
 
 
 class AgentSupervisor:
@@ -20,10 +40,10 @@ class AgentSupervisor:
 
         print("Initializing Agent Supervisor...")
 
-        self.retriever = None
-        self.tables_raw = []
-        self.doc_loaded = False
         self.max_context_chunks = int(os.getenv("RAG_MAX_CONTEXT_CHUNKS", "5"))
+        self.initial_top_k = int(os.getenv("RAG_INITIAL_TOP_K", "25"))
+        # With BM25 fusion, first-stage recall is higher so fewer candidates reach the reranker
+        self.fused_top_k = int(os.getenv("RAG_FUSED_TOP_K", "15"))
         self.min_retriever_score = float(os.getenv("RAG_MIN_RETRIEVER_SCORE", "0.15"))
 
         rerank_threshold = os.getenv("RAG_MIN_RERANK_SCORE", "").strip()
@@ -32,46 +52,223 @@ class AgentSupervisor:
         self.debug_retrieval = os.getenv("RAG_DEBUG_RETRIEVAL", "").strip().lower() in {
             "1", "true", "yes", "on"
         }
+        self.debug_timings = tracing.timings_enabled()
+
+        self.store = DocumentStore(
+            initial_top_k=self.initial_top_k,
+            fused_top_k=self.fused_top_k,
+        )
+        # Most recent upload; queries without document_ids target it
+        self.active_document_id = None
 
         self.reranker = Reranker()
+        self.cascade = RerankCascade(
+            max_context_chunks=self.max_context_chunks,
+            min_retriever_score=self.min_retriever_score,
+        )
+        self.packer = ContextPacker()
+        self.answer_cache = get_answer_cache()
+        # Runs the CPU-bound stages (encode, search, rerank) for ahandle()
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_CPU_WORKERS", "4")),
+            thread_name_prefix="rag-cpu",
+        )
         self.generation_client, self.generation_error = create_generation_client(task="generation")
         self.hf_client = self.generation_client
 
-    def set_active_document(self, index, metadata, tables_raw):
+    def _invalidate_rerank_scores(self, doc_id):
+
+        rerank_cache = get_rerank_cache()
+
+        if rerank_cache is not None:
+            rerank_cache.invalidate_document(doc_id)
 
-        self.retriever = Retriever(
-            index_object=index,
-            metadata_object=metadata,
-            initial_top_k=25
+    def _invalidate_answers(self, doc_id):
+
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_document(doc_id)
+
+    def add_document(self, doc_id, payload, name=None, activate=True):
+        """
+        Payloads read back from the document cache also carry the
+        supplements appended and chunks removed since ingest; both are
+        replayed so a re-upload matches what a restart would load.
+        """
+        # Replaced content: cached cross-encoder scores for its chunk ids are stale
+        if doc_id in self.store:
+            self._invalidate_rerank_scores(doc_id)
+
+        self._invalidate_answers(doc_id)
+
+        self.store.add_document(
+            doc_id,
+            payload["embeddings"],
+            payload["metadata"],
+            payload["tables"],
+            lexical_index=payload.get("bm25"),
+            name=name,
         )
 
-        self.tables_raw = tables_raw or []
-        self.doc_loaded = True
+        for supplement_id in payload.get("supplements", []):
+            supplement = load_runtime_payload(supplement_id)
+            if supplement is not None:
+                self.append_to_document(doc_id, supplement)
+
+        if payload.get("removed_chunks"):
+            self.store.remove_chunks(doc_id, payload["removed_chunks"])
+
+        if activate or self.active_document_id is None:
+            self.active_document_id = doc_id
+
+    def append_to_document(self, doc_id, payload, supplement_id=None):
+
+        # Supplement pages join the existing document without a rebuild
+        prefix = self.store.append_to_document(
+            doc_id,
+            payload["embeddings"],
+            payload["metadata"],
+            payload["tables"],
+            lexical_index=payload.get("bm25"),
+        )
+        self._invalidate_answers(doc_id)
+
+        if supplement_id:
+            add_supplement(doc_id, supplement_id)
+
+        return prefix
+
+    def remove_chunks(self, doc_id, chunk_ids):
+
+        chunk_ids = list(chunk_ids)
+        removed = self.store.remove_chunks(doc_id, chunk_ids)
+        self._invalidate_answers(doc_id)
+
+        # Restores and other workers' loads replay removals from the manifest
+        if removed:
+            add_removed_chunks(doc_id, chunk_ids)
+
+        return removed
+
+    def _load_persisted(self, doc_id, activate=False):
+
+        payload = load_runtime_payload(doc_id)
+
+        if payload is None:
+            return False
+
+        self.add_document(doc_id, payload, name=payload.get("name"), activate=activate)
+
+        return True
+
+    def _ensure_documents(self, doc_ids):
+
+        # Documents ingested by another worker or before a restart live on disk
+        for doc_id in doc_ids or []:
+            if doc_id not in self.store:
+                self._load_persisted(doc_id)
+
+    def restore_documents(self, limit=None):
+
+        manifests = list_persisted_documents()
+
+        # Supplements are replayed into their parent document
+        supplements = {s for manifest in manifests for s in manifest.get("supplements", [])}
+        manifests = [m for m in manifests if m["document_id"] not in supplements]
+
+        if limit:
+            manifests = manifests[-limit:]
+
+        return sum(self._load_persisted(m["document_id"], activate=True) for m in manifests)
+
+    def set_active_document(self, index, metadata, tables_raw, lexical_index=None, doc_id="default"):
+
+        # Single-document entry point: vectors are read back from the index
+        self.add_document(
+            doc_id,
+            {
+                "embeddings": index.reconstruct_n(0, index.ntotal),
+                "metadata": metadata,
+                "tables": tables_raw,
+                "bm25": lexical_index,
+            },
+        )
+
+    def remove_document(self, doc_id):
+        """
+        Remove a document from this worker and from persisted storage, so
+        restarts and other workers' lazy loads no longer bring it back.
+        Other workers that already hold it in memory keep it until they
+        restart.
+        """
+        removed = self.store.remove_document(doc_id)
+        removed = delete_runtime_payload(doc_id) or removed
+        self._invalidate_rerank_scores(doc_id)
+        self._invalidate_answers(doc_id)
+
+        if removed and self.active_document_id == doc_id:
+            remaining = self.store.document_ids()
+            self.active_document_id = remaining[-1] if remaining else None
+
+        return removed
+
+    def list_documents(self):
+
+        return [
+            {**doc, "active": doc["document_id"] == self.active_document_id}
+            for doc in self.store.describe()
+        ]
+
+    def has_document(self, doc_id):
+
+        self._ensure_documents([doc_id])
+        return doc_id in self.store
 
     def has_active_document(self):
 
-        return self.doc_loaded and self.retriever is not None
+        return len(self.store) > 0
 
-    def _load_tables(self, table_ids):
+    def resolve_document_ids(self, document_ids=None):
+        """
+        None -> the active document, "all" / "*" -> every document,
+        a string -> that document, a list -> that set. Anything else
+        raises ValueError.
+        """
+        if document_ids is None:
+            return [self.active_document_id] if self.active_document_id else None
 
-        if not table_ids:
-            return []
+        if isinstance(document_ids, str):
+            if document_ids.strip().lower() in {"all", "*"}:
+                return None
+            return [document_ids]
 
-        loaded_tables = []
+        if not isinstance(document_ids, (list, tuple)) or not all(isinstance(d, str) for d in document_ids):
+            raise ValueError("document_ids must be a document id, a list of ids or \"all\"")
 
-        for table in self.tables_raw:
+        return list(document_ids)
 
-            if table.get("id") not in table_ids:
-                continue
+    def _cached_answer(self, snapshot, query, doc_ids, grounded_results):
+        """
+        (cache lookup arguments, cached answer or None); the arguments are
+        None when answer caching is off or the query cannot be embedded.
+        Chunks are keyed by content too: IDs repeat when a document is
+        replaced while this request still holds the old snapshot.
+        """
+        if self.answer_cache is None:
+            return None, None
+
+        query_vector = snapshot.encode_query(query)
+
+        if query_vector is None:
+            return None, None
 
-            if table.get("table_type") == "structured":
-                html = table.get("table_html")
-                if html:
-                    loaded_tables.append(html)
-            elif table.get("raw_text"):
-                loaded_tables.append(table.get("raw_text"))
+        scope = sorted(doc_ids if doc_ids is not None else snapshot.document_ids(), key=str)
+        chunk_keys = [
+            (item.get("doc_id"), item.get("chunk_id"), text_digest(item.get("chunk_text", "")))
+            for item in grounded_results
+        ]
+        lookup = (scope, query_vector, chunk_keys)
 
-        return loaded_tables
+        return lookup, self.answer_cache.get(*lookup)
 
     def _select_grounded_matches(self, ranked_results):
 
@@ -94,14 +291,21 @@ class AgentSupervisor:
 
         return grounded_matches
 
-    def _log_retrieval(self, candidates, ranked_results, grounded_results):
+    def _log_retrieval(self, candidates, ranked_results, grounded_results, cascade=None):
 
         if not self.debug_retrieval:
             return
 
+        query_cache = getattr(getattr(self.store, "retriever", None), "query_cache", None)
+        rerank_cache = getattr(self.reranker, "score_cache", None)
+
         print(
             "RAG retrieval debug:",
             {
+                "query_cache": query_cache.stats() if query_cache is not None else None,
+                "rerank_cache": rerank_cache.stats() if rerank_cache is not None else None,
+                "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+                "cascade": cascade,
                 "candidate_count": len(candidates),
                 "ranked_count": len(ranked_results),
                 "grounded_count": len(grounded_results),
@@ -111,7 +315,8 @@ class AgentSupervisor:
                 "top_candidates": [
                     {
                         "chunk_id": item.get("chunk_id"),
-                        "score": round(float(item.get("score", 0.0)), 4),
+                        "score": round(float(item.get("score") or 0.0), 4),
+                        "bm25_score": item.get("bm25_score"),
                         "rerank_score": round(float(item.get("rerank_score", 0.0)), 4),
                         "pages": item.get("pages", []),
                         "section": item.get("section", ""),
@@ -121,138 +326,421 @@ class AgentSupervisor:
             },
         )
 
-    def handle(self, query: str):
+    def _classify(self, query):
 
-        intent = classify_intent(query)
+        with tracing.span("intent"):
+            return classify_intent(query)
 
-        if intent == "ACTION":
+    async def _aclassify(self, query):
+
+        # Only the local embedding step uses the CPU pool; an LLM fallback
+        # is awaited on the event loop so it cannot stall retrieval
+        with tracing.span("intent"):
+            intent, ask_llm = await self._in_executor(local_intent, query, executor=self.executor)
 
-            try:
-                raw_output = self.generation_client.generate(query)
-            except self.generation_error:
-                return {
-                    "type": "action",
-                    "answer": "Model temporarily unavailable."
-                }
+            if ask_llm:
+                intent = await allm_intent(query) or intent
 
-            import json
+        return intent
 
-            try:
-                extracted = json.loads(raw_output)
+    def _generate(self, prompt):
 
-                if not isinstance(extracted, dict):
-                    raise ValueError("Output must be a dictionary")
+        with tracing.span("generate"):
+            return self.generation_client.generate(prompt)
 
-            except Exception:
-                extracted = {
-                    "department": "IT",
-                    "issue_summary": query,
-                    "priority": "Medium"
-                }
+    def _with_timings(self, response, trace):
 
+        if not self.debug_timings:
+            return response
+
+        return {**response, "timings": trace.timings()}
+
+    def _handle_action(self, query):
+
+        try:
+            raw_output = self._generate(query)
+        except self.generation_error:
             return {
                 "type": "action",
-                "action": "create_ticket",
-                "department": extracted.get("department", "IT"),
-                "description": extracted.get("issue_summary", query),
-                "priority": extracted.get("priority", "Medium")
+                "answer": "Model temporarily unavailable."
             }
 
+        return self._action_response(query, raw_output)
+
+    def _action_response(self, query, raw_output):
+
+        import json
+
+        try:
+            extracted = json.loads(raw_output)
+
+            if not isinstance(extracted, dict):
+                raise ValueError("Output must be a dictionary")
+
+        except Exception:
+            extracted = {
+                "department": "IT",
+                "issue_summary": query,
+                "priority": "Medium"
+            }
+
+        return {
+            "type": "action",
+            "action": "create_ticket",
+            "department": extracted.get("department", "IT"),
+            "description": extracted.get("issue_summary", query),
+            "priority": extracted.get("priority", "Medium")
+        }
+
+    def _prepare_answer(self, query, document_ids=None):
+        """
+        Retrieval, reranking, grounding and prompt assembly.
+        Returns (final response, None) when no generation is needed,
+        otherwise (None, (prompt, answer cache lookup)).
+        """
+        # Named documents may only be on disk (cold worker, another worker's upload)
+        doc_ids = self.resolve_document_ids(document_ids)
+        self._ensure_documents(doc_ids)
+
         if not self.has_active_document():
             return {
                 "type": "information",
                 "answer": "Please upload a PDF first."
-            }
+            }, None
 
-        candidates = self.retriever.retrieve(query)
+        # Every read below uses this snapshot, whatever uploads land meanwhile
+        snapshot = self.store.snapshot()
+        candidates = snapshot.retrieve(query, doc_ids=doc_ids)
 
         if not candidates:
             return {
                 "type": "information",
                 "answer": refusal_response()
-            }
-
-        ranked_results = self.reranker.rerank(
-            query,
-            candidates,
-            top_k=7
-        )
+            }, None
+
+        # Refusal-bound queries never reach the cross-encoder
+        with tracing.span("rerank", candidates=len(candidates)) as rerank_span:
+            ranked_results, cascade = self.cascade.run(
+                query,
+                candidates,
+                self.reranker,
+                top_k=7
+            )
+            rerank_span["reranked"] = cascade.get("reranked")
 
         if not ranked_results:
+            self._log_retrieval(candidates, ranked_results, [], cascade)
             return {
                 "type": "information",
                 "answer": refusal_response()
-            }
+            }, None
 
         grounded_results = self._select_grounded_matches(ranked_results)
-        self._log_retrieval(candidates, ranked_results, grounded_results)
+        self._log_retrieval(candidates, ranked_results, grounded_results, cascade)
 
         if not grounded_results:
             return {
                 "type": "information",
                 "answer": refusal_response()
-            }
+            }, None
 
-        context_payload = build_context(grounded_results)
-        context_items = context_payload.get("context", [])
+        with tracing.span("context_build"):
+            context_payload = build_context(grounded_results)
+            context_items = context_payload.get("context", [])
 
         if not context_items:
+            return {
+                "type": "information",
+                "answer": refusal_response()
+            }, None
+
+        # Same question (or a paraphrase) over the same evidence: skip the LLM
+        with tracing.span("answer_cache") as cache_span:
+            cache_lookup, cached_answer = self._cached_answer(snapshot, query, doc_ids, grounded_results)
+            cache_span["hit"] = cached_answer is not None
+
+        if cached_answer is not None:
+            return {
+                "type": "information",
+                "answer": cached_answer,
+                "cached": True
+            }, None
+
+        # Overlapping windows merged, evidence and tables fitted to the token budget
+        with tracing.span("context_pack") as pack_span:
+            packed = self.packer.pack(
+                context_items[:self.max_context_chunks],
+                get_token_counter(),
+                snapshot.table_texts,
+            )
+            pack_span["tokens"] = packed["stats"]["tokens"]
+
+        if self.debug_retrieval:
+            print("RAG context debug:", packed["stats"])
+
+        with tracing.span("prompt_build"):
+            prompt = build_prompt(
+                question=query,
+                section_text=packed["text"],
+                tables=packed["tables"],
+                page="Unknown",
+            )
+
+        return None, (prompt, cache_lookup)
+
+    def _finish_answer(self, answer, cache_lookup):
+
+        if not answer:
             return {
                 "type": "information",
                 "answer": refusal_response()
             }
 
-        top_matches = context_items[:self.max_context_chunks]
+        if answer.strip() == "Information not found in the document.":
+            return {
+                "type": "information",
+                "answer": refusal_response()
+            }
 
-        context_parts = []
+        if cache_lookup is not None:
+            self.answer_cache.put(*cache_lookup, answer.strip())
 
-        for chunk in top_matches:
-            pages = chunk.get("pages", [])
-            page_str = ", ".join(str(p) for p in pages) if pages else "Unknown"
-            text = chunk.get("text", "").strip()
+        return {
+            "type": "information",
+            "answer": answer.strip(),
+            "cached": False
+        }
 
-            if text:
-                context_parts.append(
-                    f"[Source: Page {page_str}]\n{text}"
-                )
+    def handle(self, query: str, document_ids=None):
 
-        merged_text = "\n\n---\n\n".join(context_parts)
+        with tracing.trace("query") as trace:
+            response = self._handle(query, document_ids)
 
-        table_ids = set()
+        return self._with_timings(response, trace)
 
-        for chunk in top_matches:
-            table_ids.update(chunk.get("tables", []))
+    def _handle(self, query, document_ids=None):
 
-        raw_tables = self._load_tables(table_ids)
+        intent = self._classify(query)
 
-        prompt = build_prompt(
-            question=query,
-            section_text=merged_text,
-            tables=raw_tables,
-            page="Unknown",
-        )
+        if intent == "ACTION":
+            return self._handle_action(query)
+
+        response, generation = self._prepare_answer(query, document_ids)
+
+        if response is not None:
+            return response
+
+        prompt, cache_lookup = generation
 
         try:
-            answer = self.generation_client.generate(prompt)
+            answer = self._generate(prompt)
         except self.generation_error:
             return {
                 "type": "information",
                 "answer": "Model temporarily unavailable."
             }
 
-        if not answer:
-            return {
+        return self._finish_answer(answer, cache_lookup)
+
+    def handle_stream(self, query: str, document_ids=None):
+        """
+        Streaming variant of handle(): yields ("token", text) events while
+        the LLM generates, then one ("done", response) event carrying the
+        same response handle() would return. Grounding and refusal checks
+        apply to the full answer, so the final event is authoritative.
+        """
+        # The trace is only activated around our own work, never across a yield
+        trace = tracing.Trace("query_stream")
+
+        with trace.active():
+            if self._classify(query) == "ACTION":
+                response, generation = self._handle_action(query), None
+            else:
+                response, generation = self._prepare_answer(query, document_ids)
+
+        if response is not None:
+            yield "done", self._with_timings(response, trace.finish())
+            return
+
+        prompt, cache_lookup = generation
+        stream = getattr(self.generation_client, "generate_stream", None)
+
+        if stream is None:
+            stream = lambda text: iter([self.generation_client.generate(text)])
+
+        refusal = refusal_response()
+        answer = ""
+        held = 0
+        started = time.perf_counter()
+
+        try:
+            with trace.active():
+                tokens = iter(stream(prompt))
+
+            while True:
+                with trace.active():
+                    text = next(tokens, None)
+
+                if text is None:
+                    break
+
+                if not answer:
+                    trace.record("first_token", time.perf_counter() - started)
+
+                answer += text
+
+                if _releasable(answer, refusal):
+                    yield "token", answer[held:]
+                    held = len(answer)
+
+        except self.generation_error:
+            trace.record("generate", time.perf_counter() - started, failed=True)
+            yield "done", self._with_timings({
                 "type": "information",
-                "answer": refusal_response()
+                "answer": "Model temporarily unavailable."
+            }, trace.finish())
+            return
+
+        trace.record("generate", time.perf_counter() - started)
+
+        yield "done", self._with_timings(self._finish_answer(answer, cache_lookup), trace.finish())
+
+    # ------------------------------------------------
+    # asyncio path
+    # ------------------------------------------------
+
+    async def _in_executor(self, fn, *args, executor=None):
+
+        # run_in_executor does not carry context variables (the active trace) over
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(context.run, fn, *args))
+
+    async def _agenerate(self, prompt):
+
+        with tracing.span("generate"):
+            agenerate = getattr(self.generation_client, "agenerate", None)
+
+            if agenerate is None:
+                # Blocking client: keep it off the CPU pool
+                return await self._in_executor(self.generation_client.generate, prompt)
+
+            return await agenerate(prompt)
+
+    def _astream(self, prompt):
+
+        stream = getattr(self.generation_client, "agenerate_stream", None)
+
+        if stream is not None:
+            return stream(prompt)
+
+        async def whole_answer():
+            yield await self._agenerate(prompt)
+
+        return whole_answer()
+
+    async def _ahandle_action(self, query):
+
+        try:
+            raw_output = await self._agenerate(query)
+        except self.generation_error:
+            return {
+                "type": "action",
+                "answer": "Model temporarily unavailable."
             }
 
-        if answer.strip() == "Information not found in the document.":
+        return self._action_response(query, raw_output)
+
+    async def ahandle(self, query: str, document_ids=None):
+        """
+        handle() for asyncio servers: CPU stages run on self.executor and
+        generation awaits the client's async API, so one event loop can keep
+        many LLM calls in flight.
+        """
+        with tracing.trace("query") as trace:
+            response = await self._ahandle(query, document_ids)
+
+        return self._with_timings(response, trace)
+
+    async def _ahandle(self, query, document_ids=None):
+
+        intent = await self._aclassify(query)
+
+        if intent == "ACTION":
+            return await self._ahandle_action(query)
+
+        response, generation = await self._in_executor(
+            self._prepare_answer, query, document_ids, executor=self.executor
+        )
+
+        if response is not None:
+            return response
+
+        prompt, cache_lookup = generation
+
+        try:
+            answer = await self._agenerate(prompt)
+        except self.generation_error:
             return {
                 "type": "information",
-                "answer": refusal_response()
+                "answer": "Model temporarily unavailable."
             }
 
-        return {
-            "type": "information",
-            "answer": answer.strip()
-        }
+        return self._finish_answer(answer, cache_lookup)
+
+    async def astream(self, query: str, document_ids=None):
+        """
+        handle_stream() as an async generator.
+        """
+        trace = tracing.Trace("query_stream")
+
+        with trace.active():
+            if await self._aclassify(query) == "ACTION":
+                response, generation = await self._ahandle_action(query), None
+            else:
+                response, generation = await self._in_executor(
+                    self._prepare_answer, query, document_ids, executor=self.executor
+                )
+
+        if response is not None:
+            yield "done", self._with_timings(response, trace.finish())
+            return
+
+        prompt, cache_lookup = generation
+
+        refusal = refusal_response()
+        answer = ""
+        held = 0
+        started = time.perf_counter()
+
+        try:
+            with trace.active():
+                tokens = self._astream(prompt)
+
+            while True:
+                with trace.active():
+                    text = await anext(tokens, None)
+
+                if text is None:
+                    break
+
+                if not answer:
+                    trace.record("first_token", time.perf_counter() - started)
+
+                answer += text
+
+                if _releasable(answer, refusal):
+                    yield "token", answer[held:]
+                    held = len(answer)
+
+        except self.generation_error:
+            trace.record("generate", time.perf_counter() - started, failed=True)
+            yield "done", self._with_timings({
+                "type": "information",
+                "answer": "Model temporarily unavailable."
+            }, trace.finish())
+            return
+
+        trace.record("generate", time.perf_counter() - started)
+
+        yield "done", self._with_timings(self._finish_answer(answer, cache_lookup), trace.finish())
@@ -0,0 +1,232 @@
+import json
+import os
+import traceback
+
+from a2wsgi import WSGIMiddleware
+
+from web_app import INVALID_DOCUMENT_IDS, _sse, agent, app as flask_app, valid_document_ids
+
+
+# Chat bodies are small JSON documents; uploads go through Flask
+MAX_CHAT_BODY = 1024 * 1024
+
+# Every other route (upload, documents, legacy /chat) is served by the
+# Flask app on a bounded thread pool
+wsgi_app = WSGIMiddleware(flask_app, workers=int(os.getenv("RAG_WSGI_THREADS", "8")))
+
+
+# =========================================================
+# HELPERS
+# =========================================================
+
+async def _read_json(receive):
+
+    body = b""
+
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+
+        if len(body) > MAX_CHAT_BODY:
+            return None
+
+        if not message.get("more_body"):
+            break
+
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+
+    return data if isinstance(data, dict) else {}
+
+
+async def _send_json(send, status, payload):
+
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _error(code, message):
+
+    return {
+        "success": False,
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }
+
+
+async def _chat_request(receive, send):
+    """
+    (query, document_ids), or None once an error response has been sent.
+    """
+
+    data = await _read_json(receive)
+
+    if data is None:
+        await _send_json(send, 413, _error("REQUEST_TOO_LARGE", "Request body too large."))
+        return None
+
+    query = str(data.get("query", "")).strip()
+
+    if not query:
+        await _send_json(send, 400, _error("EMPTY_QUERY", "Query cannot be empty"))
+        return None
+
+    document_ids = data.get("document_ids", data.get("document_id"))
+
+    if not valid_document_ids(document_ids):
+        await _send_json(send, 400, INVALID_DOCUMENT_IDS)
+        return None
+
+    return query, document_ids
+
+
+# =========================================================
+# CHAT
+# =========================================================
+
+async def chat(receive, send):
+
+    request = await _chat_request(receive, send)
+
+    if request is None:
+        return
+
+    query, document_ids = request
+
+    if not document_ids and not agent.has_active_document():
+
+        await _send_json(send, 200, {
+            "success": True,
+            "data": {
+                "type": "information",
+                "answer": "Please upload a PDF first."
+            }
+        })
+        return
+
+    response = await agent.ahandle(query, document_ids=document_ids)
+
+    await _send_json(send, 200, {"success": True, "data": response})
+
+
+async def chat_stream(receive, send):
+
+    request = await _chat_request(receive, send)
+
+    if request is None:
+        return
+
+    query, document_ids = request
+
+    if not document_ids and not agent.has_active_document():
+        await _send_json(send, 409, _error("DOCUMENT_NOT_READY", "Please upload a PDF first."))
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+
+    async def emit(text):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    try:
+        async for event, payload in agent.astream(query, document_ids=document_ids):
+
+            if event == "token":
+                await emit(_sse("token", {"text": payload}))
+            else:
+                await emit(_sse("done", {"success": True, "data": payload}))
+
+    except Exception:
+        traceback.print_exc()
+        await emit(_sse("error", _error("INTERNAL_ERROR", "Internal server error")))
+
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+ROUTES = {
+    ("POST", "/api/v1/chat"): chat,
+    ("POST", "/api/v1/chat/stream"): chat_stream,
+}
+
+
+# =========================================================
+# ASGI APP
+# =========================================================
+
+async def _lifespan(receive, send):
+
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            agent.executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    Chat routes run natively on the event loop (agent.ahandle / astream);
+    everything else is delegated to the Flask app.
+    """
+
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    handler = ROUTES.get((scope.get("method"), scope.get("path")))
+
+    if scope["type"] == "http" and handler is not None:
+
+        response = {"started": False, "ended": False}
+
+        async def tracked_send(message):
+
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif not message.get("more_body"):
+                response["ended"] = True
+
+            await send(message)
+
+        try:
+            await handler(receive, tracked_send)
+        except Exception:
+            traceback.print_exc()
+
+            # A response can only start once: a stream already under way
+            # is ended with an SSE error event instead of a new 500
+            if not response["started"]:
+                await _send_json(send, 500, _error("INTERNAL_ERROR", "Internal server error"))
+            elif not response["ended"]:
+                await send({
+                    "type": "http.response.body",
+                    "body": _sse("error", _error("INTERNAL_ERROR", "Internal server error")).encode("utf-8"),
+                    "more_body": False,
+                })
+
+        return
+
+    await wsgi_app(scope, receive, send)
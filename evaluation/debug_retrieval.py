@@ -1,15 +1,16 @@
 import os
 import sys
-import json
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
 
-# ---------------- CONFIG (MATCH INGESTION EXACTLY) ----------------
-MODEL_NAME = "BAAI/bge-base-en"
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from retrieval.model_registry import MODEL_NAME
+from retrieval.retriever import Retriever
 
+# ---------------- CONFIG (MATCH INGESTION EXACTLY) ----------------
 FAISS_INDEX_PATH = "data/processed/chunks.faiss"
-METADATA_PATH = "data/processed/chunks_meta.json"
+METADATA_PATH = "data/processed/chunks_meta"
 
 TOP_K = 5
 # ------------------------------------------------------------------
@@ -20,31 +21,21 @@ def debug_retrieval(query: str):
     print(f"🔎 QUERY: {query}")
     print("==============================\n")
 
-    # 1️⃣ Load FAISS index
-    index = faiss.read_index(FAISS_INDEX_PATH)
-
-    # 2️⃣ Load metadata
-    with open(METADATA_PATH, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-
-    # 3️⃣ Load SAME embedding model used at ingestion
-    model = SentenceTransformer(MODEL_NAME)
-
-    # 4️⃣ Embed query
-    query_embedding = model.encode(
-        [query],
-        normalize_embeddings=True
-    ).astype(np.float32)
-
-    # 5️⃣ Search
-    scores, indices = index.search(query_embedding, TOP_K)
+    # 1️⃣ Open memory-mapped index + columnar metadata with the SAME embedding model
+    retriever = Retriever(
+        index_path=FAISS_INDEX_PATH,
+        meta_path=METADATA_PATH,
+        initial_top_k=TOP_K,
+        model_name=MODEL_NAME,
+    )
 
-    # 6️⃣ Display results
-    for rank, (idx, score) in enumerate(zip(indices[0], scores[0]), start=1):
-        chunk = metadata[idx]
+    # 2️⃣ Embed query + search
+    results = retriever.retrieve(query)
 
+    # 3️⃣ Display results
+    for rank, chunk in enumerate(results, start=1):
         print(f"--- Rank {rank} ---")
-        print(f"Score   : {float(score):.4f}")
+        print(f"Score   : {chunk['score']:.4f}")
         print(f"Section : {chunk.get('section')}")
         print(f"Pages   : {chunk.get('pages')}")
         print("\nChunk Text:")
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from agent.intent_classifier import LocalIntentClassifier, classify_intent_llm
+
+# ---------------- CONFIG ----------------
+QUERIES_PATH = os.path.join(ROOT_DIR, "evaluation", "intent_queries.json")
+
+# Margins reported so RAG_INTENT_MIN_MARGIN can be tuned from one run
+MARGINS = (0.0, 0.01, 0.02, 0.03, 0.05, 0.08)
+# ----------------------------------------
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _latency(label, seconds):
+    ms = [s * 1000.0 for s in seconds]
+    print(
+        f"{label:<22} p50 {_percentile(ms, 0.5):8.2f} ms   "
+        f"p95 {_percentile(ms, 0.95):8.2f} ms   mean {sum(ms) / len(ms):8.2f} ms"
+    )
+
+
+def eval_intent(with_llm=False):
+    with open(QUERIES_PATH, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+
+    started = time.perf_counter()
+    # No query cache: every timed query is a cold embedding
+    classifier = LocalIntentClassifier()
+    classifier.query_cache = None
+    print(f"Classifier ready in {time.perf_counter() - started:.2f}s ({len(cases)} labeled queries)\n")
+
+    predictions = []
+    local_seconds = []
+
+    for case in cases:
+        started = time.perf_counter()
+        label, margin = classifier.predict(case["query"])
+        local_seconds.append(time.perf_counter() - started)
+        predictions.append((case, label, margin))
+
+    llm_labels = {}
+    llm_seconds = []
+
+    if with_llm:
+        for case in cases:
+            started = time.perf_counter()
+            llm_labels[case["query"]] = classify_intent_llm(case["query"])
+            llm_seconds.append(time.perf_counter() - started)
+
+    print("margin  local-confident  fallback  accuracy")
+
+    for threshold in MARGINS:
+        correct = 0
+        fallbacks = 0
+
+        for case, label, margin in predictions:
+            if margin < threshold:
+                fallbacks += 1
+                if with_llm:
+                    label = llm_labels[case["query"]]
+            correct += label == case["intent"]
+
+        suffix = "" if with_llm or not fallbacks else "  (fallbacks kept local label)"
+        print(
+            f"{threshold:6.2f}  {len(cases) - fallbacks:15d}  {fallbacks:8d}  "
+            f"{correct / len(cases):8.1%}{suffix}"
+        )
+
+    print()
+    _latency("local classifier", local_seconds)
+
+    if with_llm:
+        llm_correct = sum(llm_labels[case["query"]] == case["intent"] for case in cases)
+        _latency("LLM classifier", llm_seconds)
+        print(f"\nLLM-only accuracy: {llm_correct / len(cases):.1%}")
+
+    errors = [(case, label, margin) for case, label, margin in predictions if label != case["intent"]]
+
+    if errors:
+        print("\nLocal misclassifications:")
+        for case, label, margin in errors:
+            print(f"  [{case['intent']} -> {label}, margin {margin:.3f}] {case['query']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intent classifier accuracy / latency report")
+    parser.add_argument("--llm", action="store_true", help="also time the LLM classifier (network calls)")
+    args = parser.parse_args()
+
+    eval_intent(with_llm=args.llm)
@@ -0,0 +1,277 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from retrieval.bm25 import BM25Index
+from retrieval.chunk_store import ChunkStore
+from retrieval.model_registry import MODEL_NAME, RERANKER_MODEL_NAME
+
+CACHE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+_manifest_lock = threading.Lock()
+
+
+def persistence_enabled() -> bool:
+    return os.getenv("RAG_PERSIST_DOCUMENTS", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+
+def document_root() -> str:
+    return os.getenv("RAG_DOCUMENT_DIR", "/tmp/rag_cache/documents")
+
+
+def document_dir(document_id: str) -> str:
+    if not document_id or not all(c in "0123456789abcdef" for c in document_id):
+        raise ValueError(f"Invalid document id: {document_id!r}")
+    return os.path.join(document_root(), document_id)
+
+
+def save_runtime_payload(document_id: str, payload: dict, name: str = None):
+    """
+    Persist everything ingest_pdf_to_runtime produced under the PDF's SHA-256:
+
+    <root>/<sha256>/
+      manifest.json, embeddings.npy, chunks_meta/ (ChunkStore),
+      tables_raw.json, bm25.npz
+
+    No FAISS index is stored: documents are searched through the
+    DocumentStore's merged index, built from the embeddings.
+
+    Written to a scratch directory first and renamed into place, so readers
+    never see a half-written document.
+    """
+    if not persistence_enabled():
+        return None
+
+    target = document_dir(document_id)
+
+    if os.path.exists(os.path.join(target, MANIFEST_FILE)):
+        return target
+
+    os.makedirs(document_root(), exist_ok=True)
+    scratch = os.path.join(document_root(), f".{document_id}.{uuid.uuid4().hex[:8]}")
+    os.makedirs(scratch)
+
+    try:
+        np.save(os.path.join(scratch, "embeddings.npy"), np.asarray(payload["embeddings"], dtype=np.float32))
+        ChunkStore.from_records(payload["metadata"]).save(os.path.join(scratch, "chunks_meta"))
+
+        with open(os.path.join(scratch, "tables_raw.json"), "w", encoding="utf-8") as f:
+            json.dump(payload.get("tables") or [], f, ensure_ascii=False)
+
+        if payload.get("bm25") is not None:
+            payload["bm25"].save(os.path.join(scratch, "bm25.npz"))
+
+        with open(os.path.join(scratch, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": CACHE_VERSION,
+                    "document_id": document_id,
+                    "name": name,
+                    "model_name": MODEL_NAME,
+                    "reranker_model_name": RERANKER_MODEL_NAME,
+                    "chunks": len(payload["metadata"]),
+                    "created_at": time.time(),
+                },
+                f,
+                indent=2,
+            )
+
+        os.rename(scratch, target)
+
+    except OSError:
+        # Another worker persisted the same PDF first
+        shutil.rmtree(scratch, ignore_errors=True)
+        if not os.path.exists(os.path.join(target, MANIFEST_FILE)):
+            raise
+
+    except Exception:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+
+    return target
+
+
+def load_manifest(document_id: str):
+    try:
+        path = os.path.join(document_dir(document_id), MANIFEST_FILE)
+    except ValueError:
+        return None
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != CACHE_VERSION or manifest.get("model_name") != MODEL_NAME:
+        return None
+
+    # Stored reranker token IDs only fit the tokenizer they were made with
+    if manifest.get("reranker_model_name", RERANKER_MODEL_NAME) != RERANKER_MODEL_NAME:
+        return None
+
+    return manifest
+
+
+@contextmanager
+def _locked_document(document_id: str):
+    # Exclusive flock on the document's .lock: worker processes updating
+    # the same manifest take turns instead of overwriting each other
+    with _manifest_lock:
+        if fcntl is None:
+            yield
+            return
+
+        with open(os.path.join(document_dir(document_id), LOCK_FILE), "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _update_manifest(document_id: str, update) -> bool:
+    """
+    Apply update(manifest) to a stored manifest; it returns whether
+    anything changed. Read, update and atomic rename all happen under
+    the document's lock.
+    """
+    if load_manifest(document_id) is None:
+        return False
+
+    with _locked_document(document_id):
+        manifest = load_manifest(document_id)
+
+        if manifest is None:
+            return False
+
+        if update(manifest):
+            path = os.path.join(document_dir(document_id), MANIFEST_FILE)
+            scratch = f"{path}.{uuid.uuid4().hex[:8]}"
+
+            with open(scratch, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+
+            os.replace(scratch, path)
+
+    return True
+
+
+def _add_unique(manifest, key, values):
+    current = manifest.setdefault(key, [])
+    added = [value for value in values if value not in current]
+    current.extend(added)
+    return bool(added)
+
+
+def add_supplement(document_id: str, supplement_id: str) -> bool:
+    """
+    Record that a stored PDF was appended to a stored document,
+    so restoring the document replays the supplement.
+    """
+    return _update_manifest(document_id, lambda manifest: _add_unique(manifest, "supplements", [supplement_id]))
+
+
+def add_removed_chunks(document_id: str, chunk_ids) -> bool:
+    """
+    Record chunks removed from a stored document (IDs as the store knows
+    them, supplement prefixes included), so restoring it removes them again.
+    """
+    chunk_ids = list(chunk_ids)
+    return _update_manifest(document_id, lambda manifest: _add_unique(manifest, "removed_chunks", chunk_ids))
+
+
+def load_runtime_payload(document_id: str):
+    """
+    Stored payload in the ingest_pdf_to_runtime shape (metadata as a
+    memory-mapped ChunkStore), or None on a miss.
+    """
+    if not persistence_enabled():
+        return None
+
+    manifest = load_manifest(document_id)
+
+    if manifest is None:
+        return None
+
+    root = document_dir(document_id)
+
+    with open(os.path.join(root, "tables_raw.json"), "r", encoding="utf-8") as f:
+        tables_raw = json.load(f)
+
+    bm25_path = os.path.join(root, "bm25.npz")
+
+    return {
+        "document_id": document_id,
+        "name": manifest.get("name"),
+        "supplements": manifest.get("supplements", []),
+        "removed_chunks": manifest.get("removed_chunks", []),
+        "bm25": BM25Index.load(bm25_path) if os.path.exists(bm25_path) else None,
+        "embeddings": np.load(os.path.join(root, "embeddings.npy"), mmap_mode="r"),
+        "metadata": ChunkStore.load(os.path.join(root, "chunks_meta")),
+        "tables": tables_raw,
+    }
+
+
+def delete_runtime_payload(document_id: str) -> bool:
+    """
+    Delete a stored document, and those of its supplements no other stored
+    document uses. The directory is renamed aside first, so readers see
+    either the whole document or none of it.
+    """
+    if not persistence_enabled():
+        return False
+
+    try:
+        target = document_dir(document_id)
+    except ValueError:
+        return False
+
+    supplements = (load_manifest(document_id) or {}).get("supplements", [])
+    trash = os.path.join(document_root(), f".{document_id}.deleted.{uuid.uuid4().hex[:8]}")
+
+    try:
+        os.rename(target, trash)
+    except FileNotFoundError:
+        # Never stored, or another worker deleted it first
+        return False
+
+    shutil.rmtree(trash, ignore_errors=True)
+
+    in_use = {s for manifest in list_persisted_documents() for s in manifest.get("supplements", [])}
+
+    for supplement_id in supplements:
+        if supplement_id not in in_use:
+            delete_runtime_payload(supplement_id)
+
+    return True
+
+
+def list_persisted_documents():
+    """
+    Manifests of every stored document, oldest first.
+    """
+    root = document_root()
+
+    if not os.path.isdir(root):
+        return []
+
+    manifests = [load_manifest(name) for name in os.listdir(root) if not name.startswith(".")]
+    manifests = [manifest for manifest in manifests if manifest]
+
+    return sorted(manifests, key=lambda manifest: manifest.get("created_at", 0))
@@ -2,19 +2,53 @@
 import os
 import tempfile
 
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-
+from ingestion.document_cache import load_runtime_payload, save_runtime_payload
 from ingestion.pdf_parser import parse_pdf
 from ingestion.router import route_elements
 from ingestion.table_processor import process_tables
 from ingestion.chunker import build_chunks
+from retrieval.bm25 import BM25Index
+from retrieval.embedding_cache import encode_texts, get_embedding_cache
+from retrieval.model_registry import MODEL_NAME
+from retrieval.rerank_tokens import pretokenize_chunks
+from utils import tracing
+from utils.helpers import file_sha256
+
+
+def hybrid_enabled() -> bool:
+    return os.getenv("RAG_HYBRID_RETRIEVAL", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+
+def ingest_pdf_to_runtime(pdf_path: str, document_id: str = None, name: str = None) -> dict:
+    """
+    Ingest a PDF, or reuse the stored result when the same file
+    (by SHA-256) has already been ingested by any worker.
+    """
+    with tracing.trace("upload"):
+        document_id = document_id or file_sha256(pdf_path)
+
+        with tracing.span("cache_lookup") as lookup_span:
+            payload = load_runtime_payload(document_id)
+            lookup_span["hit"] = payload is not None
+
+        if payload is not None:
+            print(f"Reusing stored ingestion for {document_id[:12]}")
+            payload["cached"] = True
+            return payload
 
-MODEL_NAME = "BAAI/bge-base-en"
+        payload = _ingest_pdf(pdf_path)
+        payload["document_id"] = document_id
+        payload["cached"] = False
 
+        with tracing.span("persist"):
+            save_runtime_payload(document_id, payload, name=name)
 
-def ingest_pdf_to_runtime(pdf_path: str) -> dict:
+        return payload
+
+
+def _ingest_pdf(pdf_path: str) -> dict:
 
     with tempfile.TemporaryDirectory(prefix="runtime_ingestion_") as work_dir:
 
@@ -26,22 +60,26 @@ def ingest_pdf_to_runtime(pdf_path: str) -> dict:
         chunks_path = os.path.join(work_dir, "chunks.json")
         missing_images_path = os.path.join(work_dir, "image_semantics.json")
 
-        parse_pdf(pdf_path=pdf_path, output_path=parsed_path)
+        with tracing.span("parse"):
+            parse_pdf(pdf_path=pdf_path, output_path=parsed_path)
 
-        route_elements(input_path=parsed_path, output_dir=work_dir)
+        with tracing.span("route"):
+            route_elements(input_path=parsed_path, output_dir=work_dir)
 
-        process_tables(
-            input_path=table_elements_path,
-            raw_output_path=tables_raw_path,
-            index_output_path=tables_index_path,
-        )
+        with tracing.span("tables"):
+            process_tables(
+                input_path=table_elements_path,
+                raw_output_path=tables_raw_path,
+                index_output_path=tables_index_path,
+            )
 
-        build_chunks(
-            text_path=text_elements_path,
-            tables_index_path=tables_index_path,
-            images_path=missing_images_path,
-            output_path=chunks_path,
-        )
+        with tracing.span("chunk"):
+            build_chunks(
+                text_path=text_elements_path,
+                tables_index_path=tables_index_path,
+                images_path=missing_images_path,
+                output_path=chunks_path,
+            )
 
         with open(chunks_path, "r", encoding="utf-8") as f:
             chunks = json.load(f)
@@ -72,22 +110,27 @@ def ingest_pdf_to_runtime(pdf_path: str) -> dict:
         if not texts:
             raise ValueError("No text chunks extracted from uploaded PDF.")
 
-        model = SentenceTransformer(MODEL_NAME)
+        # Reranker document tokens are computed once here, not per query
+        with tracing.span("pretokenize"):
+            metadata = pretokenize_chunks(metadata)
 
-        embeddings = model.encode(
-            texts,
-            normalize_embeddings=True,
-            show_progress_bar=False,
-        )
-
-        dim = embeddings.shape[1]
-
-        index = faiss.IndexFlatIP(dim)
+        # Only chunks not seen before by this model reach the encoder
+        with tracing.span("encode", chunks=len(texts)):
+            embeddings = encode_texts(
+                texts,
+                model_name=MODEL_NAME,
+                cache=get_embedding_cache(MODEL_NAME),
+            )
 
-        index.add(np.asarray(embeddings, dtype=np.float32))
+        # No per-document FAISS index: the DocumentStore adds these
+        # embeddings to its merged index
+        with tracing.span("lexical"):
+            # Lexical side of hybrid retrieval, rows aligned with the embeddings
+            bm25 = BM25Index.from_texts(texts) if hybrid_enabled() else None
 
         return {
-            "index": index,
+            "bm25": bm25,
+            "embeddings": embeddings,
             "metadata": metadata,
             "tables": tables_raw,
         }
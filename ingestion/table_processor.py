@@ -1,6 +1,5 @@
+import html
 import json
-
-
 import re
 
 def generate_table_summary(table):
@@ -32,6 +31,40 @@ def generate_table_summary(table):
     return "Unstructured table containing numeric or textual data."
 
 
+def _cell_text(cell):
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', cell))
+    return " ".join(text.split()).replace("|", "/")
+
+
+def render_table_text(table):
+    """
+    Compact prompt form of a table: one pipe-separated line per row,
+    no HTML markup. Unstructured tables keep their raw text with
+    whitespace collapsed per line.
+    """
+    if table.get("table_type") == "structured":
+        markup = table.get("table_html") or ""
+        rows = re.findall(r'<tr[^>]*>(.*?)</tr>', markup, re.IGNORECASE | re.DOTALL) or [markup]
+        lines = []
+
+        for row in rows:
+            cells = re.findall(r'<t[hd][^>]*>(.*?)</t[hd]>', row, re.IGNORECASE | re.DOTALL)
+            cells = [_cell_text(c) for c in cells]
+
+            if any(cells):
+                lines.append(" | ".join(cells))
+
+        if not lines:
+            # No td/th cells: keep the content as plain text rather than drop it
+            return " ".join(html.unescape(re.sub(r'<[^>]+>', ' ', markup)).split())
+
+        return "\n".join(lines)
+
+    raw = table.get("raw_text", "") or ""
+    lines = (" ".join(line.split()) for line in raw.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
 def process_tables(input_path, raw_output_path, index_output_path):
     with open(input_path, "r", encoding="utf-8") as f:
         tables = json.load(f)
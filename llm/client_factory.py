@@ -18,7 +18,8 @@ def create_generation_client(task: str = "generation"):
                     "GEMINI_INTENT_MODEL",
                     os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
                 ),
-                timeout=int(os.getenv("GEMINI_INTENT_TIMEOUT", os.getenv("GEMINI_TIMEOUT", "45"))),
+                # Intent is a fallback path: one short call, never a stall
+                timeout=int(os.getenv("GEMINI_INTENT_TIMEOUT", "10")),
             )
         else:
             client = GeminiClient(
@@ -35,7 +36,8 @@ def create_generation_client(task: str = "generation"):
                 "HF_INTENT_MODEL",
                 os.getenv("HF_GENERATION_MODEL", "meta-llama/Llama-3.2-3B-Instruct:novita"),
             ),
-            timeout=int(os.getenv("HF_INTENT_TIMEOUT", "45")),
+            timeout=int(os.getenv("HF_INTENT_TIMEOUT", "10")),
+            max_retries=int(os.getenv("HF_INTENT_MAX_RETRIES", "1")),
         )
     else:
         client = HFInferenceClient(
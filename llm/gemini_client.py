@@ -39,6 +39,18 @@ class GeminiClient:
 
         return self.client
 
+    def _config(self, max_new_tokens, temperature, top_p):
+        config_kwargs = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_output_tokens": max_new_tokens,
+        }
+
+        if self.disable_thinking and self.generation_model.startswith("gemini-2.5"):
+            config_kwargs["thinking_config"] = types.ThinkingConfig(thinking_budget=0)
+
+        return types.GenerateContentConfig(**config_kwargs)
+
     def generate(
         self,
         prompt: str,
@@ -47,19 +59,66 @@ class GeminiClient:
         top_p: float = 0.9,
     ) -> str:
         try:
-            config_kwargs = {
-                "temperature": temperature,
-                "top_p": top_p,
-                "max_output_tokens": max_new_tokens,
-            }
+            response = self._client().models.generate_content(
+                model=self.generation_model,
+                contents=prompt,
+                config=self._config(max_new_tokens, temperature, top_p),
+            )
 
-            if self.disable_thinking and self.generation_model.startswith("gemini-2.5"):
-                config_kwargs["thinking_config"] = types.ThinkingConfig(thinking_budget=0)
+            text = (getattr(response, "text", "") or "").strip()
 
-            response = self._client().models.generate_content(
+            if not text:
+                raise GeminiGenerationError("Gemini returned an empty response")
+
+            return text
+
+        except GeminiGenerationError:
+            raise
+        except Exception as exc:
+            raise GeminiGenerationError(str(exc)) from exc
+
+    def generate_stream(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9,
+    ):
+        """
+        Yield response text chunks as generate_content_stream produces them.
+        """
+        try:
+            stream = self._client().models.generate_content_stream(
                 model=self.generation_model,
                 contents=prompt,
-                config=types.GenerateContentConfig(**config_kwargs),
+                config=self._config(max_new_tokens, temperature, top_p),
+            )
+
+            for chunk in stream:
+                text = getattr(chunk, "text", "") or ""
+                if text:
+                    yield text
+
+        except GeminiGenerationError:
+            raise
+        except Exception as exc:
+            raise GeminiGenerationError(str(exc)) from exc
+
+    async def agenerate(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9,
+    ) -> str:
+        """
+        generate() on the SDK's asyncio client.
+        """
+        try:
+            response = await self._client().aio.models.generate_content(
+                model=self.generation_model,
+                contents=prompt,
+                config=self._config(max_new_tokens, temperature, top_p),
             )
 
             text = (getattr(response, "text", "") or "").strip()
@@ -73,3 +132,27 @@ class GeminiClient:
             raise
         except Exception as exc:
             raise GeminiGenerationError(str(exc)) from exc
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9,
+    ):
+        try:
+            stream = await self._client().aio.models.generate_content_stream(
+                model=self.generation_model,
+                contents=prompt,
+                config=self._config(max_new_tokens, temperature, top_p),
+            )
+
+            async for chunk in stream:
+                text = getattr(chunk, "text", "") or ""
+                if text:
+                    yield text
+
+        except GeminiGenerationError:
+            raise
+        except Exception as exc:
+            raise GeminiGenerationError(str(exc)) from exc
@@ -1,9 +1,14 @@
+import asyncio
+import json
 import os
 import time
 from typing import Any
 
+import httpx
 import requests
 
+from utils import tracing
+
 # Safe dotenv loading (won't crash in CI)
 try:
     from dotenv import load_dotenv
@@ -56,8 +61,16 @@ class HFInferenceClient:
             "https://router.huggingface.co/v1/chat/completions"
         )
 
+        # Created lazily by the async methods
+        self._aclient = None
+        self._aclient_loop = None
+
         print("HF Model:", self.generation_model)
 
+    def _delay(self, attempt, seconds):
+        # No point waiting after the last attempt
+        return seconds if attempt + 1 < self.max_retries else 0
+
     # ------------------------------------------------
     # Extract response text safely
     # ------------------------------------------------
@@ -81,16 +94,17 @@ class HFInferenceClient:
             )
 
     # ------------------------------------------------
-    # Generate text
+    # Request body
     # ------------------------------------------------
 
-    def generate(
+    def _request(
         self,
         prompt: str,
-        max_new_tokens: int = 256,
-        temperature: float = 0.1,
-        top_p: float = 0.9
-    ) -> str:
+        max_new_tokens: int,
+        temperature: float,
+        top_p: float,
+        stream: bool = False
+    ):
 
         # ✅ Validate token HERE (not in __init__)
         if not self.api_token:
@@ -117,10 +131,33 @@ class HFInferenceClient:
             "top_p": top_p,
         }
 
+        if stream:
+            headers["Accept"] = "text/event-stream"
+            payload["stream"] = True
+
+        return headers, payload
+
+    # ------------------------------------------------
+    # Generate text
+    # ------------------------------------------------
+
+    def generate(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9
+    ) -> str:
+
+        headers, payload = self._request(prompt, max_new_tokens, temperature, top_p)
+
         for attempt in range(self.max_retries):
 
             try:
 
+                if attempt:
+                    tracing.count_retry()
+
                 print(f"HF attempt {attempt+1}")
 
                 response = requests.post(
@@ -133,7 +170,7 @@ class HFInferenceClient:
                 # Rate limit handling
                 if response.status_code == 429:
 
-                    wait = 10 * (attempt + 1)
+                    wait = self._delay(attempt, 10 * (attempt + 1))
 
                     print(f"Rate limit. Waiting {wait}s")
 
@@ -159,7 +196,256 @@ class HFInferenceClient:
 
                 print("Request failed:", e)
 
-            time.sleep(3)
+            time.sleep(self._delay(attempt, 3))
+
+        raise HFGenerationError(
+            "HF inference failed after retries"
+        )
+
+    # ------------------------------------------------
+    # Stream text
+    # ------------------------------------------------
+
+    def _stream_line(self, line):
+        """
+        Text deltas in one SSE line, or None once the stream is done.
+        """
+
+        if not line or not line.startswith("data:"):
+            return []
+
+        data = line[len("data:"):].strip()
+
+        if data == "[DONE]":
+            return None
+
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return []
+
+        if "error" in payload:
+            raise HFGenerationError(payload["error"])
+
+        return [
+            text
+            for choice in payload.get("choices", [])
+            for text in [(choice.get("delta") or {}).get("content")]
+            if text
+        ]
+
+    def generate_stream(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9
+    ):
+        """
+        Yield completion text as the router streams it (SSE chat completions).
+        Retries only happen before the first token has been yielded.
+        """
+
+        headers, payload = self._request(prompt, max_new_tokens, temperature, top_p, stream=True)
+
+        for attempt in range(self.max_retries):
+
+            started = False
+
+            try:
+
+                if attempt:
+                    tracing.count_retry()
+
+                print(f"HF stream attempt {attempt+1}")
+
+                with requests.post(
+                    self.url,
+                    headers=headers,
+                    json=payload,
+                    timeout=self.timeout,
+                    stream=True,
+                ) as response:
+
+                    if response.status_code == 429:
+
+                        wait = self._delay(attempt, 10 * (attempt + 1))
+
+                        print(f"Rate limit. Waiting {wait}s")
+
+                        time.sleep(wait)
+
+                        continue
+
+                    response.raise_for_status()
+
+                    for line in response.iter_lines(decode_unicode=True):
+
+                        texts = self._stream_line(line)
+
+                        if texts is None:
+                            break
+
+                        for text in texts:
+                            started = True
+                            yield text
+
+                return
+
+            except requests.RequestException as e:
+
+                if started:
+                    raise HFGenerationError(f"HF stream interrupted: {e}") from e
+
+                print("Stream request failed:", e)
+
+            time.sleep(self._delay(attempt, 3))
+
+        raise HFGenerationError(
+            "HF inference failed after retries"
+        )
+
+    # ------------------------------------------------
+    # Async generation
+    # ------------------------------------------------
+
+    def _async_client(self):
+        """
+        One pooled httpx.AsyncClient per event loop.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("HF_MAX_CONNECTIONS", "256"))
+                ),
+            )
+            self._aclient_loop = loop
+
+        return self._aclient
+
+    async def agenerate(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9
+    ) -> str:
+        """
+        generate() without blocking the event loop.
+        """
+
+        headers, payload = self._request(prompt, max_new_tokens, temperature, top_p)
+        client = self._async_client()
+
+        for attempt in range(self.max_retries):
+
+            try:
+
+                if attempt:
+                    tracing.count_retry()
+
+                print(f"HF async attempt {attempt+1}")
+
+                response = await client.post(self.url, headers=headers, json=payload)
+
+                if response.status_code == 429:
+
+                    wait = self._delay(attempt, 10 * (attempt + 1))
+
+                    print(f"Rate limit. Waiting {wait}s")
+
+                    await asyncio.sleep(wait)
+
+                    continue
+
+                response.raise_for_status()
+
+                return self._extract_text(
+                    response.json()
+                )
+
+            except ValueError:
+
+                print("API returned invalid JSON. Retrying...")
+
+            except httpx.TimeoutException:
+
+                print("Timeout retrying...")
+
+            except httpx.HTTPError as e:
+
+                print("Request failed:", e)
+
+            await asyncio.sleep(self._delay(attempt, 3))
+
+        raise HFGenerationError(
+            "HF inference failed after retries"
+        )
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        max_new_tokens: int = 256,
+        temperature: float = 0.1,
+        top_p: float = 0.9
+    ):
+        """
+        generate_stream() as an async generator.
+        """
+
+        headers, payload = self._request(prompt, max_new_tokens, temperature, top_p, stream=True)
+        client = self._async_client()
+
+        for attempt in range(self.max_retries):
+
+            started = False
+
+            try:
+
+                if attempt:
+                    tracing.count_retry()
+
+                print(f"HF async stream attempt {attempt+1}")
+
+                async with client.stream("POST", self.url, headers=headers, json=payload) as response:
+
+                    if response.status_code == 429:
+
+                        wait = self._delay(attempt, 10 * (attempt + 1))
+
+                        print(f"Rate limit. Waiting {wait}s")
+
+                        await asyncio.sleep(wait)
+
+                        continue
+
+                    response.raise_for_status()
+
+                    async for line in response.aiter_lines():
+
+                        texts = self._stream_line(line)
+
+                        if texts is None:
+                            break
+
+                        for text in texts:
+                            started = True
+                            yield text
+
+                return
+
+            except httpx.HTTPError as e:
+
+                if started:
+                    raise HFGenerationError(f"HF stream interrupted: {e}") from e
+
+                print("Stream request failed:", e)
+
+            await asyncio.sleep(self._delay(attempt, 3))
 
         raise HFGenerationError(
             "HF inference failed after retries"
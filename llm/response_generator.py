@@ -14,3 +14,14 @@ def generate_text(prompt: str, max_new_tokens: int = 32) -> str:
     except _intent_error as e:
         print(f"Intent generation failed: {e}")
         return ""
+
+
+async def agenerate_text(prompt: str, max_new_tokens: int = 32) -> str:
+    """
+    generate_text() on the client's async API, for the asyncio pipeline.
+    """
+    try:
+        return await _intent_client.agenerate(prompt, max_new_tokens=max_new_tokens)
+    except _intent_error as e:
+        print(f"Intent generation failed: {e}")
+        return ""
@@ -0,0 +1,120 @@
+import math
+import os
+import threading
+
+# Conservative characters-per-token for report text (numbers and
+# punctuation tokenize densely) when no tokenizer is available
+CHARS_PER_TOKEN = 3.0
+
+
+def context_tokenizer_name():
+    """
+    Tokenizer used to measure prompt evidence: RAG_CONTEXT_TOKENIZER, else
+    the HF router generation model without its ":provider" suffix. None
+    (estimate only) for other backends or RAG_CONTEXT_TOKENIZER=none.
+    """
+    name = os.getenv("RAG_CONTEXT_TOKENIZER", "").strip()
+
+    if name:
+        return None if name.lower() == "none" else name
+
+    if os.getenv("LLM_BACKEND", "hf").strip().lower() != "hf":
+        return None
+
+    model = os.getenv("HF_GENERATION_MODEL", "meta-llama/Llama-3.2-3B-Instruct:novita")
+    return model.split(":", 1)[0]
+
+
+class TokenCounter:
+    """
+    Token counts from the generation model's tokenizer, or a
+    character-based estimate when the tokenizer is unavailable.
+    """
+
+    def __init__(self, tokenizer=None, name=None):
+        self.tokenizer = tokenizer
+        self.name = name if tokenizer is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        if self.tokenizer is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _word_prefix(self, line, max_tokens):
+        words = line.split()
+        low, high = 0, len(words)
+
+        # Longest word prefix that fits
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+
+        return " ".join(words[:low])
+
+    def truncate(self, text: str, max_tokens: int, whole_lines: bool = False) -> str:
+        """
+        Longest prefix of text within max_tokens. The first line that does
+        not fit is cut at a word boundary, or dropped with whole_lines.
+        """
+        if self.count(text) <= max_tokens:
+            return text
+
+        kept = []
+        used = 0
+
+        for line in text.split("\n"):
+            cost = self.count(line) + (1 if kept else 0)
+
+            if used + cost > max_tokens:
+                if not whole_lines:
+                    partial = self._word_prefix(line, max_tokens - used - (1 if kept else 0))
+                    if partial:
+                        kept.append(partial)
+                break
+
+            kept.append(line)
+            used += cost
+
+        return "\n".join(kept)
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_token_counter(download: bool = False) -> TokenCounter:
+    """
+    Process-wide TokenCounter. Queries only read the tokenizer from the
+    local Hugging Face cache; download=True (model warmup) may fetch it.
+    """
+    global _counter
+
+    with _counter_lock:
+        if _counter is not None and (_counter.tokenizer is not None or not download):
+            return _counter
+
+        name = context_tokenizer_name()
+        tokenizer = None
+
+        if name:
+            try:
+                from transformers import AutoTokenizer
+
+                tokenizer = AutoTokenizer.from_pretrained(
+                    name,
+                    local_files_only=not download,
+                    token=os.getenv("HF_TOKEN") or None,
+                )
+            except Exception as exc:
+                print(f"Context tokenizer {name} unavailable ({type(exc).__name__}), estimating tokens")
+
+        _counter = TokenCounter(tokenizer, name)
+
+    return _counter
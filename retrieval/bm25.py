@@ -0,0 +1,196 @@
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+# Keeps figures and codes intact: "15.3%", "1,200", "fy25", "q1", "6g"
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,/-][a-z0-9]+)*%?")
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has",
+    "have", "in", "is", "it", "its", "of", "on", "or", "that", "the", "to",
+    "was", "were", "what", "which", "who", "with", "how", "did", "does", "do",
+}
+
+
+def tokenize(text: str):
+    return [token for token in TOKEN_RE.findall((text or "").lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    In-process BM25 (Okapi) inverted index over chunk texts.
+    Rows line up with the FAISS index rows, so results can be fused directly.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._doc_lengths = []
+        self._arrays = {}
+        self._lengths = None
+
+    def add_documents(self, texts):
+        """
+        Append documents; new rows continue after the existing ones.
+        """
+        for text in texts:
+            row = len(self._doc_lengths)
+            tokens = tokenize(text)
+            self._doc_lengths.append(len(tokens))
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+
+            for token, tf in counts.items():
+                rows, tfs = self._postings.setdefault(token, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+
+        self._arrays = {}
+        self._lengths = None
+        return self
+
+    def extend(self, other):
+        """
+        Append another index's rows after this one's without re-tokenizing.
+        """
+        offset = len(self._doc_lengths)
+
+        for token, (rows, tfs) in other._postings.items():
+            own_rows, own_tfs = self._postings.setdefault(token, ([], []))
+            own_rows.extend(row + offset for row in rows)
+            own_tfs.extend(tfs)
+
+        self._doc_lengths.extend(other._doc_lengths)
+        self._arrays = {}
+        self._lengths = None
+        return self
+
+    def copy(self):
+        other = type(self)(k1=self.k1, b=self.b)
+        other._postings = {token: (list(rows), list(tfs)) for token, (rows, tfs) in self._postings.items()}
+        other._doc_lengths = list(self._doc_lengths)
+        return other
+
+    @classmethod
+    def from_texts(cls, texts, **kwargs):
+        return cls(**kwargs).add_documents(texts)
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def _posting(self, token):
+        arrays = self._arrays.get(token)
+
+        if arrays is None:
+            rows, tfs = self._postings[token]
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            self._arrays[token] = arrays
+
+        return arrays
+
+    def scores(self, query: str):
+        """
+        Dense BM25 score vector over all rows (0 for rows without a match).
+        """
+        num_docs = len(self._doc_lengths)
+        scores = np.zeros(num_docs, dtype=np.float32)
+
+        if not num_docs:
+            return scores
+
+        if self._lengths is None:
+            self._lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+
+        avg_length = max(float(self._lengths.mean()), 1.0)
+
+        for token in set(tokenize(query)):
+            if token not in self._postings:
+                continue
+
+            rows, tfs = self._posting(token)
+            idf = math.log(1.0 + (num_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[rows] / avg_length)
+            scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        return scores
+
+    def search(self, query: str, top_k: int, allowed_rows=None):
+        """
+        Return (scores, rows) of the best matching rows, highest first,
+        optionally restricted to `allowed_rows`.
+        """
+        scores = self.scores(query)
+
+        if allowed_rows is not None:
+            mask = np.zeros(len(scores), dtype=bool)
+            mask[allowed_rows] = True
+            scores[~mask] = 0.0
+
+        matched = np.flatnonzero(scores > 0)
+
+        if not len(matched):
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return scores[order], order
+
+    # ------------------------------------------------
+    # Persistence
+    # ------------------------------------------------
+
+    def save(self, path: str):
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[t][0]) for t in terms])
+
+        np.savez(
+            path,
+            rows=np.asarray([r for t in terms for r in self._postings[t][0]], dtype=np.int64),
+            tfs=np.asarray([f for t in terms for f in self._postings[t][1]], dtype=np.int32),
+            offsets=offsets,
+            doc_lengths=np.asarray(self._doc_lengths, dtype=np.int32),
+            terms=np.asarray(json.dumps(terms)),
+            params=np.asarray([self.k1, self.b], dtype=np.float64),
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        if not path.endswith(".npz") and not os.path.exists(path):
+            path = f"{path}.npz"
+
+        with np.load(path) as data:
+            k1, b = data["params"]
+            index = cls(k1=float(k1), b=float(b))
+            terms = json.loads(str(data["terms"]))
+            rows, tfs, offsets = data["rows"], data["tfs"], data["offsets"]
+
+            for i, term in enumerate(terms):
+                start, end = offsets[i], offsets[i + 1]
+                index._postings[term] = (rows[start:end].tolist(), tfs[start:end].tolist())
+
+            index._doc_lengths = data["doc_lengths"].tolist()
+
+        return index
+
+
+def reciprocal_rank_fusion(ranked_lists, k: int = 60):
+    """
+    Fuse ranked row lists: score(row) = sum(1 / (k + rank)), rank from 1.
+    Returns [(row, fused_score)] sorted best first.
+    """
+    fused = {}
+
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
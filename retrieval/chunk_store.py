@@ -0,0 +1,368 @@
+import json
+import os
+
+import numpy as np
+
+from utils.helpers import text_digest
+
+STORE_VERSION = 1
+MANIFEST_FILE = "store.json"
+
+
+def _encode_strings(values):
+    """
+    Strings -> (utf-8 blob, int64 offsets of length n + 1).
+    """
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def chunk_digest(meta) -> str:
+    """
+    Content fingerprint of a chunk (section and text), computed once when
+    the chunk enters a store so cache keys never rebuild the text.
+    """
+    return text_digest(f"{meta.get('section') or ''}\n{meta.get('chunk_text') or ''}")
+
+
+def _list_offsets(lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(items) for items in lists])
+    return offsets
+
+
+class ChunkStore:
+    """
+    Columnar chunk metadata.
+
+    - chunk_id / section / chunk_text / images / doc_id / digest : utf-8 blob + offsets
+    - pages  : flat int32 array + per-chunk offsets
+    - rerank_ids : reranker document-side token IDs, flat int32 + offsets
+    - tables : flat table-id strings + per-chunk offsets
+
+    Saved as one .npy file per array so a store on disk can be opened
+    memory-mapped: startup is O(1) and the pages are shared by every
+    process that maps the same files.
+    """
+
+    STRING_COLUMNS = ("chunk_id", "section", "chunk_text", "images", "doc_id", "digest")
+
+    # (values, offsets) array pairs; offsets index into values
+    _COLUMN_PAIRS = tuple((f"{c}_blob", f"{c}_offsets") for c in STRING_COLUMNS) + (
+        ("pages_values", "pages_offsets"),
+        ("rerank_ids_values", "rerank_ids_offsets"),
+        ("tables_blob", "tables_item_offsets"),
+    )
+
+    def __init__(self, arrays: dict):
+        self._arrays = arrays
+        self._rows = len(arrays["chunk_id_offsets"]) - 1
+
+        # Columns added after the first store version
+        if "doc_id_offsets" not in arrays:
+            arrays["doc_id_blob"] = np.zeros(0, dtype=np.uint8)
+            arrays["doc_id_offsets"] = np.zeros(self._rows + 1, dtype=np.int64)
+
+        if "rerank_ids_offsets" not in arrays:
+            arrays["rerank_ids_values"] = np.zeros(0, dtype=np.int32)
+            arrays["rerank_ids_offsets"] = np.zeros(self._rows + 1, dtype=np.int64)
+
+        if "digest_offsets" not in arrays:
+            arrays["digest_blob"], arrays["digest_offsets"] = _encode_strings(
+                chunk_digest({"section": self.section(row), "chunk_text": self.text(row)})
+                for row in range(self._rows)
+            )
+
+    # ------------------------------------------------
+    # Construction / persistence
+    # ------------------------------------------------
+
+    @classmethod
+    def from_records(cls, metadata):
+        if isinstance(metadata, cls):
+            return metadata
+
+        metadata = list(metadata)
+        arrays = {}
+
+        for column in cls.STRING_COLUMNS:
+            if column == "images":
+                values = [json.dumps(meta.get("images", []), ensure_ascii=False) for meta in metadata]
+            elif column == "digest":
+                values = [chunk_digest(meta) for meta in metadata]
+            else:
+                values = [meta.get(column) or "" for meta in metadata]
+            arrays[f"{column}_blob"], arrays[f"{column}_offsets"] = _encode_strings(values)
+
+        pages = [meta.get("pages", []) for meta in metadata]
+        arrays["pages_values"] = np.array([p for items in pages for p in items], dtype=np.int32)
+        arrays["pages_offsets"] = _list_offsets(pages)
+
+        rerank_ids = [meta.get("rerank_token_ids") or [] for meta in metadata]
+        arrays["rerank_ids_values"] = np.array([t for items in rerank_ids for t in items], dtype=np.int32)
+        arrays["rerank_ids_offsets"] = _list_offsets(rerank_ids)
+
+        tables = [meta.get("tables", []) for meta in metadata]
+        arrays["tables_blob"], arrays["tables_item_offsets"] = _encode_strings(
+            [table_id for items in tables for table_id in items]
+        )
+        arrays["tables_offsets"] = _list_offsets(tables)
+
+        return cls(arrays)
+
+    @classmethod
+    def concat(cls, stores):
+        """
+        One store holding the rows of `stores` in order (arrays are copied once).
+        """
+        stores = [store for store in stores if len(store)] or list(stores[:1])
+
+        if not stores:
+            return cls.from_records([])
+
+        if len(stores) == 1:
+            return stores[0]
+
+        arrays = {}
+
+        for values_key, offsets_key in cls._COLUMN_PAIRS + (("tables_item_offsets", "tables_offsets"),):
+            if values_key == "tables_item_offsets":
+                # Per-chunk offsets count table ids, not bytes
+                sizes = [len(store._arrays["tables_item_offsets"]) - 1 for store in stores]
+            else:
+                sizes = [int(store._arrays[offsets_key][-1]) for store in stores]
+
+            bases = np.cumsum([0] + sizes[:-1])
+            arrays[offsets_key] = np.concatenate(
+                [np.zeros(1, dtype=np.int64)]
+                + [np.asarray(store._arrays[offsets_key][1:]) + base for store, base in zip(stores, bases)]
+            )
+
+            if values_key != "tables_item_offsets":
+                arrays[values_key] = np.concatenate([np.asarray(store._arrays[values_key]) for store in stores])
+
+        return cls(arrays)
+
+    def take(self, rows):
+        return type(self).from_records([self[row] for row in rows])
+
+    def save(self, store_dir: str):
+        os.makedirs(store_dir, exist_ok=True)
+
+        for name, array in self._arrays.items():
+            np.save(os.path.join(store_dir, f"{name}.npy"), np.asarray(array))
+
+        with open(os.path.join(store_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": STORE_VERSION, "rows": self._rows, "arrays": sorted(self._arrays)},
+                f,
+            )
+
+    @classmethod
+    def load(cls, store_dir: str, mmap: bool = True):
+        with open(os.path.join(store_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported chunk store version: {manifest.get('version')}")
+
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode=mode)
+            for name in manifest["arrays"]
+        }
+
+        return cls(arrays)
+
+    @staticmethod
+    def is_store(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+    # ------------------------------------------------
+    # Column access
+    # ------------------------------------------------
+
+    def _string(self, column, row):
+        offsets = self._arrays[f"{column}_offsets"]
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return bytes(self._arrays[f"{column}_blob"][start:end]).decode("utf-8")
+
+    def chunk_id(self, row):
+        return self._string("chunk_id", row)
+
+    def section(self, row):
+        return self._string("section", row)
+
+    def text(self, row):
+        return self._string("chunk_text", row)
+
+    def doc_id(self, row):
+        return self._string("doc_id", row) or None
+
+    def digest(self, row):
+        return self._string("digest", row)
+
+    def images(self, row):
+        return json.loads(self._string("images", row) or "[]")
+
+    def pages(self, row):
+        offsets = self._arrays["pages_offsets"]
+        return [int(p) for p in self._arrays["pages_values"][offsets[row]:offsets[row + 1]]]
+
+    def rerank_token_ids(self, row):
+        offsets = self._arrays["rerank_ids_offsets"]
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        return self._arrays["rerank_ids_values"][start:end] if end > start else None
+
+    def tables(self, row):
+        offsets = self._arrays["tables_offsets"]
+        item_offsets = self._arrays["tables_item_offsets"]
+        blob = self._arrays["tables_blob"]
+
+        return [
+            bytes(blob[item_offsets[i]:item_offsets[i + 1]]).decode("utf-8")
+            for i in range(int(offsets[row]), int(offsets[row + 1]))
+        ]
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, row):
+        """
+        Materialize one row in the legacy chunks_meta.json dict shape.
+        """
+        row = int(row)
+
+        if row < 0:
+            row += self._rows
+
+        if not 0 <= row < self._rows:
+            raise IndexError(row)
+
+        record = {
+            "chunk_id": self.chunk_id(row),
+            "section": self.section(row),
+            "pages": self.pages(row),
+            "tables": self.tables(row),
+            "images": self.images(row),
+            "chunk_text": self.text(row),
+        }
+
+        doc_id = self.doc_id(row)
+        if doc_id is not None:
+            record["doc_id"] = doc_id
+
+        rerank_ids = self.rerank_token_ids(row)
+        if rerank_ids is not None:
+            record["rerank_token_ids"] = [int(t) for t in rerank_ids]
+
+        return record
+
+    def nbytes(self):
+        return int(sum(np.asarray(array).nbytes for array in self._arrays.values()))
+
+
+class ChunkHit:
+    """
+    A retrieval hit: scores plus a view of one ChunkStore row.
+
+    Chunk fields are decoded from the store only when read, so candidates
+    that are dropped after reranking never have their pages, tables or
+    images materialized. Supports the dict-style reads (and the
+    rerank_score write) the rest of the pipeline uses.
+    """
+
+    __slots__ = ("store", "row", "score", "bm25_score", "fusion_score", "rerank_score")
+
+    FIELDS = {
+        "chunk_id": ChunkStore.chunk_id,
+        "section": ChunkStore.section,
+        "pages": ChunkStore.pages,
+        "tables": ChunkStore.tables,
+        "images": ChunkStore.images,
+        "chunk_text": ChunkStore.text,
+        "doc_id": ChunkStore.doc_id,
+        "rerank_token_ids": ChunkStore.rerank_token_ids,
+        # Not part of the dict shape (keys / to_dict); read by cache keys
+        "chunk_digest": ChunkStore.digest,
+    }
+    OPTIONAL = ("doc_id", "rerank_token_ids")
+    SCORES = ("score", "bm25_score", "fusion_score", "rerank_score")
+
+    def __init__(self, store, row, score=None, bm25_score=None, fusion_score=None):
+        self.store = store
+        self.row = row
+        self.score = score
+        self.bm25_score = bm25_score
+        self.fusion_score = fusion_score
+        self.rerank_score = None
+
+    def keys(self):
+        keys = ["score", "chunk_id", "section", "pages", "tables", "images", "chunk_text"]
+
+        if self.store.doc_id(self.row) is not None:
+            keys.append("doc_id")
+        if self.fusion_score is not None:
+            keys += ["bm25_score", "fusion_score"]
+        if self.rerank_score is not None:
+            keys.append("rerank_score")
+
+        return keys
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, key):
+        if key == "score":
+            return self.score
+
+        if key in self.SCORES:
+            # Fusion scores exist only for hybrid hits, rerank_score only after reranking
+            present = self.rerank_score is not None if key == "rerank_score" else self.fusion_score is not None
+            if not present:
+                raise KeyError(key)
+            return getattr(self, key)
+
+        accessor = self.FIELDS.get(key)
+
+        if accessor is None:
+            raise KeyError(key)
+
+        value = accessor(self.store, self.row)
+
+        if value is None and key in self.OPTIONAL:
+            raise KeyError(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.SCORES:
+            raise KeyError(f"{key} is read-only on a chunk hit")
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, ChunkHit):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ChunkHit(row={self.row}, chunk_id={self.store.chunk_id(self.row)!r}, score={self.score})"
@@ -0,0 +1,136 @@
+import math
+import os
+import uuid
+import weakref
+
+import faiss
+import numpy as np
+
+COMPRESSION_TYPES = ("none", "sq8", "pq")
+
+
+def compression_codec(compression: str, num_vectors: int, dim: int) -> str:
+    """
+    faiss factory suffix for the first-pass codes:
+    - sq8: 8-bit scalar quantizer (4x smaller than float32)
+    - pq : product quantizer, dim/8 sub-vectors of up to 8 bits (32x smaller)
+    """
+    if compression == "sq8":
+        return "SQ8"
+
+    if compression == "pq":
+        m = int(os.getenv("RAG_PQ_SUBQUANTIZERS", str(max(1, dim // 8))))
+        while dim % m:
+            m -= 1
+        # k-means wants ~39 training points per centroid (2^nbits centroids)
+        nbits = max(1, min(8, int(math.log2(max(2, num_vectors // 39)))))
+        return f"PQ{m}x{nbits}"
+
+    raise ValueError(f"Unknown vector compression: {compression}")
+
+
+def default_originals_path() -> str:
+    store_dir = os.getenv("RAG_VECTOR_STORE_DIR", "/tmp/rag_cache/vectors")
+    os.makedirs(store_dir, exist_ok=True)
+    return os.path.join(store_dir, f"{uuid.uuid4().hex}.f16.npy")
+
+
+def save_originals(path: str, embeddings):
+    np.save(path, np.asarray(embeddings, dtype=np.float16))
+
+
+def _remove_originals(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class RescoringIndex:
+    """
+    Two-stage index with the faiss `search(x, k)` interface.
+
+    The first pass runs over compressed codes (SQ8 / PQ) held in memory and
+    over-fetches `k * oversample` candidates. Those candidates are re-scored
+    exactly against float16 originals memory-mapped from disk, so only the
+    rows that are actually touched become resident.
+    """
+
+    def __init__(self, coarse_index, originals_path: str, oversample: int = 4):
+        self.coarse = coarse_index
+        self.originals_path = originals_path
+        self.originals = np.load(originals_path, mmap_mode="r")
+        self.oversample = max(1, int(oversample))
+
+    def own_originals(self):
+        """
+        Delete the originals file once this index is garbage-collected.
+        For scratch copies nothing else refers to (see build_index).
+        """
+        weakref.finalize(self, _remove_originals, self.originals_path)
+        return self
+
+    def extended(self, embeddings):
+        """
+        Copy of this index with `embeddings` appended, for copy-on-write
+        appends. New rows are encoded with the already trained coarse index
+        (no retraining or re-tuning); the originals are copied with the new
+        rows to a scratch file owned by the copy. This index is unchanged.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        old = len(self.originals)
+
+        coarse = faiss.clone_index(self.coarse)
+        coarse.add(embeddings)
+
+        path = default_originals_path()
+        originals = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float16, shape=(old + len(embeddings), self.d)
+        )
+
+        # Blockwise, so the old originals never need to be resident at once
+        for start in range(0, old, 65536):
+            end = min(old, start + 65536)
+            originals[start:end] = self.originals[start:end]
+        originals[old:] = embeddings
+        originals.flush()
+        del originals
+
+        return RescoringIndex(coarse, path, oversample=self.oversample).own_originals()
+
+    @property
+    def ntotal(self):
+        return self.coarse.ntotal
+
+    @property
+    def d(self):
+        return self.coarse.d
+
+    def reconstruct_batch(self, rows):
+        return np.asarray(self.originals[np.asarray(rows)], dtype=np.float32)
+
+    def search(self, queries, k: int, params=None):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        fetch = min(self.ntotal, k * self.oversample)
+
+        if params is None:
+            _, candidates = self.coarse.search(queries, fetch)
+        else:
+            _, candidates = self.coarse.search(queries, fetch, params=params)
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for row, (query, cand) in enumerate(zip(queries, candidates)):
+            cand = np.sort(cand[cand >= 0])
+
+            if not len(cand):
+                continue
+
+            exact = np.asarray(self.originals[cand], dtype=np.float32) @ query
+            top = np.argsort(-exact)[:k]
+
+            scores[row, : len(top)] = exact[top]
+            indices[row, : len(top)] = cand[top]
+
+        return scores, indices
@@ -1,3 +1,16 @@
+import os
+import re
+
+SEPARATOR = "\n\n---\n\n"
+TRUNCATED_TABLE = "\n... (table truncated)"
+
+# Shortest shared run of words treated as window overlap, not coincidence
+MIN_OVERLAP_WORDS = 5
+
+_PART_SUFFIX = re.compile(r"\s*\(Part \d+\)$")
+_CHUNK_NUMBER = re.compile(r"^(.*?)(\d+)$")
+
+
 def build_context(filtered_chunks):
     """
     Build grounded context for the Agent.
@@ -7,6 +20,8 @@ def build_context(filtered_chunks):
 
     for chunk in filtered_chunks:
         context.append({
+            "doc_id": chunk.get("doc_id"),
+            "chunk_id": chunk.get("chunk_id"),
             "section": chunk.get("section", ""),
             "pages": chunk.get("pages", []),
             # Defensive: never allow missing text
@@ -18,3 +33,197 @@ def build_context(filtered_chunks):
     return {
         "context": context
     }
+
+
+def _chunk_position(chunk_id):
+    # "chunk_012" / "s1_chunk_003" -> ("chunk_", 12) / ("s1_chunk_", 3)
+    match = _CHUNK_NUMBER.match(chunk_id or "")
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+def _window_body(item):
+    # Ingest prefixes chunk_text with its section line ("Risks (Part 2)\n..."),
+    # which would sit between two windows' shared words
+    text = item.get("text", "").strip()
+    header = item.get("section", "")
+
+    if header and text.startswith(header + "\n"):
+        return True, text[len(header) + 1:].lstrip()
+
+    return False, text
+
+
+def join_overlapping(first: str, second: str) -> str:
+    """
+    Concatenate consecutive chunk windows, dropping the words the start
+    of `second` repeats from the end of `first`.
+    """
+    head = first.split()
+    tail = second.split()
+
+    for size in range(min(len(head), len(tail)), MIN_OVERLAP_WORDS - 1, -1):
+        if head[-size:] == tail[:size]:
+            end = list(re.finditer(r"\S+", second))[size - 1].end()
+            return first + second[end:]
+
+    return f"{first}\n{second}"
+
+
+class ContextPacker:
+    """
+    Turns ranked context items into prompt evidence within a token budget.
+
+    Chunks that are consecutive windows of the same section of the same
+    document are merged into one span with their overlap removed. Spans
+    are then added best rerank rank first while they fit
+    RAG_CONTEXT_TOKEN_BUDGET (0 = unlimited), followed by the tables they
+    reference; the best span is truncated rather than dropped, and tables
+    that do not fit are cut at a row boundary or left out.
+    """
+
+    def __init__(self, token_budget=None):
+        if token_budget is None:
+            token_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "2000"))
+        self.token_budget = token_budget
+        # Tables cut below this size carry too little to be worth sending
+        self.min_table_tokens = int(os.getenv("RAG_CONTEXT_MIN_TABLE_TOKENS", "48"))
+
+    def merge(self, items):
+        """
+        Spans (dicts) in rank order; each lists the chunk_ids it covers.
+        """
+        runs = {}
+        spans = []
+
+        for rank, item in enumerate(items):
+            position = _chunk_position(item.get("chunk_id"))
+
+            if position is None:
+                spans.append([(rank, None, item)])
+                continue
+
+            key = (item.get("doc_id"), _PART_SUFFIX.sub("", item.get("section", "")), position[0])
+            runs.setdefault(key, []).append((rank, position[1], item))
+
+        for members in runs.values():
+            members.sort(key=lambda member: member[1])
+            run = [members[0]]
+
+            for member in members[1:]:
+                if member[1] == run[-1][1] + 1:
+                    run.append(member)
+                else:
+                    spans.append(run)
+                    run = [member]
+
+            spans.append(run)
+
+        spans.sort(key=lambda run: min(rank for rank, _number, _item in run))
+
+        return [self._span(run) for run in spans]
+
+    def _span(self, run):
+        items = [item for _rank, _number, item in run]
+        section = _PART_SUFFIX.sub("", items[0].get("section", ""))
+        headed, text = _window_body(items[0])
+
+        for item in items[1:]:
+            text = join_overlapping(text, _window_body(item)[1])
+
+        if headed:
+            # One header for the merged span: "Risks", not "Risks (Part 1)"
+            text = f"{section if len(items) > 1 else items[0]['section']}\n{text}"
+
+        tables = []
+        for item in items:
+            tables.extend(t for t in item.get("tables", []) if t not in tables)
+
+        return {
+            "doc_id": items[0].get("doc_id"),
+            "section": section,
+            "pages": sorted({page for item in items for page in item.get("pages", [])}),
+            "text": text,
+            "tables": tables,
+            "chunk_ids": [item.get("chunk_id") for item in items],
+        }
+
+    def pack(self, items, counter, load_tables):
+        """
+        items: ranked context items; counter: llm.token_counter.TokenCounter;
+        load_tables(doc_id, table_ids) -> rendered table texts.
+        Returns {"text", "tables", "stats"}.
+        """
+        spans = self.merge(items)
+        budget = self.token_budget if self.token_budget > 0 else None
+        separator_cost = counter.count(SEPARATOR)
+
+        used = 0
+        parts = []
+        packed = []
+        dropped_spans = 0
+
+        for span in spans:
+            if not span["text"]:
+                continue
+
+            page_str = ", ".join(str(p) for p in span["pages"]) if span["pages"] else "Unknown"
+            part = f"[Source: Page {page_str}]\n{span['text']}"
+            cost = counter.count(part) + (separator_cost if parts else 0)
+
+            if budget is not None and used + cost > budget:
+                if parts:
+                    dropped_spans += 1
+                    continue
+
+                part = counter.truncate(part, budget)
+                cost = counter.count(part)
+
+                if not part:
+                    dropped_spans += 1
+                    continue
+
+            parts.append(part)
+            packed.append(span)
+            used += cost
+
+        tables = []
+        seen = set()
+        dropped_tables = 0
+
+        for span in packed:
+            for table_id in span["tables"]:
+                if (span["doc_id"], table_id) in seen:
+                    continue
+                seen.add((span["doc_id"], table_id))
+
+                for table in load_tables(span["doc_id"], [table_id]):
+                    cost = counter.count(table)
+
+                    if budget is not None and used + cost > budget:
+                        table = counter.truncate(table, budget - used - counter.count(TRUNCATED_TABLE), whole_lines=True)
+
+                        if counter.count(table) < self.min_table_tokens:
+                            dropped_tables += 1
+                            continue
+
+                        table += TRUNCATED_TABLE
+                        cost = counter.count(table)
+
+                    tables.append(table)
+                    used += cost
+
+        return {
+            "text": SEPARATOR.join(parts),
+            "tables": tables,
+            "stats": {
+                "tokenizer": counter.name,
+                "token_budget": self.token_budget,
+                "tokens": used,
+                "chunks": len(items),
+                "spans": len(spans),
+                "packed_spans": len(packed),
+                "dropped_spans": dropped_spans,
+                "tables": len(tables),
+                "dropped_tables": dropped_tables,
+            },
+        }
@@ -0,0 +1,548 @@
+import os
+import threading
+
+import faiss
+import numpy as np
+
+from ingestion.table_processor import render_table_text
+from retrieval.bm25 import BM25Index
+from retrieval.chunk_store import ChunkStore
+from retrieval.compressed_index import RescoringIndex
+from retrieval.index_factory import build_index, choose_index_type
+from retrieval.model_registry import MODEL_NAME
+from retrieval.retriever import Retriever
+
+
+def _namespace_ids(metadata, tables_raw, prefix):
+    """
+    Prefix chunk and table IDs of a supplement so they cannot collide
+    with the IDs already used by the document it is appended to.
+    """
+    metadata = [
+        {
+            **meta,
+            "chunk_id": f"{prefix}{meta['chunk_id']}",
+            "tables": [f"{prefix}{table_id}" for table_id in meta.get("tables", [])],
+        }
+        for meta in metadata
+    ]
+    tables_raw = [{**table, "id": f"{prefix}{table.get('id')}"} for table in tables_raw or []]
+
+    return metadata, tables_raw
+
+
+def _render_tables(tables_raw, start=0):
+    """
+    table id -> (position in the document, prompt text), rendered once
+    so queries never scan the table list or re-render HTML.
+    """
+    return {
+        table.get("id"): (start + position, render_table_text(table))
+        for position, table in enumerate(tables_raw)
+    }
+
+
+def _chunks_for(metadata, doc_id):
+    return ChunkStore.from_records({**meta, "doc_id": doc_id} for meta in metadata)
+
+
+def _lexical_for(chunks, lexical_index):
+    if lexical_index is not None and len(lexical_index) == len(chunks):
+        return lexical_index
+    return BM25Index.from_texts(chunks.text(row) for row in range(len(chunks)))
+
+
+class StoreSnapshot:
+    """
+    Immutable view of a DocumentStore as of one write: the merged
+    retriever, each document's rows and tables, and the tombstoned rows.
+
+    The store publishes a new snapshot with a single attribute assignment
+    after every change, so readers take no lock, and a request that keeps
+    one snapshot never mixes the index of one write with the tables of
+    another.
+    """
+
+    __slots__ = ("retriever", "documents", "tombstone_rows", "generation")
+
+    def __init__(self, retriever=None, documents=None, tombstone_rows=None, generation=0):
+        self.retriever = retriever
+        self.documents = documents or {}
+        self.tombstone_rows = np.zeros(0, dtype=np.int64) if tombstone_rows is None else tombstone_rows
+        self.generation = generation
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.documents
+
+    def document_ids(self):
+        return list(self.documents)
+
+    def describe(self):
+        return [
+            {
+                "document_id": doc["doc_id"],
+                "name": doc["name"],
+                "chunks": int(np.count_nonzero(~np.isin(doc["rows"], self.tombstone_rows))),
+                "tables": len(doc["tables"]),
+            }
+            for doc in self.documents.values()
+        ]
+
+    def tables(self, doc_id):
+        doc = self.documents.get(doc_id)
+        return doc["tables"] if doc else []
+
+    def table_texts(self, doc_id, table_ids):
+        """
+        Pre-rendered text of the given tables, in document order.
+        Unknown IDs and empty tables are skipped.
+        """
+        doc = self.documents.get(doc_id)
+
+        if doc is None:
+            return []
+
+        rendered = sorted(doc["table_text"][i] for i in set(table_ids) if i in doc["table_text"])
+        return [text for _position, text in rendered if text]
+
+    def rows_for(self, doc_ids):
+        """
+        Live index rows owned by the given documents (None means every
+        document, and is returned as None when nothing is tombstoned).
+        """
+        if doc_ids is None:
+            if not len(self.tombstone_rows):
+                return None
+            doc_ids = list(self.documents)
+
+        ranges = [self.documents[doc_id]["rows"] for doc_id in doc_ids if doc_id in self.documents]
+
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+
+        rows = np.concatenate(ranges)
+
+        if len(self.tombstone_rows):
+            rows = rows[~np.isin(rows, self.tombstone_rows)]
+
+        return rows
+
+    def encode_query(self, query: str):
+        """
+        Normalized query embedding (served from the query cache after retrieval).
+        """
+        return None if self.retriever is None else self.retriever.encode_query(query)
+
+    def retrieve(self, query: str, doc_ids=None):
+        return self.retrieve_many([query], doc_ids=doc_ids)[0]
+
+    def retrieve_many(self, queries, doc_ids=None):
+        if self.retriever is None:
+            return [[] for _ in queries]
+
+        allowed_rows = self.rows_for(doc_ids)
+
+        if allowed_rows is not None and len(allowed_rows) == self.retriever.index.ntotal:
+            allowed_rows = None
+
+        return self.retriever.retrieve_many(queries, allowed_rows=allowed_rows)
+
+
+class DocumentStore:
+    """
+    Many indexed documents under document IDs, searched as one corpus.
+
+    All documents share one merged vector index (plus one merged BM25 index);
+    each document owns a set of rows. A query for one document, a set of
+    documents or all of them is a single filtered search over the merged
+    index, not a loop over per-document indexes.
+
+    Adding documents or supplements appends rows to a copy of the current
+    index and swaps it in, so queries never wait for a rebuild. Removed
+    chunks are tombstoned (filtered out at search time); once tombstones
+    pass RAG_COMPACT_TOMBSTONE_RATIO of the rows, the index is rebuilt
+    from the live rows in a background thread.
+
+    Writers serialize on a lock and finish by publishing a StoreSnapshot;
+    queries read the current snapshot without locking.
+    """
+
+    def __init__(self, initial_top_k=25, fused_top_k=None, model_name=MODEL_NAME, compact_ratio=None):
+        self.initial_top_k = initial_top_k
+        self.fused_top_k = fused_top_k
+        self.model_name = model_name
+
+        if compact_ratio is None:
+            compact_ratio = float(os.getenv("RAG_COMPACT_TOMBSTONE_RATIO", "0.2"))
+        self.compact_ratio = compact_ratio
+        self.background_compaction = os.getenv("RAG_BACKGROUND_COMPACTION", "true").strip().lower() in {
+            "1", "true", "yes", "on"
+        }
+
+        self.documents = {}
+        self.retriever = None
+        self.tombstones = set()
+        self._tombstone_rows = np.zeros(0, dtype=np.int64)
+        self._generation = 0
+        self._compacting = False
+        self._lock = threading.RLock()
+        self._snapshot = StoreSnapshot()
+
+    # ------------------------------------------------
+    # Mutation
+    # ------------------------------------------------
+
+    def add_document(self, doc_id, embeddings, metadata, tables_raw, lexical_index=None, name=None):
+        """
+        Add (or replace) a document. Its rows are appended to the merged
+        index; a replaced document's old rows are tombstoned.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        if len(embeddings) != len(metadata):
+            raise ValueError("embeddings and metadata must have the same number of rows")
+
+        chunks = _chunks_for(metadata, doc_id)
+        lexical_index = _lexical_for(chunks, lexical_index)
+
+        with self._lock:
+            old = self.documents.pop(doc_id, None)
+
+            if old is not None:
+                self._tombstone(old["rows"])
+
+            doc = {
+                "doc_id": doc_id,
+                "name": name or doc_id,
+                "embeddings": embeddings,
+                "metadata": chunks,
+                "tables": list(tables_raw or []),
+                "table_text": _render_tables(tables_raw or []),
+                "lexical_index": lexical_index,
+                "rows": np.zeros(0, dtype=np.int64),
+                "parts": 1,
+            }
+            self.documents[doc_id] = doc
+
+            self._append(doc, embeddings, chunks, lexical_index)
+            self._publish()
+
+    def append_to_document(self, doc_id, embeddings, metadata, tables_raw, lexical_index=None):
+        """
+        Append a supplement's chunks and tables to an existing document
+        without rebuilding it. Returns the ID prefix given to the supplement.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        if len(embeddings) != len(metadata):
+            raise ValueError("embeddings and metadata must have the same number of rows")
+
+        with self._lock:
+            doc = self.documents.get(doc_id)
+
+            if doc is None:
+                raise KeyError(doc_id)
+
+            prefix = f"s{doc['parts']}_"
+            metadata, tables_raw = _namespace_ids(metadata, tables_raw, prefix)
+            chunks = _chunks_for(metadata, doc_id)
+            lexical_index = _lexical_for(chunks, lexical_index)
+
+            # Built on a copy: a failed append leaves the document untouched
+            updated = dict(
+                doc,
+                parts=doc["parts"] + 1,
+                embeddings=np.vstack([doc["embeddings"], embeddings]),
+                metadata=ChunkStore.concat([doc["metadata"], chunks]),
+                table_text={**doc["table_text"], **_render_tables(tables_raw, len(doc["tables"]))},
+                tables=doc["tables"] + tables_raw,
+                lexical_index=doc["lexical_index"].copy().extend(lexical_index),
+            )
+            self.documents[doc_id] = updated
+
+            try:
+                self._append(updated, embeddings, chunks, lexical_index)
+            except Exception:
+                self.documents[doc_id] = doc
+                raise
+
+            self._publish()
+
+        return prefix
+
+    def remove_chunks(self, doc_id, chunk_ids):
+        """
+        Tombstone chunks of a document. Returns how many rows were removed.
+        """
+        chunk_ids = set(chunk_ids)
+
+        with self._lock:
+            doc = self.documents.get(doc_id)
+
+            if doc is None:
+                return 0
+
+            chunks = doc["metadata"]
+            rows = [
+                int(row)
+                for position, row in enumerate(doc["rows"])
+                if chunks.chunk_id(position) in chunk_ids and int(row) not in self.tombstones
+            ]
+            self._tombstone(rows)
+            self._publish()
+
+        return len(rows)
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            doc = self.documents.pop(doc_id, None)
+
+            if doc is None:
+                return False
+
+            if not self.documents:
+                self._reset()
+            else:
+                self._tombstone(doc["rows"])
+
+            self._publish()
+            return True
+
+    def _publish(self):
+        """
+        Swap in a snapshot of the current state (caller holds the lock).
+        Published row arrays are frozen; writers replace, never modify, them.
+        """
+        documents = {}
+
+        for doc_id, doc in self.documents.items():
+            doc["rows"].setflags(write=False)
+            documents[doc_id] = {key: doc[key] for key in ("doc_id", "name", "rows", "tables", "table_text")}
+
+        self._tombstone_rows.setflags(write=False)
+        self._snapshot = StoreSnapshot(self.retriever, documents, self._tombstone_rows, self._generation)
+
+    def _reset(self):
+        self.retriever = None
+        self.tombstones = set()
+        self._tombstone_rows = np.zeros(0, dtype=np.int64)
+        self._generation += 1
+
+    def _tombstone(self, rows):
+        if not len(rows):
+            return
+
+        self.tombstones.update(int(row) for row in rows)
+        self._tombstone_rows = np.fromiter(sorted(self.tombstones), dtype=np.int64)
+        self._generation += 1
+        self._maybe_compact()
+
+    def _append(self, doc, embeddings, chunks, lexical_index):
+        current = self.retriever
+        self._generation += 1
+
+        if current is None:
+            self._rebuild()
+            return
+
+        start = current.index.ntotal
+        index_params = current.index_params
+
+        # Copy-on-write: in-flight searches keep using the old index
+        if isinstance(current.index, RescoringIndex):
+            index = current.index.extended(embeddings)
+            index_params = dict(index_params, originals_path=index.originals_path)
+        else:
+            index = faiss.clone_index(current.index)
+            index.add(embeddings)
+
+        self.retriever = self._retriever(
+            index,
+            ChunkStore.concat([current.meta, chunks]),
+            index_params,
+            current.lexical_index.copy().extend(lexical_index),
+        )
+
+        doc["rows"] = np.concatenate(
+            [doc["rows"], np.arange(start, start + len(embeddings), dtype=np.int64)]
+        )
+
+        self._maybe_compact()
+
+    def _retriever(self, index, metadata, index_params, lexical_index):
+        return Retriever(
+            index_object=index,
+            metadata_object=metadata,
+            initial_top_k=self.initial_top_k,
+            model_name=self.model_name,
+            index_params=index_params,
+            lexical_index=lexical_index,
+            fused_top_k=self.fused_top_k,
+        )
+
+    # ------------------------------------------------
+    # Compaction
+    # ------------------------------------------------
+
+    def _needs_compaction(self):
+        if self.retriever is None:
+            return False
+
+        total = self.retriever.index.ntotal
+        live = total - len(self.tombstones)
+
+        if self.tombstones and len(self.tombstones) >= self.compact_ratio * total:
+            return True
+
+        # Appends grew the corpus past the size its index type was chosen for
+        return choose_index_type(live) != self.retriever.index_params.get("type", "flat")
+
+    def _maybe_compact(self):
+        if self._compacting or not self._needs_compaction():
+            return
+
+        self._compacting = True
+
+        if self.background_compaction:
+            threading.Thread(target=self.compact, name="document-store-compaction", daemon=True).start()
+        else:
+            self.compact()
+
+    def _live_snapshot(self):
+        snapshot = []
+
+        for doc in self.documents.values():
+            # Embeddings past the document's rows are being appended: all live
+            pending = len(doc["embeddings"]) - len(doc["rows"])
+            keep = np.concatenate(
+                [~np.isin(doc["rows"], self._tombstone_rows), np.ones(pending, dtype=bool)]
+            )
+
+            if keep.all():
+                snapshot.append((doc, doc["embeddings"], doc["metadata"], doc["lexical_index"]))
+                continue
+
+            chunks = doc["metadata"].take(np.flatnonzero(keep))
+            snapshot.append((doc, doc["embeddings"][keep], chunks, None))
+
+        return snapshot
+
+    def _build(self, snapshot):
+        start = 0
+        rows = []
+        embeddings = []
+        metadata = []
+        lexical = BM25Index()
+
+        for _doc, doc_embeddings, doc_chunks, doc_lexical in snapshot:
+            rows.append(np.arange(start, start + len(doc_chunks), dtype=np.int64))
+            start += len(doc_chunks)
+
+            embeddings.append(doc_embeddings)
+            metadata.append(doc_chunks)
+            lexical.extend(_lexical_for(doc_chunks, doc_lexical))
+
+        index, index_params = build_index(np.vstack(embeddings))
+
+        return self._retriever(index, ChunkStore.concat(metadata), index_params, lexical), rows
+
+    def _apply(self, snapshot, retriever, rows):
+        for (doc, doc_embeddings, doc_chunks, _lexical), doc_rows in zip(snapshot, rows):
+            doc["embeddings"] = doc_embeddings
+            doc["metadata"] = doc_chunks
+            doc["lexical_index"] = _lexical_for(doc_chunks, doc["lexical_index"])
+            doc["rows"] = doc_rows
+
+        self.retriever = retriever
+        self.tombstones = set()
+        self._tombstone_rows = np.zeros(0, dtype=np.int64)
+
+    def _rebuild(self):
+        """
+        Synchronous rebuild from the live rows (caller holds the lock).
+        """
+        if not self.documents:
+            self._reset()
+            return
+
+        snapshot = self._live_snapshot()
+        retriever, rows = self._build(snapshot)
+        self._apply(snapshot, retriever, rows)
+
+    def compact(self):
+        """
+        Rebuild the merged index from live rows without blocking queries.
+        The result is dropped (and compaction retried) if the store changed
+        while it was being built. Returns True when a new index was swapped in.
+        """
+        with self._lock:
+            self._compacting = True
+            generation = self._generation
+
+            if not self.documents:
+                self._compacting = False
+                return False
+
+            snapshot = self._live_snapshot()
+
+        try:
+            retriever, rows = self._build(snapshot)
+        except Exception:
+            with self._lock:
+                self._compacting = False
+            raise
+
+        with self._lock:
+            self._compacting = False
+
+            if generation != self._generation:
+                self._maybe_compact()
+                return False
+
+            self._apply(snapshot, retriever, rows)
+            self._generation += 1
+            self._publish()
+            return True
+
+    # ------------------------------------------------
+    # Queries
+    # ------------------------------------------------
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        The current snapshot. Pin it for the whole of a request.
+        """
+        return self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._snapshot
+
+    def document_ids(self):
+        return self._snapshot.document_ids()
+
+    def describe(self):
+        return self._snapshot.describe()
+
+    def tables(self, doc_id):
+        return self._snapshot.tables(doc_id)
+
+    def table_texts(self, doc_id, table_ids):
+        return self._snapshot.table_texts(doc_id, table_ids)
+
+    def rows_for(self, doc_ids):
+        return self._snapshot.rows_for(doc_ids)
+
+    def encode_query(self, query: str):
+        return self._snapshot.encode_query(query)
+
+    def retrieve(self, query: str, doc_ids=None):
+        return self._snapshot.retrieve(query, doc_ids=doc_ids)
+
+    def retrieve_many(self, queries, doc_ids=None):
+        return self._snapshot.retrieve_many(queries, doc_ids=doc_ids)
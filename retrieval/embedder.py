@@ -1,15 +1,17 @@
 import json
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-MODEL_NAME = "BAAI/bge-base-en"
+from retrieval.bm25 import BM25Index
+from retrieval.chunk_store import ChunkStore
+from retrieval.index_factory import build_index, write_index
+from retrieval.model_registry import MODEL_NAME, get_embedding_model
+from retrieval.rerank_tokens import pretokenize_chunks
 
 def build_faiss_index(chunks_path, index_path, meta_path):
     with open(chunks_path, "r", encoding="utf-8") as f:
         chunks = json.load(f)
 
-    model = SentenceTransformer(MODEL_NAME)
+    model = get_embedding_model(MODEL_NAME)
 
     texts = []
     metadata = []
@@ -34,18 +36,21 @@ def build_faiss_index(chunks_path, index_path, meta_path):
         show_progress_bar=True
     )
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)  # cosine similarity
-    index.add(embeddings.astype(np.float32))
+    # cosine similarity (normalized vectors); flat / HNSW / IVF by corpus size
+    index, index_params = build_index(
+        embeddings.astype(np.float32),
+        originals_path=f"{index_path}.f16.npy",
+    )
 
-    faiss.write_index(index, index_path)
+    write_index(index, index_path, index_params)
+    BM25Index.from_texts(texts).save(f"{index_path}.bm25.npz")
 
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    # Columnar store directory, opened memory-mapped by Retriever
+    ChunkStore.from_records(pretokenize_chunks(metadata)).save(meta_path)
 
 if __name__ == "__main__":
     build_faiss_index(
         chunks_path="data/processed/chunks.json",
         index_path="data/processed/chunks.faiss",
-        meta_path="data/processed/chunks_meta.json"
+        meta_path="data/processed/chunks_meta"
     )
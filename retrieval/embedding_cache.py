@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from retrieval.model_registry import MODEL_NAME, get_embedding_model
+from utils import tracing
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+LOCK_FILE = ".lock"
+
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of normalized chunk embeddings.
+
+    Layout (one directory per embedding model):
+    - vectors.f32 : memory-mapped float32 matrix, one row per slot
+    - index.json  : text hash -> [slot, last_used]
+
+    When every slot is taken, the least recently used entries are evicted.
+
+    Worker processes may share the directory: writers hold an exclusive
+    flock on .lock while they allocate slots, write vectors and rewrite
+    index.json, readers a shared one, and both re-read index.json first
+    when another process has changed it.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str = MODEL_NAME, max_entries: int = 50000):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, safe_name)
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._dim = None
+        self._clock = 0
+        self._entries = {}
+        self._index_version = None
+
+        os.makedirs(self.dir, exist_ok=True)
+
+        with self._locked(exclusive=False):
+            self._load()
+
+    # ------------------------------------------------
+    # Storage
+    # ------------------------------------------------
+
+    def _index_path(self):
+        return os.path.join(self.dir, INDEX_FILE)
+
+    def _vectors_path(self):
+        return os.path.join(self.dir, VECTORS_FILE)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(os.path.join(self.dir, LOCK_FILE), "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _index_stat(self):
+        # index.json is replaced by rename, so each rewrite has a new inode
+        try:
+            stat = os.stat(self._index_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _refresh(self):
+        """
+        Re-read index.json if another process rewrote it (caller holds the
+        file lock). Local recency survives for entries still in the same slot.
+        """
+        if self._index_stat() == self._index_version:
+            return
+
+        touched, clock = self._entries, self._clock
+        self._entries = {}
+        self._load()
+
+        for key, entry in self._entries.items():
+            local = touched.get(key)
+            if local is not None and local[0] == entry[0]:
+                entry[1] = max(entry[1], local[1])
+
+        self._clock = max(self._clock, clock)
+
+    def _load(self):
+        index_path = self._index_path()
+        self._index_version = self._index_stat()
+
+        if not os.path.exists(index_path) or not os.path.exists(self._vectors_path()):
+            return
+
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+
+            if state.get("capacity") != self.max_entries:
+                # Capacity changed: slots no longer line up, start fresh.
+                return
+
+            self._dim = int(state["dim"])
+            self._clock = int(state.get("clock", 0))
+            self._entries = {key: list(value) for key, value in state["entries"].items()}
+            self._vectors = np.memmap(
+                self._vectors_path(),
+                dtype=np.float32,
+                mode="r+",
+                shape=(self.max_entries, self._dim),
+            )
+
+        except Exception as e:
+            print(f"Embedding cache unreadable, resetting: {e}")
+            self._dim = None
+            self._clock = 0
+            self._entries = {}
+            self._vectors = None
+
+    def _ensure_vectors(self, dim):
+        if self._vectors is not None:
+            if dim != self._dim:
+                raise ValueError(f"Embedding cache dim mismatch: {dim} != {self._dim}")
+            return
+
+        self._dim = dim
+        self._entries = {}
+        self._vectors = np.memmap(
+            self._vectors_path(),
+            dtype=np.float32,
+            mode="w+",
+            shape=(self.max_entries, dim),
+        )
+
+    def _save_index(self):
+        tmp_path = self._index_path() + ".tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "model_name": self.model_name,
+                    "dim": self._dim,
+                    "capacity": self.max_entries,
+                    "clock": self._clock,
+                    "entries": self._entries,
+                },
+                f,
+            )
+
+        os.replace(tmp_path, self._index_path())
+        self._index_version = self._index_stat()
+
+    def _free_slots(self, needed):
+        used = {slot for slot, _ in self._entries.values()}
+        free = [slot for slot in range(self.max_entries) if slot not in used]
+
+        if len(free) >= needed:
+            return free[:needed]
+
+        # Evict least recently used entries until enough slots are free.
+        by_age = sorted(self._entries.items(), key=lambda item: item[1][1])
+
+        for key, (slot, _) in by_age[: needed - len(free)]:
+            del self._entries[key]
+            free.append(slot)
+
+        return free
+
+    # ------------------------------------------------
+    # Public API
+    # ------------------------------------------------
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, texts):
+        """
+        Return one vector (or None on miss) per input text.
+        """
+        with self._locked(exclusive=False):
+            self._refresh()
+            results = []
+            self._clock += 1
+
+            for text in texts:
+                entry = self._entries.get(text_hash(text))
+
+                if entry is None or self._vectors is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+
+                self.hits += 1
+                entry[1] = self._clock
+                results.append(np.array(self._vectors[entry[0]], dtype=np.float32))
+
+            return results
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        if not len(texts):
+            return
+
+        # Slot allocation, vector writes and the index rewrite are one step
+        with self._locked(exclusive=True):
+            self._refresh()
+            self._ensure_vectors(vectors.shape[1])
+            self._clock += 1
+
+            pending = {}
+            for text, vector in zip(texts, vectors):
+                key = text_hash(text)
+                if key not in self._entries:
+                    pending[key] = vector
+
+            # A single batch larger than the cache only keeps its tail.
+            items = list(pending.items())[-self.max_entries:]
+            slots = self._free_slots(len(items))
+
+            for (key, vector), slot in zip(items, slots):
+                self._vectors[slot] = vector
+                self._entries[key] = [slot, self._clock]
+
+            self._vectors.flush()
+            self._save_index()
+
+    def clear(self):
+        with self._locked(exclusive=True):
+            self._entries = {}
+            self._clock = 0
+            if self._vectors is not None:
+                self._save_index()
+
+    def stats(self):
+        return {
+            "model_name": self.model_name,
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# ------------------------------------------------
+# Process-wide caches
+# ------------------------------------------------
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str = MODEL_NAME):
+    """
+    Shared cache for a model, or None when disabled via RAG_EMBEDDING_CACHE.
+    """
+    enabled = os.getenv("RAG_EMBEDDING_CACHE", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+    if not enabled:
+        return None
+
+    with _caches_lock:
+        cache = _caches.get(model_name)
+
+        if cache is None:
+            cache = EmbeddingCache(
+                cache_dir=os.getenv("RAG_EMBEDDING_CACHE_DIR", "/tmp/rag_cache/embeddings"),
+                model_name=model_name,
+                max_entries=int(os.getenv("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "50000")),
+            )
+            _caches[model_name] = cache
+
+    return cache
+
+
+def encode_texts(texts, model_name: str = MODEL_NAME, cache=None):
+    """
+    Encode texts into normalized float32 vectors, only running the
+    model on cache misses. The model is not touched when everything hits.
+    """
+    if cache is None:
+        model = get_embedding_model(model_name)
+        embeddings = model.encode(
+            texts,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    cached = cache.get_many(texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+
+    if missing:
+        model = get_embedding_model(model_name)
+        missing_texts = [texts[i] for i in missing]
+        fresh = np.asarray(
+            model.encode(
+                missing_texts,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            ),
+            dtype=np.float32,
+        )
+
+        cache.put_many(missing_texts, fresh)
+
+        for i, vector in zip(missing, fresh):
+            cached[i] = vector
+
+    tracing.count_embedding_lookups(len(texts) - len(missing), len(missing))
+
+    return np.vstack(cached).astype(np.float32, copy=False)
@@ -0,0 +1,333 @@
+import json
+import math
+import os
+
+import faiss
+import numpy as np
+
+from retrieval.compressed_index import (
+    COMPRESSION_TYPES,
+    RescoringIndex,
+    compression_codec,
+    default_originals_path,
+    save_originals,
+)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def choose_index_type(num_vectors: int, index_type: str = None) -> str:
+    """
+    RAG_INDEX_TYPE forces a type; "auto" (default) picks by corpus size:
+    exact flat search for small documents, HNSW for mid-sized corpora,
+    IVF once HNSW's graph memory stops paying off.
+    """
+    index_type = (index_type or os.getenv("RAG_INDEX_TYPE", "auto")).strip().lower()
+
+    if index_type in INDEX_TYPES:
+        return index_type
+
+    if index_type != "auto":
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if num_vectors <= _env_int("RAG_FLAT_MAX_VECTORS", 20000):
+        return "flat"
+
+    if num_vectors <= _env_int("RAG_HNSW_MAX_VECTORS", 500000):
+        return "hnsw"
+
+    return "ivf"
+
+
+def _ivf_nlist(num_vectors):
+    # ~4*sqrt(n) lists, keeping >= 39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def _sample_queries(embeddings, max_queries=200, seed=0):
+    count = min(max_queries, len(embeddings))
+    rows = np.random.default_rng(seed).choice(len(embeddings), size=count, replace=False)
+    return np.ascontiguousarray(embeddings[rows])
+
+
+def recall_at_k(index, embeddings, queries, k: int) -> float:
+    """
+    Fraction of exact inner-product top-k neighbours that `index` also returns.
+    """
+    k = min(k, len(embeddings))
+
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+    _, truth = exact.search(queries, k)
+    _, found = index.search(queries, k)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / float(truth.size)
+
+
+def apply_search_params(index, params: dict):
+    """
+    Re-apply tuned query-time knobs (lost on some save/load paths).
+    """
+    if not params:
+        return index
+
+    # Knobs live on the first-pass index of a compressed index
+    index = getattr(index, "coarse", index)
+    space = faiss.ParameterSpace()
+
+    if params.get("type") == "ivf" and params.get("nprobe"):
+        space.set_index_parameter(index, "nprobe", int(params["nprobe"]))
+
+    if params.get("type") == "hnsw" and params.get("ef_search"):
+        space.set_index_parameter(index, "efSearch", int(params["ef_search"]))
+
+    return index
+
+
+def search_parameters(index, params: dict, selector):
+    """
+    Per-query faiss SearchParameters restricting results to `selector`.
+    Typed params replace the index's own knobs, so tuned values are carried over.
+    """
+    index = getattr(index, "coarse", index)
+    params = params or {}
+
+    if params.get("type") == "hnsw":
+        ef_search = params.get("ef_search") or index.hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=int(ef_search))
+
+    if params.get("type") == "ivf":
+        nprobe = params.get("nprobe") or faiss.extract_index_ivf(index).nprobe
+        return faiss.SearchParametersIVF(sel=selector, nprobe=int(nprobe))
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def _target_recall():
+    return float(os.getenv("RAG_ANN_TARGET_RECALL", "0.95"))
+
+
+def _tune(index, embeddings, params, knob, candidates, k, target):
+    queries = _sample_queries(embeddings)
+    recall = None
+
+    for value in candidates:
+        params[knob] = value
+        apply_search_params(index, params)
+        recall = recall_at_k(index, embeddings, queries, k)
+
+        if recall >= target:
+            break
+
+    params["tuned_recall"] = round(recall, 4) if recall is not None else None
+    params["target_recall"] = target
+
+
+def _factory_string(index_type, num_vectors, dim, compression, params):
+    codec = "Flat" if compression == "none" else compression_codec(compression, num_vectors, dim)
+
+    if index_type == "hnsw":
+        m = _env_int("RAG_HNSW_M", 32)
+        params["m"] = m
+        return f"HNSW{m}" if codec == "Flat" else f"HNSW{m}_{codec}"
+
+    if index_type == "ivf":
+        nlist = _ivf_nlist(num_vectors)
+        params["nlist"] = nlist
+        return f"IVF{nlist},{codec}"
+
+    return codec
+
+
+def _build_coarse(embeddings, index_type, compression, params):
+    num_vectors, dim = embeddings.shape
+    factory = _factory_string(index_type, num_vectors, dim, compression, params)
+    params["factory"] = factory
+
+    if factory == "Flat":
+        index = faiss.IndexFlatIP(dim)
+    else:
+        index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = _env_int("RAG_HNSW_EF_CONSTRUCTION", 80)
+        params["ef_construction"] = index.hnsw.efConstruction
+
+    if not index.is_trained:
+        index.train(embeddings)
+
+    index.add(embeddings)
+    return index
+
+
+def _tune_ann(index, embeddings, params, tune_k, target):
+    if params["type"] == "hnsw":
+        _tune(index, embeddings, params, "ef_search", [16, 32, 64, 128, 256, 512], tune_k, target)
+
+    elif params["type"] == "ivf":
+        nlist = params["nlist"]
+        probes = [p for p in (1, 2, 4, 8, 16, 32, 64, 128, 256) if p < nlist] + [nlist]
+        _tune(index, embeddings, params, "nprobe", probes, tune_k, target)
+
+
+def _compress(index, embeddings, params, originals_path, tune_k):
+    """
+    Wrap compressed codes with exact float16 re-scoring and grow the
+    over-fetch factor until recall@k is within RAG_RECALL_TOLERANCE of what
+    the uncompressed index would reach (1.0 for flat, the ANN target otherwise).
+    Returns None if the tolerance can't be met.
+
+    Without an originals_path the originals go to a scratch file that is
+    deleted along with the returned index.
+    """
+    tolerance = float(os.getenv("RAG_RECALL_TOLERANCE", "0.02"))
+    baseline = 1.0 if params["type"] == "flat" else _target_recall()
+    required = baseline - tolerance
+
+    scratch = originals_path is None
+    originals_path = originals_path or default_originals_path()
+    save_originals(originals_path, embeddings)
+
+    queries = _sample_queries(embeddings)
+    oversample = _env_int("RAG_RESCORE_OVERSAMPLE", 4)
+    max_oversample = _env_int("RAG_RESCORE_MAX_OVERSAMPLE", 32)
+
+    while True:
+        wrapped = RescoringIndex(index, originals_path, oversample=oversample)
+        _tune_ann(wrapped, embeddings, params, tune_k, required)
+        recall = recall_at_k(wrapped, embeddings, queries, tune_k)
+
+        if recall >= required or oversample >= max_oversample:
+            break
+
+        oversample *= 2
+
+    params.update({
+        "originals_path": originals_path,
+        "originals_dtype": "float16",
+        "oversample": oversample,
+        "recall_at_k": round(recall, 4),
+        "required_recall": round(required, 4),
+    })
+
+    if recall < required:
+        os.remove(originals_path)
+        return None
+
+    return wrapped.own_originals() if scratch else wrapped
+
+
+def build_index(
+    embeddings,
+    index_type: str = None,
+    tune_k: int = 25,
+    compression: str = None,
+    originals_path: str = None,
+):
+    """
+    Build an inner-product index (vectors are L2-normalized, so IP == cosine)
+    and return it with the parameters that were chosen for it.
+
+    compression (RAG_VECTOR_COMPRESSION): "none", "sq8" or "pq". Compressed
+    indexes keep codes in memory and re-score against float16 originals on
+    disk: at originals_path if given (kept), else in a scratch file under
+    RAG_VECTOR_STORE_DIR that is removed once the index is collected.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    num_vectors, dim = embeddings.shape
+    chosen = choose_index_type(num_vectors, index_type)
+
+    compression = (compression or os.getenv("RAG_VECTOR_COMPRESSION", "none")).strip().lower()
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"Unknown vector compression: {compression}")
+
+    params = {
+        "type": chosen,
+        "metric": "inner_product",
+        "dim": int(dim),
+        "ntotal": int(num_vectors),
+    }
+
+    if compression != "none":
+        params["compression"] = compression
+        index = _build_coarse(embeddings, chosen, compression, params)
+        compressed = _compress(index, embeddings, params, originals_path, tune_k)
+
+        if compressed is not None:
+            return compressed, params
+
+        print(
+            f"{compression} recall@{tune_k}={params['recall_at_k']} outside tolerance, "
+            "falling back to uncompressed index"
+        )
+        params = {
+            "type": chosen,
+            "metric": "inner_product",
+            "dim": int(dim),
+            "ntotal": int(num_vectors),
+            "compression_rejected": compression,
+        }
+
+    index = _build_coarse(embeddings, chosen, "none", params)
+    _tune_ann(index, embeddings, params, tune_k, _target_recall())
+
+    return index, params
+
+
+def index_params_path(index_path: str) -> str:
+    return f"{index_path}.params.json"
+
+
+def save_index_params(index_path: str, params: dict):
+    with open(index_params_path(index_path), "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+
+def load_index_params(index_path: str):
+    path = index_params_path(index_path)
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_index(index, index_path: str, params: dict):
+    """
+    Persist an index built by build_index; compressed indexes store
+    only their first-pass codes here (originals are already on disk).
+    """
+    faiss.write_index(getattr(index, "coarse", index), index_path)
+    save_index_params(index_path, params)
+
+
+def read_index(index_path: str, mmap: bool = True):
+    """
+    Open an index written by write_index. With mmap the vector codes stay
+    in the OS page cache (shared between worker processes) instead of being
+    copied onto each process heap.
+    """
+    params = load_index_params(index_path) or {}
+    index = None
+
+    if mmap:
+        flags = faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            index = faiss.read_index(index_path, flags)
+        except RuntimeError as e:
+            print(f"Memory-mapped index load failed, reading into memory: {e}")
+
+    if index is None:
+        index = faiss.read_index(index_path)
+
+    if params.get("compression"):
+        index = RescoringIndex(index, params["originals_path"], params.get("oversample", 4))
+
+    apply_search_params(index, params)
+    return index, params
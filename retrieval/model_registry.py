@@ -0,0 +1,168 @@
+import os
+import threading
+
+import torch
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from retrieval.onnx_backend import load_onnx_cross_encoder, load_onnx_embedding_model, model_backend
+from utils.micro_batcher import MicroBatcher
+
+MODEL_NAME = "BAAI/bge-base-en"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+_lock = threading.Lock()
+_embedding_models = {}
+_cross_encoders = {}
+
+
+def _device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _with_backend(model, model_name, loader):
+    """
+    Swap in the int8 ONNX Runtime model when RAG_MODEL_BACKEND=onnx and it
+    passes its parity check; otherwise keep the PyTorch model.
+    """
+    if model_backend() != "onnx":
+        return model
+
+    try:
+        onnx_model = loader(model, model_name)
+    except Exception as exc:
+        print(f"ONNX backend unavailable for {model_name}: {exc}")
+        onnx_model = None
+
+    return onnx_model if onnx_model is not None else model
+
+
+def batching_enabled() -> bool:
+    return os.getenv("RAG_MICRO_BATCHING", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+
+def make_batcher(fn, name):
+    return MicroBatcher(
+        fn,
+        max_batch_size=int(os.getenv("RAG_BATCH_MAX_SIZE", "64")),
+        max_wait_ms=float(os.getenv("RAG_BATCH_MAX_WAIT_MS", "5")),
+        name=name,
+    )
+
+
+class BatchedEmbeddingModel:
+    """
+    SentenceTransformer front end whose encode() calls from concurrent
+    requests are merged into one forward pass. Everything else is
+    delegated to the wrapped model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.batcher = make_batcher(self._encode_batch, "embedding-batcher")
+
+    def _encode_batch(self, sentences, **kwargs):
+        return self.model.encode(sentences, **kwargs)
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self.batcher.submit([sentences], **kwargs)[0]
+        return self.batcher.submit(sentences, **kwargs)
+
+    def __getattr__(self, name):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+class BatchedCrossEncoder:
+    """
+    CrossEncoder front end batching predict() across concurrent requests.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.batcher = make_batcher(self._predict_batch, "reranker-batcher")
+
+    def _predict_batch(self, pairs, **kwargs):
+        return self.model.predict(pairs, **kwargs)
+
+    def predict(self, pairs, **kwargs):
+        return self.batcher.submit(pairs, **kwargs)
+
+    def __getattr__(self, name):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+def get_embedding_model(model_name: str = MODEL_NAME):
+    """
+    Process-wide embedding model.
+    Every model is loaded from disk once and the same
+    instance is shared by ingestion, retrieval and evaluation.
+    With RAG_MICRO_BATCHING it is wrapped so concurrent
+    encode() calls share forward passes.
+    """
+    model = _embedding_models.get(model_name)
+
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _embedding_models.get(model_name)
+
+        if model is None:
+            print(f"Loading embedding model: {model_name}")
+            model = SentenceTransformer(model_name, device=_device())
+            model = _with_backend(model, model_name, load_onnx_embedding_model)
+            if batching_enabled():
+                model = BatchedEmbeddingModel(model)
+            _embedding_models[model_name] = model
+
+    return model
+
+
+def get_cross_encoder(model_name: str = RERANKER_MODEL_NAME):
+    model = _cross_encoders.get(model_name)
+
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _cross_encoders.get(model_name)
+
+        if model is None:
+            device = _device()
+            print(f"Loading reranker: {model_name} on {device}")
+            model = CrossEncoder(model_name, device=device)
+            model = _with_backend(model, model_name, load_onnx_cross_encoder)
+            if batching_enabled():
+                model = BatchedCrossEncoder(model)
+            _cross_encoders[model_name] = model
+
+    return model
+
+
+def warmup_models(
+    embedding_model_name: str = MODEL_NAME,
+    reranker_model_name: str = RERANKER_MODEL_NAME,
+):
+    """
+    Load the shared models and run one tiny forward pass each,
+    so the first upload or chat does not pay for lazy initialisation.
+    """
+    get_embedding_model(embedding_model_name).encode(
+        ["warmup"],
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+
+    get_cross_encoder(reranker_model_name).predict([["warmup", "warmup"]])
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("RAG_WARMUP_MODELS", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
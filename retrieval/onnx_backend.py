@@ -0,0 +1,331 @@
+import hashlib
+import os
+import re
+import uuid
+
+import numpy as np
+import torch
+
+# Bump when export_quantized changes what it writes
+EXPORT_VERSION = 1
+
+PARITY_QUERIES = [
+    "What was the revenue growth this year?",
+    "Which risks could affect the operating margin?",
+    "How much dividend was declared per share?",
+]
+PARITY_DOCUMENTS = [
+    "Financial Highlights: Revenue grew 15% year on year to 1,200 crore, led by digital services.",
+    "Risk Management: Currency volatility and wage inflation may compress the operating margin.",
+    "Shareholder Information: The board recommended a final dividend of 8 per share.",
+]
+
+
+def model_backend() -> str:
+    """
+    RAG_MODEL_BACKEND: "torch" (default) or "onnx" (int8 ONNX Runtime on CPU).
+    """
+    return os.getenv("RAG_MODEL_BACKEND", "torch").strip().lower()
+
+
+def onnx_dir() -> str:
+    return os.getenv("RAG_ONNX_DIR", "/tmp/rag_cache/onnx")
+
+
+def _model_dir(model_name):
+    return os.path.join(onnx_dir(), re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+
+def _fingerprint(hf_model):
+    """
+    Identifies the exported weights: export version, hub revision, config
+    and a sample of the parameters (local checkpoints have no revision).
+    """
+    digest = hashlib.sha1(f"v{EXPORT_VERSION}".encode("utf-8"))
+    config = hf_model.config
+    digest.update(str(getattr(config, "_commit_hash", None)).encode("utf-8"))
+    digest.update(config.to_json_string(use_diff=False).encode("utf-8"))
+
+    parameters = list(hf_model.parameters())
+    for parameter in (parameters[0], parameters[-1]):
+        digest.update(parameter.detach().cpu().float().numpy().tobytes())
+
+    return digest.hexdigest()[:16]
+
+
+def _export_path(model_name, kind, hf_model):
+    # A new model revision or export version gets a new file, never a stale one
+    return os.path.join(_model_dir(model_name), f"{kind}.{_fingerprint(hf_model)}.int8.onnx")
+
+
+class _LogitsModule(torch.nn.Module):
+    """
+    Export wrapper returning a single tensor from a transformers model.
+    """
+
+    def __init__(self, model, output):
+        super().__init__()
+        self.model = model
+        self.output = output
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            kwargs["token_type_ids"] = token_type_ids
+        return getattr(self.model(**kwargs), self.output)
+
+
+def export_quantized(hf_model, tokenizer, path: str, output: str):
+    """
+    Export a transformers model to ONNX (dynamic batch and sequence axes)
+    and write a dynamically int8-quantized copy to `path`.
+
+    Both files are written under scratch names in the same directory and
+    the result is renamed into place, so workers loading concurrently see
+    either the complete model or no file.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in tokenizer.model_input_names]
+    sample = tokenizer(["warmup query"], ["warmup document"], return_tensors="pt")
+    args = tuple(sample[name] for name in input_names)
+
+    scratch = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    float_path = f"{scratch}.fp32.onnx"
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["output"] = {0: "batch"}
+
+    module = _LogitsModule(hf_model.cpu().eval(), output)
+
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                module,
+                args,
+                float_path,
+                input_names=input_names,
+                output_names=["output"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                dynamo=False,
+            )
+
+        quantize_dynamic(float_path, scratch, weight_type=QuantType.QInt8)
+        os.replace(scratch, path)
+
+    finally:
+        for leftover in (float_path, scratch):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+class _OnnxSession:
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        threads = int(os.getenv("RAG_ONNX_THREADS", "0"))
+        if threads > 0:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [item.name for item in self.session.get_inputs()]
+
+    def run(self, features):
+        feed = {name: np.asarray(features[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0]
+
+
+class OnnxEmbeddingModel:
+    """
+    int8 ONNX Runtime replacement for a SentenceTransformer with a
+    Transformer -> Pooling (cls / mean) [-> Normalize] pipeline.
+    Implements the encode() arguments this repo uses.
+    """
+
+    def __init__(self, session, tokenizer, pooling, normalize, max_seq_length):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.pooling = pooling
+        self.normalize = normalize
+        self.max_seq_length = max_seq_length
+
+    def get_sentence_embedding_dimension(self):
+        return int(self.encode(["dimension"]).shape[1])
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, show_progress_bar=None, **_kwargs):
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        outputs = []
+
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            features = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            hidden = self.session.run(features)
+            mask = np.asarray(features["attention_mask"], dtype=np.float32)[:, :, None]
+
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            outputs.append(pooled.astype(np.float32))
+
+        embeddings = np.vstack(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
+
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+        return embeddings[0] if single else embeddings
+
+
+class OnnxCrossEncoder:
+    """
+    int8 ONNX Runtime replacement for a sequence-classification CrossEncoder.
+    predict() matches CrossEncoder.predict; forward_logits() serves the
+    pre-tokenized reranker path.
+    """
+
+    def __init__(self, session, tokenizer, activation_fn, max_length):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.activation_fn = activation_fn
+        self.max_length = max_length
+
+    def forward_logits(self, features):
+        return self.session.run(features)
+
+    def _activate(self, logits):
+        if self.activation_fn is not None:
+            with torch.inference_mode():
+                logits = self.activation_fn(torch.from_numpy(logits)).numpy()
+        return logits[:, 0] if logits.ndim == 2 and logits.shape[1] == 1 else logits
+
+    def predict(self, pairs, batch_size=32, **_kwargs):
+        pairs = [list(pair) for pair in pairs]
+        scores = []
+
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            features = self.tokenizer(
+                [query for query, _document in batch],
+                [document for _query, document in batch],
+                padding=True,
+                truncation="longest_first",
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            scores.append(self._activate(self.forward_logits(features).astype(np.float32)))
+
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+def cross_encoder_max_length(model):
+    # Renamed to max_seq_length in newer sentence-transformers
+    return getattr(model, "max_seq_length", None) or getattr(model, "max_length", None) or 512
+
+
+def _pooling(model):
+    """
+    (pooling mode, normalize) of a SentenceTransformer, or None if the
+    pipeline has modules the ONNX path does not reproduce.
+    """
+    names = [type(module).__name__ for module in model]
+
+    if names not in (["Transformer", "Pooling"], ["Transformer", "Pooling", "Normalize"]):
+        return None
+
+    pooling = model[1]
+    mode = getattr(pooling, "pooling_mode", None)
+
+    if not isinstance(mode, str):
+        mode = pooling.get_pooling_mode_str()
+
+    if mode not in {"cls", "mean"}:
+        return None
+
+    return mode, names[-1] == "Normalize"
+
+
+def _cosine_parity(reference, candidate):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return float(np.min(np.sum(reference * candidate, axis=1)))
+
+
+def load_onnx_embedding_model(model, model_name: str):
+    """
+    int8 ONNX version of a loaded SentenceTransformer, exported on first use
+    and kept only if its embeddings stay within RAG_ONNX_MIN_COSINE of the
+    PyTorch ones. Returns None when unsupported or below parity.
+    """
+    pooling = _pooling(model)
+
+    if pooling is None:
+        print(f"ONNX backend: unsupported pipeline for {model_name}, keeping PyTorch")
+        return None
+
+    hf_model = model[0].auto_model
+    path = _export_path(model_name, "embedder", hf_model)
+
+    if not os.path.exists(path):
+        export_quantized(hf_model, model.tokenizer, path, output="last_hidden_state")
+
+    candidate = OnnxEmbeddingModel(_OnnxSession(path), model.tokenizer, *pooling, model.max_seq_length)
+
+    texts = PARITY_QUERIES + PARITY_DOCUMENTS
+    cosine = _cosine_parity(
+        np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32),
+        candidate.encode(texts, normalize_embeddings=True),
+    )
+    required = float(os.getenv("RAG_ONNX_MIN_COSINE", "0.99"))
+
+    print(f"ONNX backend: {model_name} min cosine vs PyTorch = {cosine:.4f} (required {required})")
+
+    return candidate if cosine >= required else None
+
+
+def load_onnx_cross_encoder(model, model_name: str):
+    """
+    int8 ONNX version of a loaded CrossEncoder, kept only if its scores on
+    the parity pairs stay within RAG_ONNX_SCORE_TOLERANCE of PyTorch's
+    (relative to the PyTorch score range) and it ranks the same document
+    first for every parity query.
+    """
+    hf_model = getattr(model, "transformers_model", None)
+    if hf_model is None:
+        hf_model = model.model
+
+    activation = getattr(model, "activation_fn", None)
+    if activation is None:
+        activation = getattr(model, "default_activation_function", None)
+
+    path = _export_path(model_name, "cross_encoder", hf_model)
+
+    if not os.path.exists(path):
+        export_quantized(hf_model, model.tokenizer, path, output="logits")
+
+    candidate = OnnxCrossEncoder(_OnnxSession(path), model.tokenizer, activation, cross_encoder_max_length(model))
+
+    pairs = [[query, document] for query in PARITY_QUERIES for document in PARITY_DOCUMENTS]
+    reference = np.asarray(model.predict(pairs), dtype=np.float32)
+    scores = candidate.predict(pairs)
+
+    delta = float(np.max(np.abs(reference - scores)) / max(float(np.ptp(reference)), 1e-6))
+    same_top = all(
+        np.argmax(reference[i:i + len(PARITY_DOCUMENTS)]) == np.argmax(scores[i:i + len(PARITY_DOCUMENTS)])
+        for i in range(0, len(pairs), len(PARITY_DOCUMENTS))
+    )
+    tolerance = float(os.getenv("RAG_ONNX_SCORE_TOLERANCE", "0.1"))
+
+    print(f"ONNX backend: {model_name} max relative score delta = {delta:.4f}, same top-1 = {same_top}")
+
+    return candidate if delta <= tolerance and same_top else None
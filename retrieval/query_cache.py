@@ -0,0 +1,74 @@
+import os
+import threading
+
+import numpy as np
+
+from utils.lru_cache import LRUCache
+
+
+def normalize_query(query: str) -> str:
+    # bge-*-en is uncased, so case and spacing variants share one vector
+    return " ".join((query or "").split()).lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU/TTL cache of normalized query -> embedding vector.
+    The whole cache is dropped as soon as a different embedding model asks for it.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 3600):
+        self._cache = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._model_name = None
+        self._lock = threading.Lock()
+
+    def _check_model(self, model_name):
+        if model_name == self._model_name:
+            return
+
+        with self._lock:
+            if model_name != self._model_name:
+                self._cache.clear()
+                self._model_name = model_name
+
+    def get(self, model_name: str, query: str):
+        self._check_model(model_name)
+        return self._cache.get(normalize_query(query))
+
+    def put(self, model_name: str, query: str, vector):
+        self._check_model(model_name)
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        self._cache.put(normalize_query(query), vector)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return {"model_name": self._model_name, **self._cache.stats()}
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """
+    Process-wide query cache shared by every Retriever,
+    or None when RAG_QUERY_CACHE_SIZE is 0.
+    """
+    global _query_cache
+
+    max_size = int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+
+    if max_size <= 0:
+        return None
+
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(
+                max_size=max_size,
+                ttl_seconds=float(os.getenv("RAG_QUERY_CACHE_TTL", "3600")),
+            )
+
+    return _query_cache
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+
+from retrieval.query_cache import normalize_query
+from utils.lru_cache import LRUCache
+
+
+def query_hash(query: str) -> str:
+    # ms-marco-MiniLM is uncased, so normalized variants score identically
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+class RerankScoreCache:
+    """
+    Bounded LRU/TTL cache of cross-encoder scores keyed by
+    (model, normalized query hash, doc_id, chunk_id, content digest).
+
+    Chunk IDs are only unique within a document and are reused when it is
+    replaced; the content digest (stored with the chunk) keeps a request still running against the
+    old content from storing scores the new content would then be served.
+    Entries for a replaced document are also invalidated to free space.
+    """
+
+    def __init__(self, max_size: int = 20000, ttl_seconds: float = 3600):
+        self._cache = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+    def get_many(self, model_name: str, query: str, chunk_keys):
+        """
+        Cached score (or None) for each (doc_id, chunk_id, digest) key.
+        """
+        qhash = query_hash(query)
+        return [self._cache.get((model_name, qhash, *key)) for key in chunk_keys]
+
+    def put_many(self, model_name: str, query: str, chunk_keys, scores):
+        qhash = query_hash(query)
+        for key, score in zip(chunk_keys, scores):
+            self._cache.put((model_name, qhash, *key), float(score))
+
+    def invalidate_document(self, doc_id) -> int:
+        return self._cache.remove_where(lambda key: key[2] == doc_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+_rerank_cache = None
+_rerank_cache_lock = threading.Lock()
+
+
+def get_rerank_cache():
+    """
+    Process-wide score cache shared by every Reranker,
+    or None when RAG_RERANK_CACHE_SIZE is 0.
+    """
+    global _rerank_cache
+
+    max_size = int(os.getenv("RAG_RERANK_CACHE_SIZE", "20000"))
+
+    if max_size <= 0:
+        return None
+
+    with _rerank_cache_lock:
+        if _rerank_cache is None:
+            _rerank_cache = RerankScoreCache(
+                max_size=max_size,
+                ttl_seconds=float(os.getenv("RAG_RERANK_CACHE_TTL", "3600")),
+            )
+
+    return _rerank_cache
@@ -0,0 +1,115 @@
+import os
+
+
+def _rerank_key(result):
+    score = result.get("rerank_score")
+    return float("-inf") if score is None else score
+
+
+class RerankCascade:
+    """
+    Decides how much of the candidate list the cross-encoder sees.
+
+    1. Pre-filter: candidates whose retriever score is below
+       min_retriever_score could never be grounded, so they are dropped.
+       If nothing is left the query is refusal-bound and the cross-encoder
+       is skipped entirely.
+    2. Prefix: only candidates within RAG_CASCADE_SCORE_WINDOW of the best
+       retriever score are reranked; when the top hit leads the runner-up by
+       RAG_CASCADE_DOMINANCE_MARGIN the prefix shrinks to max_context_chunks.
+    3. Stages: the prefix is reranked RAG_CASCADE_STAGE_SIZE (default
+       max_context_chunks) candidates at a time, stopping as soon as a stage
+       leaves the top max_context_chunks unchanged.
+
+    Every decision is returned alongside the ranking for debug output.
+    """
+
+    def __init__(self, max_context_chunks=5, min_retriever_score=0.0):
+        self.max_context_chunks = max_context_chunks
+        self.min_retriever_score = min_retriever_score
+
+        self.enabled = os.getenv("RAG_RERANK_CASCADE", "true").strip().lower() in {
+            "1", "true", "yes", "on"
+        }
+        self.score_window = float(os.getenv("RAG_CASCADE_SCORE_WINDOW", "0.25"))
+        self.dominance_margin = float(os.getenv("RAG_CASCADE_DOMINANCE_MARGIN", "0.15"))
+        # Stages the size of the context let a fused top-15 stop after 10
+        self.stage_size = max(1, int(os.getenv("RAG_CASCADE_STAGE_SIZE", str(max_context_chunks))))
+
+    def _prefix(self, candidates, decisions):
+        # Lexical-only hits may carry no cosine score; they stay in the prefix
+        scores = sorted((c.get("score") for c in candidates if c.get("score") is not None), reverse=True)
+
+        if not scores:
+            return candidates
+
+        if len(scores) > 1 and scores[0] - scores[1] >= self.dominance_margin:
+            decisions["dominant_top_hit"] = True
+            prefix = candidates[: self.max_context_chunks]
+        else:
+            floor = scores[0] - self.score_window
+            prefix = [c for c in candidates if c.get("score") is None or c.get("score") >= floor]
+
+        # Never rerank fewer candidates than the context can hold
+        if len(prefix) < self.max_context_chunks:
+            prefix = candidates[: self.max_context_chunks]
+
+        return prefix
+
+    def run(self, query, candidates, reranker, top_k=7):
+        """
+        Returns (ranked results, decisions).
+        """
+        decisions = {
+            "enabled": self.enabled,
+            "candidates": len(candidates),
+            "prefiltered": 0,
+            "skipped": False,
+            "dominant_top_hit": False,
+            "prefix": len(candidates),
+            "stages": [],
+            "early_stop": False,
+            "reranked": 0,
+        }
+
+        if not self.enabled:
+            ranked = reranker.rerank(query, candidates, top_k=top_k)
+            decisions["reranked"] = len(candidates)
+            decisions["stages"] = [len(candidates)]
+            return ranked, decisions
+
+        eligible = [
+            c for c in candidates
+            if c.get("score") is None or c.get("score") >= self.min_retriever_score
+        ]
+        decisions["prefiltered"] = len(candidates) - len(eligible)
+
+        if not eligible:
+            decisions["skipped"] = True
+            decisions["reason"] = "all candidates below min_retriever_score"
+            return [], decisions
+
+        prefix = self._prefix(eligible, decisions)
+        decisions["prefix"] = len(prefix)
+
+        ranked = []
+        settled = None
+
+        for start in range(0, len(prefix), self.stage_size):
+            stage = prefix[start:start + self.stage_size]
+
+            ranked.extend(reranker.rerank(query, stage, top_k=len(stage)))
+            ranked.sort(key=_rerank_key, reverse=True)
+
+            decisions["stages"].append(len(stage))
+            decisions["reranked"] += len(stage)
+
+            top = [id(r) for r in ranked[: self.max_context_chunks]]
+
+            if top == settled and start + self.stage_size < len(prefix):
+                decisions["early_stop"] = True
+                break
+
+            settled = top
+
+        return ranked[:top_k], decisions
@@ -0,0 +1,179 @@
+import os
+import threading
+
+import numpy as np
+import torch
+
+from retrieval.model_registry import RERANKER_MODEL_NAME, BatchedCrossEncoder, get_cross_encoder
+from retrieval.onnx_backend import cross_encoder_max_length
+
+
+def pretokenize_enabled() -> bool:
+    return os.getenv("RAG_RERANK_PRETOKENIZE", "true").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+
+def rerank_document_text(meta) -> str:
+    # Document side of every (query, document) reranker pair
+    return f"{meta.get('section', '')}: {meta.get('chunk_text', '')}"
+
+
+class RerankTokenizer:
+    """
+    Cross-encoder inputs assembled from token IDs.
+
+    The document side of each pair is tokenized (and truncated) once at
+    ingest time; per request only the query is tokenized and joined with
+    the stored document tokens as [CLS] query [SEP] document [SEP].
+    `supported` is False when the model's pair encoding differs from that
+    layout, in which case callers keep using CrossEncoder.predict.
+    """
+
+    def __init__(self, cross_encoder):
+        if isinstance(cross_encoder, BatchedCrossEncoder):
+            cross_encoder = cross_encoder.model
+
+        self.tokenizer = getattr(cross_encoder, "tokenizer", None)
+
+        # ONNX Runtime models expose their logits directly
+        self.forward_logits = getattr(cross_encoder, "forward_logits", None)
+        self.hf_model = None
+
+        if self.forward_logits is None:
+            self.hf_model = getattr(cross_encoder, "transformers_model", None)
+            if self.hf_model is None:
+                self.hf_model = getattr(cross_encoder, "model", None)
+
+        # Same post-processing CrossEncoder.predict applies
+        self.activation = getattr(cross_encoder, "activation_fn", None)
+        if self.activation is None:
+            self.activation = getattr(cross_encoder, "default_activation_function", None)
+
+        self.max_length = cross_encoder_max_length(cross_encoder)
+        # Query budget; the rest of max_length is reserved for the document
+        self.query_tokens = min(int(os.getenv("RAG_RERANK_QUERY_TOKENS", "64")), self.max_length // 4)
+
+        self.supported = self._check_pair_format()
+
+        if self.supported and self.hf_model is not None:
+            self.hf_model.eval()
+
+    @property
+    def document_tokens(self):
+        return max(1, self.max_length - self.query_tokens - 3)
+
+    def _check_pair_format(self):
+        tokenizer = self.tokenizer
+
+        if tokenizer is None or (self.hf_model is None and self.forward_logits is None):
+            return False
+
+        if tokenizer.cls_token_id is None or tokenizer.sep_token_id is None:
+            return False
+
+        try:
+            query = "what was revenue growth?"
+            document = "Results: revenue grew 15% to 1,200 crore."
+            expected = tokenizer(query, document)
+            ids, type_ids = self.pair_inputs(self.query_ids(query), self.document_ids([document])[0])
+        except Exception:
+            return False
+
+        if list(expected["input_ids"]) != ids:
+            return False
+
+        return "token_type_ids" not in expected or list(expected["token_type_ids"]) == type_ids
+
+    def document_ids(self, texts):
+        encoded = self.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.document_tokens,
+        )
+        return [list(ids) for ids in encoded["input_ids"]]
+
+    def query_ids(self, query: str):
+        encoded = self.tokenizer(
+            query,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.query_tokens,
+        )
+        return list(encoded["input_ids"])
+
+    def pair_inputs(self, query_ids, document_ids):
+        document_ids = [int(i) for i in document_ids[: max(0, self.max_length - len(query_ids) - 3)]]
+        ids = [self.tokenizer.cls_token_id, *query_ids, self.tokenizer.sep_token_id, *document_ids, self.tokenizer.sep_token_id]
+        type_ids = [0] * (len(query_ids) + 2) + [1] * (len(document_ids) + 1)
+        return ids, type_ids
+
+    def score(self, pairs):
+        """
+        pairs: [(query_ids, document_ids)] -> scores as CrossEncoder.predict returns them.
+        """
+        encoded = [self.pair_inputs(query_ids, document_ids) for query_ids, document_ids in pairs]
+        width = max(len(ids) for ids, _type_ids in encoded)
+
+        input_ids = np.full((len(encoded), width), self.tokenizer.pad_token_id or 0, dtype=np.int64)
+        token_type_ids = np.zeros_like(input_ids)
+        attention_mask = np.zeros_like(input_ids)
+
+        for row, (ids, type_ids) in enumerate(encoded):
+            input_ids[row, : len(ids)] = ids
+            token_type_ids[row, : len(ids)] = type_ids
+            attention_mask[row, : len(ids)] = 1
+
+        features = {"input_ids": input_ids, "attention_mask": attention_mask}
+
+        if "token_type_ids" in self.tokenizer.model_input_names:
+            features["token_type_ids"] = token_type_ids
+
+        with torch.inference_mode():
+            if self.forward_logits is not None:
+                scores = torch.from_numpy(np.asarray(self.forward_logits(features), dtype=np.float32))
+            else:
+                device = next(self.hf_model.parameters()).device
+                scores = self.hf_model(**{k: torch.from_numpy(v).to(device) for k, v in features.items()}).logits
+
+            if self.activation is not None:
+                scores = self.activation(scores)
+
+        scores = scores.float().cpu().numpy()
+
+        return scores[:, 0] if scores.ndim == 2 and scores.shape[1] == 1 else scores
+
+
+_lock = threading.Lock()
+_tokenizers = {}
+
+
+def get_rerank_tokenizer(model_name: str = RERANKER_MODEL_NAME):
+    """
+    Shared RerankTokenizer for a reranker model, or None when
+    pre-tokenization is disabled or the model's pair format is unsupported.
+    """
+    if not pretokenize_enabled():
+        return None
+
+    with _lock:
+        if model_name not in _tokenizers:
+            tokens = RerankTokenizer(get_cross_encoder(model_name))
+            _tokenizers[model_name] = tokens if tokens.supported else None
+
+    return _tokenizers[model_name]
+
+
+def pretokenize_chunks(metadata, model_name: str = RERANKER_MODEL_NAME):
+    """
+    Attach the reranker's document-side token IDs to each chunk record.
+    """
+    tokens = get_rerank_tokenizer(model_name)
+
+    if tokens is None:
+        return metadata
+
+    token_ids = tokens.document_ids(rerank_document_text(meta) for meta in metadata)
+
+    return [{**meta, "rerank_token_ids": ids} for meta, ids in zip(metadata, token_ids)]
@@ -1,29 +1,84 @@
-import torch
-from sentence_transformers import CrossEncoder
+from retrieval.model_registry import RERANKER_MODEL_NAME, batching_enabled, get_cross_encoder, make_batcher
+from retrieval.rerank_cache import get_rerank_cache
+from retrieval.rerank_tokens import get_rerank_tokenizer, rerank_document_text
+from utils.helpers import text_digest
+
+
+def _content_version(result):
+    # Chunk hits carry the digest stored at ingest; plain dicts are hashed here
+    return result.get("chunk_digest") or text_digest(rerank_document_text(result))
+
 
 class Reranker:
-    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
+    def __init__(self, model_name=RERANKER_MODEL_NAME):
         """
         Recommended defaults:
         - CPU friendly
         - Strong reranking performance
         - Fast enough for local demos
         """
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Loading reranker: {model_name} on {device}")
-        self.model = CrossEncoder(model_name, device=device)
+        self.model_name = model_name
+        self.model = get_cross_encoder(model_name)
+        self.score_cache = get_rerank_cache()
+
+        # Chunks pre-tokenized at ingest skip document tokenization per query
+        self.tokens = get_rerank_tokenizer(model_name)
+        self._token_batcher = None
+
+        if self.tokens is not None and batching_enabled():
+            self._token_batcher = make_batcher(self.tokens.score, "reranker-token-batcher")
+
+    def _predict_tokens(self, query, token_ids):
+        query_ids = self.tokens.query_ids(query)
+        pairs = [(query_ids, ids) for ids in token_ids]
+
+        if self._token_batcher is not None:
+            return self._token_batcher.submit(pairs)
+
+        return self.tokens.score(pairs)
+
+    def _predict_texts(self, query, results):
+        # Build (query, document) pairs
+        pairs = [[query, rerank_document_text(r)] for r in results]
+        return self.model.predict(pairs)
 
     def rerank(self, query: str, results: list, top_k: int = 10):
         if not results:
             return []
 
-        # Build (query, document) pairs
-        pairs = []
-        for r in results:
-            context = f"{r.get('section', '')}: {r.get('chunk_text', '')}"
-            pairs.append([query, context])
+        scores = [None] * len(results)
+        keys = []
+
+        if self.score_cache is not None:
+            keys = [(r.get("doc_id"), r.get("chunk_id"), _content_version(r)) for r in results]
+            scores = self.score_cache.get_many(self.model_name, query, keys)
+
+        # Only pairs without a cached score go to the cross-encoder
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
+            token_ids = [results[i].get("rerank_token_ids") if self.tokens is not None else None for i in missing]
+            tokenized = [i for i, ids in zip(missing, token_ids) if ids is not None]
+            textual = [i for i, ids in zip(missing, token_ids) if ids is None]
+
+            if tokenized:
+                predicted = self._predict_tokens(query, [ids for ids in token_ids if ids is not None])
+                for i, score in zip(tokenized, predicted):
+                    scores[i] = float(score)
+
+            if textual:
+                predicted = self._predict_texts(query, [results[i] for i in textual])
+                for i, score in zip(textual, predicted):
+                    scores[i] = float(score)
 
-        scores = self.model.predict(pairs)
+            if self.score_cache is not None:
+                cacheable = [i for i in missing if keys[i][1] is not None]
+                self.score_cache.put_many(
+                    self.model_name,
+                    query,
+                    [keys[i] for i in cacheable],
+                    [scores[i] for i in cacheable],
+                )
 
         for r, s in zip(results, scores):
             r["rerank_score"] = float(s)
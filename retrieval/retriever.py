@@ -1,9 +1,15 @@
-﻿import faiss
-import json
+﻿import json
+import os
+
+import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-MODEL_NAME = "BAAI/bge-base-en"
+from retrieval.bm25 import BM25Index, reciprocal_rank_fusion
+from retrieval.chunk_store import ChunkHit, ChunkStore
+from retrieval.index_factory import apply_search_params, read_index, search_parameters
+from retrieval.model_registry import MODEL_NAME, get_embedding_model
+from retrieval.query_cache import get_query_cache
+from utils import tracing
 
 
 class Retriever:
@@ -14,17 +20,28 @@ class Retriever:
         initial_top_k=25,
         index_object=None,
         metadata_object=None,
+        model_name=MODEL_NAME,
+        index_params=None,
+        lexical_index=None,
+        fused_top_k=None,
     ):
         """
         initial_top_k:
         Fetch a broad candidate set so the reranker
         can make an accurate final decision.
 
+        lexical_index / fused_top_k:
+        With a BM25 index, dense and lexical top-k lists are merged by
+        reciprocal rank fusion and cut to fused_top_k candidates.
+
         Supports two modes:
-        1) Disk mode: index_path + meta_path
+        1) Disk mode: index_path + meta_path (memory-mapped index,
+           ChunkStore directory or legacy JSON metadata)
         2) In-memory mode: index_object + metadata_object
         """
-        self.model = SentenceTransformer(MODEL_NAME)
+        self.model_name = model_name
+        self.model = get_embedding_model(model_name)
+        self.query_cache = get_query_cache()
 
         in_memory_mode = index_object is not None or metadata_object is not None
         disk_mode = index_path is not None or meta_path is not None
@@ -40,40 +57,150 @@ class Retriever:
         else:
             if index_path is None or meta_path is None:
                 raise ValueError("Both index_path and meta_path are required for disk mode.")
-            self.index = faiss.read_index(index_path)
-            with open(meta_path, "r", encoding="utf-8") as f:
-                self.meta = json.load(f)
+            self.index, stored_params = read_index(index_path)
+            if ChunkStore.is_store(meta_path):
+                self.meta = ChunkStore.load(meta_path)
+            else:
+                # Legacy chunks_meta.json
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    self.meta = json.load(f)
+            index_params = index_params or stored_params
+            bm25_path = f"{index_path}.bm25.npz"
+            if lexical_index is None and os.path.exists(bm25_path):
+                lexical_index = BM25Index.load(bm25_path)
+
+        # Hits are views over columnar rows, not per-chunk dicts
+        self.meta = ChunkStore.from_records(self.meta)
+
+        # nprobe / efSearch chosen at build time
+        self.index_params = index_params or {}
+        apply_search_params(self.index, self.index_params)
 
         self.initial_top_k = initial_top_k
+        self.lexical_index = lexical_index
+        self.fused_top_k = fused_top_k or initial_top_k
+        self.rrf_k = int(os.getenv("RAG_RRF_K", "60"))
 
-    def retrieve(self, query: str):
-        query_vec = self.model.encode(
-            [query],
-            normalize_embeddings=True
-        )
+    def _encode_queries(self, queries):
+        """
+        Encode all queries as one batch, skipping cached ones.
+        """
+        vectors = [None] * len(queries)
+
+        if self.query_cache is not None:
+            for i, query in enumerate(queries):
+                vectors[i] = self.query_cache.get(self.model_name, query)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            encoded = self.model.encode(
+                [queries[i] for i in missing],
+                normalize_embeddings=True
+            ).astype(np.float32)
+
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+                if self.query_cache is not None:
+                    self.query_cache.put(self.model_name, queries[i], vector)
+
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def _build_results(self, hits):
+        """
+        Hits are (row, cosine score, bm25 score, fusion score); fusion
+        scores are None without a lexical index.
+        """
+        return [
+            ChunkHit(self.meta, row, score, bm25_score, fusion_score)
+            for row, score, bm25_score, fusion_score in hits
+        ]
+
+    def _dense_scores(self, query_vec, rows):
+        """
+        Cosine scores for lexical-only hits, when the index can reconstruct vectors.
+        """
+        if not rows:
+            return {}
 
-        scores, indices = self.index.search(
-            query_vec.astype(np.float32),
-            self.initial_top_k
+        try:
+            vectors = self.index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+        except Exception:
+            return {}
+
+        return {row: float(vector @ query_vec) for row, vector in zip(rows, vectors)}
+
+    def _fuse(self, query, query_vec, scores, indices, allowed_rows=None):
+        dense = {int(idx): float(score) for score, idx in zip(scores, indices) if idx >= 0}
+
+        lexical_scores, lexical_rows = self.lexical_index.search(
+            query, self.initial_top_k, allowed_rows=allowed_rows
         )
+        lexical = {int(row): float(score) for score, row in zip(lexical_scores, lexical_rows)}
+
+        fused = reciprocal_rank_fusion([list(dense), list(lexical)], k=self.rrf_k)[: self.fused_top_k]
+
+        dense.update(self._dense_scores(query_vec, [row for row, _ in fused if row not in dense]))
+
+        return [
+            (row, dense.get(row), lexical.get(row), fusion_score)
+            for row, fusion_score in fused
+        ]
+
+    def _search(self, query_vecs, allowed_rows):
+        if allowed_rows is None:
+            return self.index.search(query_vecs, self.initial_top_k)
+
+        # Restrict the single merged search to the selected rows
+        selector = faiss.IDSelectorBatch(np.asarray(allowed_rows, dtype=np.int64))
+        params = search_parameters(self.index, self.index_params, selector)
+
+        return self.index.search(query_vecs, self.initial_top_k, params=params)
+
+    def retrieve_many(self, queries, allowed_rows=None):
+        """
+        Batched retrieval: one encode call and one matrix search
+        for every query, returning one result list per query.
+
+        allowed_rows: optional index rows the search is restricted to.
+        """
+        if not queries:
+            return []
+
+        queries = list(queries)
+
+        if allowed_rows is not None and not len(allowed_rows):
+            return [[] for _ in queries]
+
+        with tracing.span("embed", queries=len(queries)):
+            query_vecs = self._encode_queries(queries)
+
+        with tracing.span("search", hybrid=self.lexical_index is not None):
+            return self._search_results(queries, query_vecs, allowed_rows)
+
+    def _search_results(self, queries, query_vecs, allowed_rows):
 
-        results = []
+        scores, indices = self._search(query_vecs, allowed_rows)
 
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < 0:
-                continue
+        if self.lexical_index is None:
+            return [
+                self._build_results(
+                    (int(idx), float(score), None, None)
+                    for score, idx in zip(row_scores, row_indices)
+                    if idx >= 0
+                )
+                for row_scores, row_indices in zip(scores, indices)
+            ]
 
-            meta = self.meta[idx]
+        return [
+            self._build_results(
+                self._fuse(query, query_vec, row_scores, row_indices, allowed_rows)
+            )
+            for query, query_vec, row_scores, row_indices in zip(queries, query_vecs, scores, indices)
+        ]
 
-            results.append({
-                "score": float(score),                 # cosine similarity
-                "chunk_id": meta["chunk_id"],
-                "section": meta.get("section", ""),
-                "pages": meta.get("pages", []),
-                "tables": meta.get("tables", []),
-                "images": meta.get("images", []),
-                # canonical text field
-                "chunk_text": meta.get("chunk_text", "")
-            })
+    def encode_query(self, query: str):
+        return self._encode_queries([query])[0]
 
-        return results
+    def retrieve(self, query: str, allowed_rows=None):
+        return self.retrieve_many([query], allowed_rows=allowed_rows)[0]
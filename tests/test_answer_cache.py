@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from agent import answer_cache as answer_cache_module
+from agent import supervisor as supervisor_module
+from agent.answer_cache import SemanticAnswerCache
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+CHUNKS = [("fy24", "chunk_000"), ("fy24", "chunk_003")]
+
+
+def test_paraphrase_hits_only_with_same_scope_and_evidence():
+    cache = SemanticAnswerCache(max_size=8, min_similarity=0.95)
+    cache.put(["fy24"], _unit(1, 0, 0), CHUNKS, "Revenue grew 15%.")
+
+    assert cache.get(["fy24"], _unit(1, 0.1, 0), list(reversed(CHUNKS))) == "Revenue grew 15%."
+    assert cache.get(["fy24"], _unit(1, 1, 0), CHUNKS) is None
+    assert cache.get(["fy24"], _unit(1, 0, 0), CHUNKS[:1]) is None
+    assert cache.get(["fy24", "fy25"], _unit(1, 0, 0), CHUNKS) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_size_ttl_and_invalidation(monkeypatch):
+    cache = SemanticAnswerCache(max_size=2, ttl_seconds=10)
+    cache.put(["fy24"], _unit(1, 0), CHUNKS, "a")
+    cache.put(["fy24", "fy25"], _unit(0, 1), CHUNKS, "b")
+    cache.put(["fy25"], _unit(0, 1), CHUNKS, "c")
+
+    assert len(cache) == 2
+    assert cache.get(["fy24"], _unit(1, 0), CHUNKS) is None
+
+    assert cache.invalidate_document("fy25") == 2
+    assert len(cache) == 0
+
+    cache.put(["fy24"], _unit(1, 0), CHUNKS, "a")
+    later = answer_cache_module.time.monotonic() + 11
+    monkeypatch.setattr(answer_cache_module.time, "monotonic", lambda: later)
+
+    assert cache.get(["fy24"], _unit(1, 0), CHUNKS) is None
+    assert len(cache) == 0
+
+
+class _Store:
+    def __init__(self):
+        self.vectors = {"what was revenue?": _unit(1, 0), "how much revenue?": _unit(0.99, 0.05)}
+
+    def snapshot(self):
+        return self
+
+    def __len__(self):
+        return 1
+
+    def __contains__(self, doc_id):
+        return doc_id == "fy24"
+
+    def add_document(self, *_args, **_kwargs):
+        pass
+
+    def document_ids(self):
+        return ["fy24"]
+
+    def encode_query(self, query):
+        return self.vectors[query]
+
+    def table_texts(self, _doc_id, _table_ids):
+        return []
+
+    def retrieve(self, _query, doc_ids=None):
+        return [
+            {
+                "score": 0.9,
+                "doc_id": "fy24",
+                "chunk_id": "chunk_000",
+                "section": "Highlights",
+                "pages": [3],
+                "tables": [],
+                "images": [],
+                "chunk_text": "Revenue grew 15%.",
+            }
+        ]
+
+
+class _Reranker:
+    def rerank(self, _query, results, top_k=7):
+        return results[:top_k]
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    monkeypatch.setattr(supervisor_module, "Reranker", lambda: _Reranker())
+    monkeypatch.setattr(supervisor_module, "get_answer_cache", lambda: SemanticAnswerCache(max_size=8))
+    monkeypatch.setattr(supervisor_module, "classify_intent", lambda _q: "INFORMATION")
+    sup = supervisor_module.AgentSupervisor()
+    sup.store = _Store()
+    sup.active_document_id = "fy24"
+    return sup
+
+
+def test_repeated_questions_skip_generation_until_the_document_changes(supervisor, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(
+        supervisor.generation_client, "generate", lambda prompt: prompts.append(prompt) or "Revenue grew 15%."
+    )
+
+    first = supervisor.handle("what was revenue?")
+    paraphrase = supervisor.handle("how much revenue?")
+
+    assert (first["cached"], paraphrase["cached"]) == (False, True)
+    assert paraphrase["answer"] == first["answer"]
+    assert len(prompts) == 1
+
+    supervisor.add_document("fy24", {"embeddings": None, "metadata": [], "tables": []})
+
+    assert supervisor.handle("what was revenue?")["cached"] is False
+    assert len(prompts) == 2
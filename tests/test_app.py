@@ -8,6 +8,8 @@ import pytest
 
 @pytest.fixture
 def app_module(monkeypatch):
+    monkeypatch.setenv("RAG_WARMUP_MODELS", "0")
+
     fake_supervisor_module = types.ModuleType("agent.supervisor")
 
     class FakeSupervisor:
@@ -17,19 +19,27 @@ def app_module(monkeypatch):
         def has_active_document(self):
             return self.doc_loaded
 
-        def set_active_document(self, index, metadata, tables_raw):
+        def add_document(self, doc_id, payload, name=None):
             self.doc_loaded = True
 
-        def handle(self, query):
+        def has_document(self, doc_id):
+            return False
+
+        def handle(self, query, document_ids=None):
             return {"type": "information", "answer": f"handled: {query}"}
 
+        def handle_stream(self, query, document_ids=None):
+            yield "token", "handled: "
+            yield "token", query
+            yield "done", self.handle(query, document_ids)
+
     fake_supervisor_module.AgentSupervisor = FakeSupervisor
     monkeypatch.setitem(sys.modules, "agent.supervisor", fake_supervisor_module)
 
     fake_ingestion_module = types.ModuleType("ingestion.runtime_ingestion")
 
-    def fake_ingest_pdf_to_runtime(_pdf_path):
-        return {"index": object(), "metadata": [], "tables": []}
+    def fake_ingest_pdf_to_runtime(_pdf_path, document_id=None, name=None):
+        return {"embeddings": [], "metadata": [], "tables": []}
 
     fake_ingestion_module.ingest_pdf_to_runtime = fake_ingest_pdf_to_runtime
     monkeypatch.setitem(sys.modules, "ingestion.runtime_ingestion", fake_ingestion_module)
@@ -72,6 +82,14 @@ def test_upload_missing_file(client):
     assert response.status_code == 400
 
 
+def test_append_to_unknown_document(client):
+    data = {"file": (io.BytesIO(b"%PDF-1.4"), "supplement.pdf"), "append_to": "abc123"}
+    response = client.post("/api/v1/upload", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 404
+    assert response.get_json()["error"]["code"] == "DOCUMENT_NOT_FOUND"
+
+
 def test_large_file_handling(client, app_module):
     app_module.app.config["MAX_CONTENT_LENGTH"] = 1
     data = {"file": (io.BytesIO(b"ab"), "doc.pdf")}
@@ -104,3 +122,46 @@ def test_successful_upload_and_chat(client):
 
     assert chat_payload["success"] is True
     assert chat_payload["data"]["answer"] == "handled: Hello"
+
+
+def test_streaming_chat(client):
+    assert client.post("/api/v1/chat/stream", json={"query": "Hello"}).status_code == 409
+
+    client.post(
+        "/upload",
+        data={"file": (io.BytesIO(b"%PDF- fake"), "doc.pdf")},
+        content_type="multipart/form-data",
+    )
+
+    response = client.post("/api/v1/chat/stream", json={"query": "Hello"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    events = [block.split("\n") for block in response.get_data(as_text=True).strip().split("\n\n")]
+
+    assert [lines[0] for lines in events] == ["event: token", "event: token", "event: done"]
+    assert events[1][1] == 'data: {"text": "Hello"}'
+    assert '"answer": "handled: Hello"' in events[2][1]
+
+
+def test_metrics_endpoint(client):
+    client.post(
+        "/upload",
+        data={"file": (io.BytesIO(b"%PDF- fake"), "doc.pdf")},
+        content_type="multipart/form-data",
+    )
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert 'rag_stage_duration_seconds_count{path="upload",stage="store"}' in response.get_data(as_text=True)
+
+
+def test_scalar_document_ids_are_rejected(client):
+    for path in ("/api/v1/chat", "/api/v1/chat/stream"):
+        response = client.post(path, json={"query": "Hello", "document_ids": 42})
+
+        assert response.status_code == 400
+        assert response.get_json()["error"]["code"] == "INVALID_REQUEST"
@@ -0,0 +1,112 @@
+import asyncio
+import importlib
+import sys
+import types
+
+import httpx
+import pytest
+
+pytest.importorskip("a2wsgi")
+
+
+@pytest.fixture
+def asgi_module(monkeypatch):
+    monkeypatch.setenv("RAG_WARMUP_MODELS", "0")
+
+    fake_supervisor_module = types.ModuleType("agent.supervisor")
+
+    class FakeSupervisor:
+        def __init__(self):
+            self.doc_loaded = True
+            self.in_flight = 0
+            self.peak = 0
+
+        def has_active_document(self):
+            return self.doc_loaded
+
+        async def ahandle(self, query, document_ids=None):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.05)
+            self.in_flight -= 1
+            return {"type": "information", "answer": f"handled: {query}", "cached": False}
+
+        async def astream(self, query, document_ids=None):
+            yield "token", "handled: "
+            yield "token", query
+            yield "done", {"type": "information", "answer": f"handled: {query}", "cached": False}
+
+    fake_supervisor_module.AgentSupervisor = FakeSupervisor
+    monkeypatch.setitem(sys.modules, "agent.supervisor", fake_supervisor_module)
+
+    fake_ingestion_module = types.ModuleType("ingestion.runtime_ingestion")
+    fake_ingestion_module.ingest_pdf_to_runtime = lambda _pdf_path, document_id=None, name=None: {}
+    monkeypatch.setitem(sys.modules, "ingestion.runtime_ingestion", fake_ingestion_module)
+
+    sys.modules.pop("web_app", None)
+    sys.modules.pop("asgi_app", None)
+    return importlib.import_module("asgi_app")
+
+
+def _run(asgi_module, requests):
+    async def main():
+        transport = httpx.ASGITransport(app=asgi_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.request(*request[:2], **request[2]) for request in requests))
+
+    return asyncio.run(main())
+
+
+def test_concurrent_chats_share_one_event_loop(asgi_module):
+    responses = _run(
+        asgi_module,
+        [("POST", "/api/v1/chat", {"json": {"query": f"q{i}"}}) for i in range(20)],
+    )
+
+    assert [r.json()["data"]["answer"] for r in responses] == [f"handled: q{i}" for i in range(20)]
+    assert asgi_module.agent.peak == 20
+
+
+def test_chat_errors_and_flask_fallback(asgi_module):
+    empty, health = _run(
+        asgi_module,
+        [("POST", "/api/v1/chat", {"json": {"query": " "}}), ("GET", "/", {})],
+    )
+
+    assert empty.status_code == 400
+    assert empty.json()["error"]["code"] == "EMPTY_QUERY"
+    assert health.json()["data"]["service"] == "corporate-rag-backend"
+
+
+def test_streaming_chat(asgi_module):
+    (response,) = _run(asgi_module, [("POST", "/api/v1/chat/stream", {"json": {"query": "Hello"}})])
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+
+    assert [lines[0] for lines in events] == ["event: token", "event: token", "event: done"]
+    assert '"answer": "handled: Hello"' in events[2][1]
+
+
+def test_failure_after_the_stream_started_ends_it_with_an_error_event(asgi_module, monkeypatch):
+    async def broken_stream(_receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"event: token\n\n", "more_body": True})
+        raise RuntimeError("client went away mid-stream")
+
+    monkeypatch.setitem(asgi_module.ROUTES, ("POST", "/api/v1/chat/stream"), broken_stream)
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/chat/stream"}
+    asyncio.run(asgi_module.app(scope, receive, send))
+
+    assert [m["type"] for m in sent].count("http.response.start") == 1
+    assert sent[-1]["more_body"] is False
+    assert sent[-1]["body"].startswith(b"event: error")
@@ -0,0 +1,52 @@
+import numpy as np
+
+from retrieval.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "Revenue grew 15.3% to $1,200 million in FY25.",
+    "Operating margin was 22% in FY24.",
+    "The board declared a dividend for INFY shareholders.",
+]
+
+
+def test_tokenize_keeps_figures_and_tickers():
+    assert tokenize("Revenue of $1,200 grew 15.3% in FY25 (INFY)") == [
+        "revenue", "1,200", "grew", "15.3%", "fy25", "infy",
+    ]
+
+
+def test_exact_figures_rank_first():
+    index = BM25Index.from_texts(TEXTS)
+
+    _, rows = index.search("What happened in FY25?", top_k=3)
+    _, ticker_rows = index.search("INFY dividend", top_k=3)
+
+    assert list(rows) == [0]
+    assert ticker_rows[0] == 2
+
+
+def test_append_keeps_rows_aligned():
+    index = BM25Index.from_texts(TEXTS[:2])
+    index.search("dividend", top_k=1)
+    index.add_documents(TEXTS[2:])
+
+    _, rows = index.search("dividend", top_k=1)
+
+    assert len(index) == 3
+    assert list(rows) == [2]
+
+
+def test_save_load_roundtrip(tmp_path):
+    index = BM25Index.from_texts(TEXTS)
+    path = str(tmp_path / "chunks.faiss.bm25.npz")
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+
+    assert np.allclose(loaded.scores("margin FY24"), index.scores("margin FY24"))
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+
+    assert [row for row, _ in fused] == [1, 3, 2]
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+from retrieval.chunk_store import ChunkHit, ChunkStore
+
+RECORDS = [
+    {
+        "chunk_id": "chunk_001",
+        "section": "Überblick",
+        "pages": [1, 2],
+        "tables": ["el_000004", "el_000009"],
+        "images": [{"page": 2, "caption": "Chart"}],
+        "chunk_text": "Überblick\nRevenue grew 15 percent — ₹1,200 crore.",
+    },
+    {
+        "chunk_id": "chunk_002",
+        "section": "Risks",
+        "pages": [],
+        "tables": [],
+        "images": [],
+        "chunk_text": "",
+    },
+]
+
+
+def test_rows_match_source_records():
+    store = ChunkStore.from_records(RECORDS)
+
+    assert len(store) == 2
+    assert [store[i] for i in range(2)] == RECORDS
+    assert store[-1]["chunk_id"] == "chunk_002"
+
+    with pytest.raises(IndexError):
+        store[2]
+
+
+def test_saved_store_loads_memory_mapped(tmp_path):
+    ChunkStore.from_records(RECORDS).save(str(tmp_path))
+
+    loaded = ChunkStore.load(str(tmp_path))
+
+    assert ChunkStore.is_store(str(tmp_path))
+    assert isinstance(loaded._arrays["chunk_text_blob"], np.memmap)
+    assert loaded[0] == RECORDS[0]
+    assert loaded.tables(0) == ["el_000004", "el_000009"]
+    assert loaded.pages(1) == []
+
+
+def test_concat_and_take_keep_rows_and_doc_ids():
+    first = ChunkStore.from_records([{**RECORDS[0], "doc_id": "fy24"}])
+    second = ChunkStore.from_records([{**record, "doc_id": "fy25"} for record in RECORDS])
+
+    merged = ChunkStore.concat([first, second])
+
+    assert len(merged) == 3
+    assert [merged.doc_id(i) for i in range(3)] == ["fy24", "fy25", "fy25"]
+    assert merged[1] == {**RECORDS[0], "doc_id": "fy25"}
+    assert merged.take([2])[0] == {**RECORDS[1], "doc_id": "fy25"}
+    assert ChunkStore.from_records(RECORDS).doc_id(0) is None
+
+
+def test_hits_are_lazy_dict_like_views():
+    hit = ChunkHit(ChunkStore.from_records(RECORDS), 0, score=0.8)
+
+    assert hit.get("chunk_id") == "chunk_001"
+    assert hit["tables"] == ["el_000004", "el_000009"]
+    assert "fusion_score" not in hit and "doc_id" not in hit
+    assert hit.get("rerank_score", 0.0) == 0.0
+
+    hit["rerank_score"] = 2.5
+
+    assert hit.to_dict() == {"score": 0.8, **RECORDS[0], "rerank_score": 2.5}
+
+    with pytest.raises(KeyError):
+        hit["chunk_text"] = "edited"
+
+
+def test_content_digests_survive_save_concat_and_legacy_stores(tmp_path):
+    store = ChunkStore.from_records(RECORDS)
+    digests = [store.digest(row) for row in range(len(store))]
+
+    assert len(set(digests)) == len(RECORDS)
+    assert [ChunkStore.concat([store, store]).digest(row) for row in range(2 * len(store))] == digests * 2
+
+    # Stores saved before the digest column get it computed on load
+    store.save(str(tmp_path))
+    manifest = json.loads((tmp_path / "store.json").read_text())
+    manifest["arrays"] = [name for name in manifest["arrays"] if not name.startswith("digest_")]
+    (tmp_path / "store.json").write_text(json.dumps(manifest))
+    assert [ChunkStore.load(str(tmp_path)).digest(row) for row in range(len(store))] == digests
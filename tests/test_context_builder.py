@@ -0,0 +1,109 @@
+import json
+
+from ingestion.chunker import build_chunks
+from llm.token_counter import TokenCounter
+from retrieval.context_builder import ContextPacker, join_overlapping
+
+
+class _WordTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+
+COUNTER = TokenCounter(_WordTokenizer(), name="words")
+
+
+def _words(start, stop):
+    return " ".join(f"w{i}" for i in range(start, stop))
+
+
+def _item(chunk_id, section, text, pages, tables=(), doc_id="fy24"):
+    # Same shape as ingest's chunk_text: section line, then the window
+    return {
+        "doc_id": doc_id,
+        "chunk_id": chunk_id,
+        "section": section,
+        "pages": pages,
+        "text": f"{section}\n{text}",
+        "tables": list(tables),
+    }
+
+
+def test_overlapping_windows_are_joined_once():
+    assert join_overlapping(_words(0, 300), _words(250, 400)) == _words(0, 400)
+    assert join_overlapping("Revenue grew.", "Margin fell.") == "Revenue grew.\nMargin fell."
+
+
+def test_adjacent_parts_of_a_section_merge_in_rank_order():
+    items = [
+        _item("chunk_004", "Risks (Part 2)", _words(250, 400), [8]),
+        _item("chunk_010", "Dividend", "Final dividend of 8 per share.", [12]),
+        _item("chunk_003", "Risks (Part 1)", _words(0, 300), [7]),
+        _item("chunk_003", "Risks (Part 1)", "Other document.", [1], doc_id="fy25"),
+        _item("chunk_006", "Risks (Part 4)", "Not adjacent.", [9]),
+    ]
+
+    spans = ContextPacker(token_budget=0).merge(items)
+
+    assert [span["chunk_ids"] for span in spans] == [
+        ["chunk_003", "chunk_004"], ["chunk_010"], ["chunk_003"], ["chunk_006"]
+    ]
+    assert spans[0]["section"] == "Risks"
+    assert spans[0]["pages"] == [7, 8]
+    assert spans[0]["text"] == "Risks\n" + _words(0, 400)
+    assert spans[1]["text"] == "Dividend\nFinal dividend of 8 per share."
+
+
+def test_chunker_windows_merge_without_repeating_their_overlap(tmp_path):
+    (tmp_path / "text.json").write_text(json.dumps([
+        {"type": "Title", "text": "Risks", "page": 7},
+        {"type": "NarrativeText", "text": _words(0, 600), "page": 7},
+    ]))
+    (tmp_path / "tables.json").write_text("[]")
+
+    build_chunks(
+        text_path=str(tmp_path / "text.json"),
+        tables_index_path=str(tmp_path / "tables.json"),
+        images_path=str(tmp_path / "images.json"),
+        output_path=str(tmp_path / "chunks.json"),
+    )
+    chunks = json.loads((tmp_path / "chunks.json").read_text())
+    items = [
+        _item(c["chunk_id"], c["section"], c["text"], c["pages"]) for c in chunks
+    ]
+
+    spans = ContextPacker(token_budget=0).merge(items)
+
+    assert len(chunks) == 3 and len(spans) == 1
+    assert spans[0]["text"] == "Risks\n" + _words(0, 600)
+
+
+def test_budget_is_filled_by_rank_and_tables_are_cut_at_rows():
+    items = [
+        _item("chunk_001", "Highlights", _words(0, 40), [3], tables=["el_1"]),
+        _item("chunk_020", "Outlook", _words(100, 180), [20]),
+        _item("chunk_030", "Dividend", _words(200, 210), [25], tables=["el_2"]),
+    ]
+    table = "\n".join(f"row{i} | {i}" for i in range(40))
+    tables = {"el_1": table, "el_2": "Dividend | 8"}
+
+    packer = ContextPacker(token_budget=100)
+    packer.min_table_tokens = 10
+    packed = packer.pack(items, COUNTER, lambda _doc, ids: [tables[i] for i in ids])
+
+    assert packed["text"].startswith("[Source: Page 3]\nHighlights\n" + _words(0, 40))
+    assert _words(100, 180) not in packed["text"]
+    assert _words(200, 210) in packed["text"]
+    assert packed["tables"][0].startswith("row0 | 0\nrow1 | 1")
+    assert packed["tables"][0].endswith("(table truncated)")
+    assert packed["stats"]["tokens"] <= 100
+    assert packed["stats"]["dropped_spans"] == 1
+
+
+def test_top_span_is_truncated_rather_than_dropped():
+    packed = ContextPacker(token_budget=20).pack(
+        [_item("chunk_001", "Highlights", _words(0, 100), [3])], COUNTER, lambda _doc, _ids: []
+    )
+
+    assert packed["text"] == "[Source: Page 3]\nHighlights\n" + _words(0, 14)
+    assert packed["stats"]["tokens"] <= 20
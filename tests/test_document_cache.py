@@ -0,0 +1,157 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from ingestion import document_cache
+from retrieval.bm25 import BM25Index
+
+DOC_ID = "ab" * 32
+
+
+@pytest.fixture(autouse=True)
+def document_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("RAG_DOCUMENT_DIR", str(tmp_path / "documents"))
+    monkeypatch.setenv("RAG_PERSIST_DOCUMENTS", "1")
+    monkeypatch.setenv("RAG_INDEX_TYPE", "flat")
+    monkeypatch.setenv("RAG_VECTOR_COMPRESSION", "none")
+
+
+def _payload():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((6, 8)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    metadata = [
+        {
+            "chunk_id": f"chunk_{i:03d}",
+            "section": "Results",
+            "pages": [i + 1],
+            "tables": [],
+            "images": [],
+            "chunk_text": f"revenue line {i}",
+        }
+        for i in range(6)
+    ]
+
+    return {
+        "bm25": BM25Index.from_texts(m["chunk_text"] for m in metadata),
+        "embeddings": embeddings,
+        "metadata": metadata,
+        "tables": [{"id": "el_000001", "table_type": "unstructured", "raw_text": "t"}],
+    }
+
+
+def test_payload_roundtrip_by_document_id():
+    payload = _payload()
+
+    assert document_cache.load_runtime_payload(DOC_ID) is None
+
+    document_cache.save_runtime_payload(DOC_ID, payload, name="report.pdf")
+    loaded = document_cache.load_runtime_payload(DOC_ID)
+
+    assert loaded["name"] == "report.pdf"
+    assert list(loaded["metadata"]) == payload["metadata"]
+    assert loaded["tables"] == payload["tables"]
+    assert len(loaded["bm25"]) == 6
+    np.testing.assert_allclose(loaded["embeddings"], payload["embeddings"])
+
+    manifests = document_cache.list_persisted_documents()
+    assert [m["document_id"] for m in manifests] == [DOC_ID]
+
+
+def test_invalid_ids_and_disabled_persistence(monkeypatch):
+    with pytest.raises(ValueError):
+        document_cache.document_dir("../etc")
+
+    assert document_cache.load_runtime_payload("../etc") is None
+
+    monkeypatch.setenv("RAG_PERSIST_DOCUMENTS", "0")
+    assert document_cache.save_runtime_payload(DOC_ID, _payload()) is None
+    assert document_cache.list_persisted_documents() == []
+
+
+def test_removed_chunks_survive_reload(monkeypatch):
+    from agent import supervisor as supervisor_module
+    from retrieval import retriever as retriever_module
+
+    monkeypatch.setattr(retriever_module, "get_embedding_model", lambda _name: None)
+    monkeypatch.setattr(supervisor_module, "Reranker", lambda: None)
+    document_cache.save_runtime_payload(DOC_ID, _payload(), name="report.pdf")
+
+    first = supervisor_module.AgentSupervisor()
+    assert first.has_document(DOC_ID)
+    assert first.remove_chunks(DOC_ID, ["chunk_001", "chunk_004"]) == 2
+    assert document_cache.load_runtime_payload(DOC_ID)["removed_chunks"] == ["chunk_001", "chunk_004"]
+
+    # Another worker, or this one after a restart
+    second = supervisor_module.AgentSupervisor()
+    assert second.restore_documents() == 1
+    assert [doc["chunks"] for doc in second.list_documents()] == [4]
+
+    document_cache.save_runtime_payload("cd" * 32, _payload(), name="appendix.pdf")
+    first.append_to_document(DOC_ID, document_cache.load_runtime_payload("cd" * 32), supplement_id="cd" * 32)
+    assert [doc["chunks"] for doc in first.list_documents()] == [10]
+
+    # Re-uploading the same PDF hands the cached payload to add_document
+    first.add_document(DOC_ID, document_cache.load_runtime_payload(DOC_ID))
+    assert [doc["chunks"] for doc in first.list_documents()] == [10]
+
+
+def _remove_chunks_in_worker(worker):
+    for i in range(25):
+        document_cache.add_removed_chunks(DOC_ID, [f"w{worker}_chunk_{i:03d}"])
+
+
+def test_concurrent_workers_never_drop_each_others_manifest_updates():
+    document_cache.save_runtime_payload(DOC_ID, _payload(), name="report.pdf")
+
+    workers = [
+        multiprocessing.get_context("fork").Process(target=_remove_chunks_in_worker, args=(worker,))
+        for worker in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(document_cache.load_manifest(DOC_ID)["removed_chunks"]) == 100
+
+
+def test_deleted_documents_stay_deleted(monkeypatch):
+    from agent import supervisor as supervisor_module
+    from retrieval import retriever as retriever_module
+
+    monkeypatch.setattr(retriever_module, "get_embedding_model", lambda _name: None)
+    monkeypatch.setattr(supervisor_module, "Reranker", lambda: None)
+    document_cache.save_runtime_payload(DOC_ID, _payload(), name="report.pdf")
+    document_cache.save_runtime_payload("cd" * 32, _payload(), name="appendix.pdf")
+    document_cache.add_supplement(DOC_ID, "cd" * 32)
+
+    # A cold worker that never loaded the document can still delete it
+    assert supervisor_module.AgentSupervisor().remove_document(DOC_ID)
+    assert document_cache.list_persisted_documents() == []
+
+    restarted = supervisor_module.AgentSupervisor()
+    assert restarted.restore_documents() == 0
+    assert not restarted.has_document(DOC_ID)
+    assert not restarted.remove_document(DOC_ID)
+
+
+def test_cold_worker_answers_from_named_persisted_documents(monkeypatch):
+    from agent import supervisor as supervisor_module
+    from retrieval import document_store, retriever as retriever_module
+
+    monkeypatch.setattr(retriever_module, "get_embedding_model", lambda _name: None)
+    monkeypatch.setattr(supervisor_module, "Reranker", lambda: None)
+    monkeypatch.setattr(document_store.StoreSnapshot, "retrieve", lambda self, query, doc_ids=None: [])
+    document_cache.save_runtime_payload(DOC_ID, _payload(), name="report.pdf")
+
+    cold = supervisor_module.AgentSupervisor()
+    response, _ = cold._prepare_answer("What was revenue?", document_ids=[DOC_ID])
+
+    assert response["answer"] != "Please upload a PDF first."
+    assert DOC_ID in cold.store
+
+    with pytest.raises(ValueError):
+        cold.resolve_document_ids(42)
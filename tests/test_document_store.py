@@ -0,0 +1,199 @@
+import numpy as np
+import pytest
+
+from retrieval import retriever as retriever_module
+from retrieval.document_store import DocumentStore
+from retrieval.query_cache import QueryEmbeddingCache
+
+VOCAB = ["revenue", "margin", "risk", "dividend"]
+
+
+class _BagOfWordsModel:
+    def encode(self, texts, normalize_embeddings=True, **_kwargs):
+        vectors = np.array(
+            [[float(word in text.lower()) for word in VOCAB] for text in texts],
+            dtype=np.float32,
+        ) + 0.01
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+MODEL = _BagOfWordsModel()
+
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    monkeypatch.setenv("RAG_BACKGROUND_COMPACTION", "0")
+    monkeypatch.setattr(retriever_module, "get_embedding_model", lambda _name: MODEL)
+    monkeypatch.setattr(retriever_module, "get_query_cache", lambda: QueryEmbeddingCache(max_size=16))
+
+
+def _document(prefix, texts):
+    metadata = [
+        {
+            "chunk_id": f"chunk_{i:03d}",
+            "section": prefix,
+            "pages": [i + 1],
+            "tables": ["el_000001"],
+            "images": [],
+            "chunk_text": f"{prefix} {text}",
+        }
+        for i, text in enumerate(texts)
+    ]
+    tables = [{"id": "el_000001", "table_type": "unstructured", "raw_text": f"{prefix} table"}]
+    return MODEL.encode([m["chunk_text"] for m in metadata]), metadata, tables
+
+
+@pytest.fixture
+def store():
+    store = DocumentStore(initial_top_k=4)
+    store.add_document("fy24", *_document("FY24", ["revenue up", "margin down"]), name="fy24.pdf")
+    store.add_document("fy25", *_document("FY25", ["revenue flat", "risk rising", "dividend"]))
+    return store
+
+
+def test_queries_target_one_set_or_all_documents(store):
+    only_fy24 = store.retrieve("revenue", doc_ids=["fy24"])
+    both = store.retrieve("revenue", doc_ids=["fy24", "fy25"])
+    everything = store.retrieve("revenue")
+
+    assert {r["doc_id"] for r in only_fy24} == {"fy24"}
+    assert {r["doc_id"] for r in both} == {"fy24", "fy25"}
+    assert [r["chunk_id"] for r in both] == [r["chunk_id"] for r in everything]
+    assert store.retrieve("revenue", doc_ids=["missing"]) == []
+
+
+def test_same_chunk_and_table_ids_stay_per_document(store):
+    assert store.tables("fy24")[0]["raw_text"] == "FY24 table"
+    assert store.tables("fy25")[0]["raw_text"] == "FY25 table"
+
+    top = store.retrieve("dividend", doc_ids=["fy25"])[0]
+    assert (top["doc_id"], top["chunk_id"]) == ("fy25", "chunk_002")
+
+
+def test_tables_are_pre_rendered_without_markup():
+    store = DocumentStore(initial_top_k=4)
+    embeddings, metadata, _tables = _document("FY24", ["revenue up"])
+    tables = [
+        {
+            "id": "el_000007",
+            "table_type": "structured",
+            "table_html": "<table><thead><tr><th>Metric</th><th>FY24</th></tr></thead>"
+                          "<tbody><tr><td><b>Revenue</b></td><td>1,200 &amp; up</td></tr>"
+                          "<tr><td></td><td></td></tr></tbody></table>",
+        },
+        {"id": "el_000003", "table_type": "unstructured", "raw_text": "Margin   18%\n\n  Risk low "},
+    ]
+    store.add_document("fy24", embeddings, metadata, tables)
+
+    assert store.table_texts("fy24", {"el_000003", "el_000007", "missing"}) == [
+        "Metric | FY24\nRevenue | 1,200 & up",
+        "Margin 18%\nRisk low",
+    ]
+    assert store.table_texts("missing", ["el_000007"]) == []
+
+
+def test_replace_and_remove_documents(store):
+    store.add_document("fy24", *_document("FY24", ["dividend raised"]))
+
+    assert len(store) == 2
+    assert store.retriever.index.ntotal == 4
+    assert store.retrieve("dividend", doc_ids=["fy24"])[0]["chunk_text"] == "FY24 dividend raised"
+
+    assert store.remove_document("fy25")
+    assert not store.remove_document("fy25")
+    assert store.describe() == [
+        {"document_id": "fy24", "name": "fy24", "chunks": 1, "tables": 1}
+    ]
+
+    store.remove_document("fy24")
+    assert store.retrieve("dividend") == []
+
+
+def test_supplements_append_without_rebuild(store, monkeypatch):
+    from retrieval import document_store
+
+    builds = []
+    real_build = document_store.build_index
+    monkeypatch.setattr(
+        document_store, "build_index", lambda emb: builds.append(len(emb)) or real_build(emb)
+    )
+
+    prefix = store.append_to_document("fy24", *_document("FY24", ["dividend special"]))
+
+    assert builds == []
+    assert prefix == "s1_"
+    assert store.retriever.index.ntotal == 6
+    assert store.tables("fy24")[-1]["id"] == "s1_el_000001"
+
+    top = store.retrieve("dividend", doc_ids=["fy24"])[0]
+    assert (top["chunk_id"], top["tables"]) == ("s1_chunk_000", ["s1_el_000001"])
+    assert store.table_texts("fy24", ["s1_el_000001", "el_000001"]) == ["FY24 table", "FY24 table"]
+
+
+def test_append_after_tombstones_on_compressed_index(monkeypatch, tmp_path):
+    from retrieval import document_store
+    from retrieval.compressed_index import RescoringIndex
+
+    monkeypatch.setenv("RAG_VECTOR_COMPRESSION", "sq8")
+    monkeypatch.setenv("RAG_VECTOR_STORE_DIR", str(tmp_path))
+
+    store = DocumentStore(initial_top_k=20, compact_ratio=1.0)
+    store.add_document("a", *_document("A", [f"revenue {i}" for i in range(10)]))
+    assert isinstance(store.retriever.index, RescoringIndex)
+
+    assert store.remove_chunks("a", ["chunk_001"]) == 1
+    originals = store.retriever.index.originals_path
+
+    builds = []
+    real_build = document_store.build_index
+    monkeypatch.setattr(
+        document_store, "build_index", lambda emb: builds.append(len(emb)) or real_build(emb)
+    )
+    prefix = store.append_to_document("a", *_document("A", ["dividend x", "dividend y", "dividend z"]))
+
+    # New rows were encoded into the existing codes: no re-quantize or re-tune
+    assert builds == []
+    assert isinstance(store.retriever.index, RescoringIndex)
+    assert store.retriever.index.originals_path != originals
+    assert store.retriever.index.ntotal == 13
+    assert store.describe()[0]["chunks"] == 12
+    chunk_ids = {r["chunk_id"] for r in store.retrieve("dividend revenue")}
+    assert "chunk_001" not in chunk_ids
+    assert {f"{prefix}chunk_000", "chunk_000"} <= chunk_ids
+
+    # Later appends keep working
+    store.remove_chunks("a", [f"{prefix}chunk_002"])
+    store.append_to_document("a", *_document("A", ["margin"]))
+    assert store.describe()[0]["chunks"] == 12
+    assert builds == []
+    assert store.retrieve("margin")[0]["chunk_id"] == "s2_chunk_000"
+
+
+def test_tombstones_filter_rows_until_compaction(store):
+    store.compact_ratio = 0.5
+
+    assert store.remove_chunks("fy25", ["chunk_002"]) == 1
+    assert store.retriever.index.ntotal == 5
+    assert all(r["chunk_id"] != "chunk_002" for r in store.retrieve("dividend", doc_ids=["fy25"]))
+    assert [d["chunks"] for d in store.describe()] == [2, 2]
+
+    assert store.remove_chunks("fy25", ["chunk_000", "chunk_001"]) == 2
+    assert store.retriever.index.ntotal == 2
+    assert store.tombstones == set()
+    assert store.retrieve("revenue", doc_ids=["fy25"]) == []
+    assert {r["doc_id"] for r in store.retrieve("revenue")} == {"fy24"}
+
+
+def test_pinned_snapshot_survives_replace_and_removal(store):
+    pinned = store.snapshot()
+    store.add_document("fy24", *_document("FY24", ["dividend raised"]))
+    store.remove_chunks("fy25", ["chunk_000"])
+
+    assert pinned.retrieve("revenue", doc_ids=["fy24"])[0]["chunk_text"] == "FY24 revenue up"
+    assert "chunk_000" in {r["chunk_id"] for r in pinned.retrieve("revenue", doc_ids=["fy25"])}
+    assert [d["chunks"] for d in pinned.describe()] == [2, 3]
+
+    current = store.snapshot()
+    assert current is not pinned
+    assert current.retrieve("dividend", doc_ids=["fy24"])[0]["chunk_text"] == "FY24 dividend raised"
+    assert [d["chunks"] for d in current.describe()] == [2, 1]
@@ -0,0 +1,94 @@
+import numpy as np
+
+from retrieval import embedding_cache
+from retrieval.embedding_cache import EmbeddingCache, encode_texts
+
+
+class _CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True, show_progress_bar=False):
+        self.encoded.extend(texts)
+        return np.array([[len(t), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+
+def test_cache_roundtrip_survives_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model_name="bge", max_entries=8)
+    cache.put_many(["alpha", "beta"], np.eye(2, 3, dtype=np.float32))
+
+    reloaded = EmbeddingCache(str(tmp_path), model_name="bge", max_entries=8)
+    alpha, gamma = reloaded.get_many(["  alpha ", "gamma"])
+
+    assert np.allclose(alpha, [1.0, 0.0, 0.0])
+    assert gamma is None
+    assert reloaded.stats()["hits"] == 1
+
+
+def test_cache_is_keyed_by_model(tmp_path):
+    EmbeddingCache(str(tmp_path), model_name="bge").put_many(["alpha"], np.ones((1, 3)))
+
+    other = EmbeddingCache(str(tmp_path), model_name="minilm")
+
+    assert other.get_many(["alpha"]) == [None]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), model_name="bge", max_entries=2)
+    cache.put_many(["a"], np.ones((1, 3)))
+    cache.put_many(["b"], np.ones((1, 3)))
+    cache.get_many(["a"])
+    cache.put_many(["c"], np.ones((1, 3)))
+
+    a, b, c = cache.get_many(["a", "b", "c"])
+
+    assert len(cache) == 2
+    assert a is not None and c is not None
+    assert b is None
+
+
+def test_processes_sharing_a_directory_never_reuse_live_slots(tmp_path):
+    # Two workers opened the cache before either wrote to it
+    first = EmbeddingCache(str(tmp_path), model_name="bge", max_entries=2)
+    second = EmbeddingCache(str(tmp_path), model_name="bge", max_entries=2)
+
+    first.put_many(["a", "b"], np.array([[1.0, 0, 0], [0, 1.0, 0]], dtype=np.float32))
+    second.put_many(["c"], np.array([[0, 0, 1.0]], dtype=np.float32))
+
+    a, b, c = first.get_many(["a", "b", "c"])
+
+    # "c" took the least recently used slot instead of a live one
+    assert a is None
+    assert np.allclose(b, [0.0, 1.0, 0.0])
+    assert np.allclose(c, [0.0, 0.0, 1.0])
+
+
+def test_encode_texts_only_encodes_misses(tmp_path, monkeypatch):
+    model = _CountingModel()
+    monkeypatch.setattr(embedding_cache, "get_embedding_model", lambda _name: model)
+    cache = EmbeddingCache(str(tmp_path), model_name="bge")
+
+    first = encode_texts(["one", "three"], model_name="bge", cache=cache)
+    second = encode_texts(["one", "three", "five"], model_name="bge", cache=cache)
+    model.encoded.clear()
+    third = encode_texts(["one", "three", "five"], model_name="bge", cache=cache)
+
+    assert np.allclose(first, second[:2])
+    assert np.allclose(second, third)
+    assert model.encoded == []
+
+
+def test_encode_texts_reports_through_tracing_not_stdout(tmp_path, monkeypatch, capsys):
+    from utils import tracing
+
+    monkeypatch.setattr(embedding_cache, "get_embedding_model", lambda _name: _CountingModel())
+    cache = EmbeddingCache(str(tmp_path), model_name="bge")
+    encode_texts(["one"], model_name="bge", cache=cache)
+
+    with tracing.trace("test_encode") as trace:
+        with tracing.span("encode"):
+            encode_texts(["one", "three"], model_name="bge", cache=cache)
+
+    assert capsys.readouterr().out == ""
+    assert (trace.spans[0]["cache_hits"], trace.spans[0]["encoded"]) == (1, 1)
+    assert 'rag_embedding_cache_lookups_total{path="test_encode",result="hit"} 1' in tracing.REGISTRY.render()
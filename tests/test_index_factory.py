@@ -0,0 +1,142 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from retrieval.compressed_index import RescoringIndex
+from retrieval.index_factory import (
+    apply_search_params,
+    build_index,
+    choose_index_type,
+    load_index_params,
+    read_index,
+    save_index_params,
+    write_index,
+)
+
+
+@pytest.fixture
+def embeddings():
+    vectors = np.random.default_rng(7).normal(size=(2000, 32)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_auto_choice_follows_corpus_size(monkeypatch):
+    monkeypatch.setenv("RAG_FLAT_MAX_VECTORS", "100")
+    monkeypatch.setenv("RAG_HNSW_MAX_VECTORS", "1000")
+
+    assert choose_index_type(50) == "flat"
+    assert choose_index_type(500) == "hnsw"
+    assert choose_index_type(5000) == "ivf"
+    assert choose_index_type(5000, "flat") == "flat"
+
+    with pytest.raises(ValueError):
+        choose_index_type(10, "annoy")
+
+
+def test_small_corpus_stays_exact(embeddings):
+    index, params = build_index(embeddings[:100])
+
+    assert isinstance(index, faiss.IndexFlatIP)
+    assert params["type"] == "flat"
+    assert params["ntotal"] == 100
+    assert "compression" not in params
+
+
+@pytest.mark.parametrize("index_type, knob", [("hnsw", "ef_search"), ("ivf", "nprobe")])
+def test_ann_indexes_are_tuned_to_target_recall(embeddings, monkeypatch, index_type, knob):
+    monkeypatch.setenv("RAG_ANN_TARGET_RECALL", "0.9")
+
+    index, params = build_index(embeddings, index_type=index_type)
+
+    assert params["type"] == index_type
+    assert index.ntotal == len(embeddings)
+    assert params[knob] >= 1
+    assert params["tuned_recall"] >= 0.9
+
+
+def test_params_roundtrip_next_to_index(embeddings, tmp_path):
+    index, params = build_index(embeddings, index_type="ivf")
+    index_path = str(tmp_path / "chunks.faiss")
+    faiss.write_index(index, index_path)
+    save_index_params(index_path, params)
+
+    loaded = apply_search_params(faiss.read_index(index_path), load_index_params(index_path))
+
+    assert load_index_params(index_path) == params
+    assert faiss.extract_index_ivf(loaded).nprobe == params["nprobe"]
+
+
+@pytest.mark.parametrize("compression", ["sq8", "pq"])
+def test_compressed_index_rescoring_matches_flat_recall(embeddings, tmp_path, monkeypatch, compression):
+    monkeypatch.setenv("RAG_RECALL_TOLERANCE", "0.02")
+    originals_path = str(tmp_path / "vectors.f16.npy")
+
+    index, params = build_index(embeddings, compression=compression, originals_path=originals_path)
+
+    assert isinstance(index, RescoringIndex)
+    assert params["compression"] == compression
+    assert params["recall_at_k"] >= 0.98
+    assert np.load(originals_path, mmap_mode="r").dtype == np.float16
+
+    queries = embeddings[:5]
+    scores, rows = index.search(queries, 3)
+    assert list(rows[:, 0]) == [0, 1, 2, 3, 4]
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-2)
+
+
+def test_compressed_index_roundtrips_through_disk(embeddings, tmp_path):
+    index_path = str(tmp_path / "chunks.faiss")
+    index, params = build_index(
+        embeddings, compression="sq8", originals_path=f"{index_path}.f16.npy"
+    )
+    write_index(index, index_path, params)
+
+    loaded, loaded_params = read_index(index_path)
+
+    assert isinstance(loaded, RescoringIndex)
+    assert loaded_params == params
+    assert np.array_equal(loaded.search(embeddings[:10], 5)[1], index.search(embeddings[:10], 5)[1])
+
+
+def test_compression_outside_tolerance_falls_back(embeddings, tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_RECALL_TOLERANCE", "0")
+    monkeypatch.setenv("RAG_RESCORE_OVERSAMPLE", "1")
+    monkeypatch.setenv("RAG_RESCORE_MAX_OVERSAMPLE", "1")
+    monkeypatch.setenv("RAG_PQ_SUBQUANTIZERS", "2")
+
+    index, params = build_index(
+        embeddings, compression="pq", originals_path=str(tmp_path / "v.f16.npy")
+    )
+
+    assert isinstance(index, faiss.IndexFlatIP)
+    assert params["compression_rejected"] == "pq"
+
+
+def test_scratch_originals_are_removed_with_their_index(embeddings, tmp_path, monkeypatch):
+    import gc
+
+    monkeypatch.setenv("RAG_VECTOR_STORE_DIR", str(tmp_path / "vectors"))
+
+    index, params = build_index(embeddings, compression="sq8")
+    assert isinstance(index, RescoringIndex)
+    assert os.listdir(tmp_path / "vectors") == [os.path.basename(params["originals_path"])]
+
+    del index
+    gc.collect()
+    assert os.listdir(tmp_path / "vectors") == []
+
+
+def test_extended_copy_searches_new_rows_and_leaves_the_original(embeddings, tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_VECTOR_STORE_DIR", str(tmp_path / "vectors"))
+
+    index, _ = build_index(embeddings[:400], compression="sq8")
+    extended = index.extended(embeddings[400:])
+
+    assert (index.ntotal, extended.ntotal) == (400, len(embeddings))
+    assert extended.originals_path != index.originals_path
+
+    _, ids = extended.search(embeddings[-5:], 1)
+    assert ids[:, 0].tolist() == list(range(len(embeddings) - 5, len(embeddings)))
+    assert np.allclose(extended.reconstruct_batch([0]), index.reconstruct_batch([0]))
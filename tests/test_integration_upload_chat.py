@@ -9,6 +9,8 @@ import pytest
 
 @pytest.fixture
 def app_module(monkeypatch):
+    monkeypatch.setenv("RAG_WARMUP_MODELS", "0")
+
     fake_supervisor_module = types.ModuleType("agent.supervisor")
 
     class FakeSupervisor:
@@ -18,10 +20,10 @@ def app_module(monkeypatch):
         def has_active_document(self):
             return self.doc_loaded
 
-        def set_active_document(self, index, metadata, tables_raw):
+        def add_document(self, doc_id, payload, name=None):
             self.doc_loaded = True
 
-        def handle(self, query):
+        def handle(self, query, document_ids=None):
             return {"type": "information", "answer": f"handled: {query}"}
 
     fake_supervisor_module.AgentSupervisor = FakeSupervisor
@@ -29,8 +31,8 @@ def app_module(monkeypatch):
 
     fake_ingestion_module = types.ModuleType("ingestion.runtime_ingestion")
 
-    def fake_ingest_pdf_to_runtime(_pdf_path):
-        return {"index": object(), "metadata": [], "tables": []}
+    def fake_ingest_pdf_to_runtime(_pdf_path, document_id=None, name=None):
+        return {"embeddings": [], "metadata": [], "tables": []}
 
     fake_ingestion_module.ingest_pdf_to_runtime = fake_ingest_pdf_to_runtime
     monkeypatch.setitem(sys.modules, "ingestion.runtime_ingestion", fake_ingestion_module)
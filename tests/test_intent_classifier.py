@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from agent import intent_classifier
+from agent.intent_classifier import LocalIntentClassifier, classify_intent, load_examples
+from retrieval.query_cache import QueryEmbeddingCache
+
+VOCAB = ["ticket", "broken", "fix", "revenue", "what", "report"]
+
+EXAMPLES = {
+    "ACTION": ["create a ticket", "fix my broken laptop", "broken printer ticket"],
+    "INFORMATION": ["what was revenue", "what does the report say", "revenue in the report"],
+}
+
+
+class _BagOfWordsModel:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, normalize_embeddings=True, **_kwargs):
+        self.calls += 1
+        vectors = np.array(
+            [[float(word in text.lower()) for word in VOCAB] for text in texts],
+            dtype=np.float32,
+        ) + 0.01
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = _BagOfWordsModel()
+    monkeypatch.setattr(intent_classifier, "get_embedding_model", lambda _name: model)
+    monkeypatch.setattr(intent_classifier, "get_query_cache", lambda: QueryEmbeddingCache(max_size=16))
+    return model
+
+
+def test_centroids_classify_and_share_the_query_cache(model):
+    classifier = LocalIntentClassifier(EXAMPLES, model_name="bow", min_margin=0.05)
+
+    label, margin = classifier.predict("please fix the broken ticket")
+    assert label == "ACTION" and classifier.is_confident(margin)
+
+    label, margin = classifier.predict("what was revenue in the report")
+    assert label == "INFORMATION" and classifier.is_confident(margin)
+
+    calls = model.calls
+    classifier.predict("what was revenue in the report")
+    assert model.calls == calls
+    assert classifier.query_cache.get("bow", "What was revenue in the report") is not None
+
+
+def test_llm_is_asked_only_below_the_margin(model, monkeypatch):
+    classifier = LocalIntentClassifier(EXAMPLES, model_name="bow", min_margin=0.05)
+    monkeypatch.setattr(intent_classifier, "_classifier", classifier)
+    monkeypatch.setenv("RAG_INTENT_CLASSIFIER", "local")
+
+    asked = []
+    monkeypatch.setattr(intent_classifier, "_llm_intent", lambda q: asked.append(q) or "ACTION")
+
+    assert classify_intent("what does the report say about revenue") == "INFORMATION"
+    assert classify_intent("hello there") == "ACTION"
+    assert asked == ["hello there"]
+
+    monkeypatch.setenv("RAG_INTENT_LLM_FALLBACK", "0")
+    assert classify_intent("hello there") in {"ACTION", "INFORMATION"}
+    assert asked == ["hello there"]
+
+    monkeypatch.setenv("RAG_INTENT_CLASSIFIER", "off")
+    assert classify_intent("create a ticket") == "INFORMATION"
+
+
+def test_shipped_examples_cover_both_labels():
+    examples = load_examples()
+
+    assert all(len(examples[label]) >= 20 for label in intent_classifier.INTENT_LABELS)
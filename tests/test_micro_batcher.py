@@ -0,0 +1,70 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.micro_batcher import MicroBatcher
+
+
+class _SlowModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, items, scale=1):
+        self.calls.append((len(items), scale))
+        time.sleep(0.01)
+        return np.array([len(item) * scale for item in items])
+
+
+def _submit_concurrently(batcher, jobs):
+    results = [None] * len(jobs)
+    start = threading.Barrier(len(jobs))
+
+    def worker(i, items, kwargs):
+        start.wait()
+        results[i] = batcher.submit(items, **kwargs)
+
+    threads = [threading.Thread(target=worker, args=(i, *job)) for i, job in enumerate(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def test_concurrent_jobs_share_one_call():
+    model = _SlowModel()
+    batcher = MicroBatcher(model.encode, max_batch_size=64, max_wait_ms=50)
+
+    jobs = [([f"{'x' * i}", "ab"], {}) for i in range(1, 9)]
+    results = _submit_concurrently(batcher, jobs)
+
+    assert [list(r) for r in results] == [[i, 2] for i in range(1, 9)]
+    assert len(model.calls) < len(jobs)
+    assert batcher.stats()["items"] == 16
+
+
+def test_jobs_with_different_kwargs_are_not_merged():
+    model = _SlowModel()
+    batcher = MicroBatcher(model.encode, max_batch_size=64, max_wait_ms=50)
+
+    results = _submit_concurrently(batcher, [(["abc"], {"scale": 1}), (["abc"], {"scale": 10})])
+
+    assert sorted(int(r[0]) for r in results) == [3, 30]
+    assert sorted(scale for _size, scale in model.calls) == [1, 10]
+
+
+def test_large_jobs_bypass_queue_and_errors_reach_callers():
+    model = _SlowModel()
+    batcher = MicroBatcher(model.encode, max_batch_size=2, max_wait_ms=1)
+
+    assert list(batcher.submit(["a", "bb", "ccc"])) == [1, 2, 3]
+    assert batcher.stats()["batches"] == 0
+
+    def fail(_items):
+        raise RuntimeError("model crashed")
+
+    with pytest.raises(RuntimeError):
+        MicroBatcher(fail, max_wait_ms=1).submit(["a"])
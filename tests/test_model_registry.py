@@ -0,0 +1,38 @@
+import pytest
+
+from retrieval import model_registry
+
+
+class _FakeModel:
+    loads = 0
+
+    def __init__(self, name, device=None):
+        type(self).loads += 1
+        self.name = name
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    _FakeModel.loads = 0
+    monkeypatch.setattr(model_registry, "SentenceTransformer", _FakeModel)
+    monkeypatch.setattr(model_registry, "CrossEncoder", _FakeModel)
+    monkeypatch.setattr(model_registry, "_embedding_models", {})
+    monkeypatch.setattr(model_registry, "_cross_encoders", {})
+
+
+def test_embedding_model_is_loaded_once():
+    first = model_registry.get_embedding_model("bge")
+    second = model_registry.get_embedding_model("bge")
+
+    assert first is second
+    assert _FakeModel.loads == 1
+
+
+def test_models_are_keyed_by_name():
+    bge = model_registry.get_embedding_model("bge")
+    other = model_registry.get_embedding_model("other")
+    reranker = model_registry.get_cross_encoder("bge")
+
+    assert bge is not other
+    assert reranker is not bge
+    assert _FakeModel.loads == 3
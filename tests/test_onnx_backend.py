@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from sentence_transformers import CrossEncoder, SentenceTransformer, models  # noqa: E402
+from tokenizers import Tokenizer, normalizers, pre_tokenizers, processors  # noqa: E402
+from tokenizers import models as token_models  # noqa: E402
+from transformers import (  # noqa: E402
+    BertConfig,
+    BertForSequenceClassification,
+    BertModel,
+    PreTrainedTokenizerFast,
+)
+
+from retrieval import onnx_backend  # noqa: E402
+from retrieval.rerank_tokens import RerankTokenizer  # noqa: E402
+
+WORDS = sorted(
+    set(
+        " ".join(onnx_backend.PARITY_QUERIES + onnx_backend.PARITY_DOCUMENTS)
+        .lower()
+        .replace("?", " ? ")
+        .replace(",", " , ")
+        .replace(".", " . ")
+        .replace(":", " : ")
+        .replace("%", " % ")
+        .split()
+    )
+)
+
+
+def _tokenizer():
+    vocab = {token: i for i, token in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + WORDS)}
+    backend = Tokenizer(token_models.WordPiece(vocab, unk_token="[UNK]"))
+    backend.normalizer = normalizers.BertNormalizer(lowercase=True)
+    backend.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    backend.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)],
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="[UNK]",
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+        model_input_names=["input_ids", "token_type_ids", "attention_mask"],
+    )
+
+
+def _config(**kwargs):
+    return BertConfig(
+        vocab_size=len(WORDS) + 4,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        **kwargs,
+    )
+
+
+@pytest.fixture(autouse=True)
+def onnx_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("RAG_ONNX_DIR", str(tmp_path / "onnx"))
+
+
+@pytest.fixture
+def embedder(tmp_path):
+    torch.manual_seed(0)
+    path = str(tmp_path / "embedder")
+    BertModel(_config()).save_pretrained(path)
+    _tokenizer().save_pretrained(path)
+    return SentenceTransformer(
+        modules=[models.Transformer(path), models.Pooling(32, "cls"), models.Normalize()],
+        device="cpu",
+    )
+
+
+@pytest.fixture
+def cross_encoder(tmp_path):
+    # Seeded, with wide initial weights so the parity scores are well spread
+    torch.manual_seed(0)
+    path = str(tmp_path / "cross_encoder")
+    BertForSequenceClassification(_config(num_labels=1, initializer_range=0.2)).save_pretrained(path)
+    _tokenizer().save_pretrained(path)
+    return CrossEncoder(path, device="cpu")
+
+
+def test_embedder_export_matches_pytorch(embedder, monkeypatch):
+    monkeypatch.setenv("RAG_ONNX_MIN_COSINE", "0.95")
+
+    onnx_model = onnx_backend.load_onnx_embedding_model(embedder, "tiny/embedder")
+    texts = ["revenue growth", "dividend per share declared"]
+
+    assert onnx_model is not None
+    reference = embedder.encode(texts, normalize_embeddings=True)
+    np.testing.assert_allclose(onnx_model.encode(texts), reference, atol=0.1)
+    assert onnx_model.encode("revenue").shape == (32,)
+
+    # Changed weights are exported again instead of reusing the old file
+    with torch.no_grad():
+        embedder[0].auto_model.embeddings.word_embeddings.weight.mul_(1.01)
+
+    onnx_backend.load_onnx_embedding_model(embedder, "tiny/embedder")
+    assert len(os.listdir(onnx_backend._model_dir("tiny/embedder"))) == 2
+
+
+def test_cross_encoder_is_gated_by_parity(cross_encoder, monkeypatch):
+    monkeypatch.setenv("RAG_ONNX_SCORE_TOLERANCE", "10")
+    onnx_model = onnx_backend.load_onnx_cross_encoder(cross_encoder, "tiny/reranker")
+
+    assert onnx_model is not None
+    pairs = [["revenue growth?", "revenue grew 15%."], ["risks?", "wage inflation."]]
+    assert onnx_model.predict(pairs).shape == (2,)
+
+    # The pre-tokenized reranker path runs on the same session
+    tokens = RerankTokenizer(onnx_model)
+    scored = tokens.score([(tokens.query_ids(q), tokens.document_ids([d])[0]) for q, d in pairs])
+    np.testing.assert_allclose(scored, onnx_model.predict(pairs), atol=1e-5)
+
+    monkeypatch.setenv("RAG_ONNX_SCORE_TOLERANCE", "0")
+    assert onnx_backend.load_onnx_cross_encoder(cross_encoder, "tiny/reranker") is None
+
+
+def test_failed_export_leaves_no_file_behind(embedder, monkeypatch):
+    from onnxruntime import quantization
+
+    def fail(_float_path, scratch, **_kwargs):
+        with open(scratch, "wb") as f:
+            f.write(b"half a model")
+        raise RuntimeError("out of disk")
+
+    monkeypatch.setattr(quantization, "quantize_dynamic", fail)
+
+    with pytest.raises(RuntimeError):
+        onnx_backend.load_onnx_embedding_model(embedder, "tiny/embedder")
+
+    assert os.listdir(onnx_backend._model_dir("tiny/embedder")) == []
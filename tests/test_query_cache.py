@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+
+from retrieval.query_cache import QueryEmbeddingCache
+from utils.lru_cache import LRUCache
+
+
+def test_lru_cache_evicts_oldest_and_counts():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=4, ttl_seconds=10)
+    cache.put("a", 1)
+
+    now[0] += 11
+
+    assert cache.get("a") is None
+
+
+def test_query_cache_normalizes_queries():
+    cache = QueryEmbeddingCache(max_size=4)
+    cache.put("bge", "What is  Revenue? ", np.ones(3))
+
+    assert np.allclose(cache.get("bge", "what is revenue?"), 1.0)
+
+
+def test_query_cache_invalidated_on_model_change():
+    cache = QueryEmbeddingCache(max_size=4)
+    cache.put("bge", "revenue", np.ones(3))
+
+    assert cache.get("minilm", "revenue") is None
+    assert cache.get("bge", "revenue") is None
@@ -0,0 +1,76 @@
+import pytest
+
+from retrieval import reranker as reranker_module
+from retrieval.rerank_cache import RerankScoreCache
+
+
+class _CountingCrossEncoder:
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs):
+        self.pairs.extend(pairs)
+        return [float(len(text)) for _query, text in pairs]
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    model = _CountingCrossEncoder()
+    monkeypatch.setattr(reranker_module, "get_cross_encoder", lambda _name: model)
+    monkeypatch.setattr(reranker_module, "get_rerank_cache", lambda: RerankScoreCache(max_size=64))
+    monkeypatch.setattr(reranker_module, "get_rerank_tokenizer", lambda _name: None)
+    return reranker_module.Reranker()
+
+
+def _results(doc_id, texts):
+    return [
+        {"doc_id": doc_id, "chunk_id": f"chunk_{i:03d}", "section": "S", "chunk_text": text}
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_only_uncached_pairs_reach_the_model(reranker):
+    first = reranker.rerank("What is revenue?", _results("fy24", ["a", "bbb"]), top_k=2)
+    assert len(reranker.model.pairs) == 2
+
+    again = reranker.rerank("  what is REVENUE? ", _results("fy24", ["a", "bbb", "cc"]), top_k=3)
+
+    assert len(reranker.model.pairs) == 3
+    assert [r["chunk_id"] for r in first] == ["chunk_001", "chunk_000"]
+    assert [r["chunk_id"] for r in again] == ["chunk_001", "chunk_002", "chunk_000"]
+
+    # Same chunk id in another document is a different pair
+    reranker.rerank("What is revenue?", _results("fy25", ["a"]))
+    assert len(reranker.model.pairs) == 4
+
+
+def test_replaced_document_scores_are_invalidated(reranker):
+    reranker.rerank("q", _results("fy24", ["old text"]))
+
+    assert reranker.score_cache.invalidate_document("fy24") == 1
+
+    reranked = reranker.rerank("q", _results("fy24", ["new"]))
+
+    assert reranked[0]["rerank_score"] == len("S: new")
+    assert len(reranker.model.pairs) == 2
+
+
+def test_cached_chunk_hits_are_keyed_without_decoding_their_text(reranker, monkeypatch):
+    from retrieval.chunk_store import ChunkHit, ChunkStore
+
+    store = ChunkStore.from_records(_results("fy24", ["a", "bbb"]))
+    reranker.rerank("q", [ChunkHit(store, row) for row in range(2)])
+
+    decoded = []
+    real_text = ChunkStore.text
+    monkeypatch.setattr(ChunkStore, "text", lambda self, row: decoded.append(row) or real_text(self, row))
+
+    reranked = reranker.rerank("q", [ChunkHit(store, row) for row in range(2)])
+
+    assert [r["rerank_score"] for r in reranked] == [len("S: bbb"), len("S: a")]
+    assert decoded == [] and len(reranker.model.pairs) == 2
+
+    # Same ids, new content: a different key
+    replaced = ChunkStore.from_records(_results("fy24", ["cc", "bbb"]))
+    reranker.rerank("q", [ChunkHit(replaced, row) for row in range(2)])
+    assert len(reranker.model.pairs) == 3
@@ -0,0 +1,85 @@
+import pytest
+
+from retrieval.rerank_cascade import RerankCascade
+
+
+class _ScoringReranker:
+    """Cross-encoder stand-in: rerank score is stored on the candidate."""
+
+    def __init__(self):
+        self.calls = []
+
+    def rerank(self, _query, results, top_k=10):
+        self.calls.append(len(results))
+        for r in results:
+            r["rerank_score"] = r["true_score"]
+        return sorted(results, key=lambda r: r["rerank_score"], reverse=True)[:top_k]
+
+
+def _candidates(scores, true_scores=None):
+    true_scores = true_scores or list(range(len(scores), 0, -1))
+    return [
+        {"chunk_id": f"chunk_{i:03d}", "score": score, "true_score": true}
+        for i, (score, true) in enumerate(zip(scores, true_scores))
+    ]
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setenv("RAG_CASCADE_STAGE_SIZE", "4")
+    return RerankCascade(max_context_chunks=2, min_retriever_score=0.3)
+
+
+def test_refusal_bound_query_skips_cross_encoder(cascade):
+    reranker = _ScoringReranker()
+
+    ranked, decisions = cascade.run("q", _candidates([0.2, 0.1]), reranker)
+
+    assert ranked == []
+    assert reranker.calls == []
+    assert decisions["skipped"] and decisions["prefiltered"] == 2
+
+
+def test_dominant_top_hit_shrinks_prefix(cascade):
+    reranker = _ScoringReranker()
+
+    ranked, decisions = cascade.run("q", _candidates([0.9, 0.6, 0.55, 0.5, 0.2]), reranker)
+
+    assert decisions["dominant_top_hit"] and decisions["prefix"] == 2
+    assert decisions["prefiltered"] == 1
+    assert reranker.calls == [2]
+    assert [r["chunk_id"] for r in ranked] == ["chunk_000", "chunk_001"]
+
+
+def test_stops_once_top_chunks_are_settled(cascade):
+    reranker = _ScoringReranker()
+    scores = [0.8 - 0.01 * i for i in range(12)]
+
+    ranked, decisions = cascade.run("q", _candidates(scores), reranker, top_k=3)
+
+    assert reranker.calls == [4, 4]
+    assert decisions["early_stop"] and decisions["reranked"] == 8
+    assert [r["chunk_id"] for r in ranked] == ["chunk_000", "chunk_001", "chunk_002"]
+
+
+def test_late_strong_candidate_keeps_cascade_going(cascade):
+    reranker = _ScoringReranker()
+    true_scores = [5, 4, 3, 2, 9, 1, 1, 1, 1, 1, 1, 1]
+
+    ranked, decisions = cascade.run("q", _candidates([0.8] * 12, true_scores), reranker)
+
+    assert reranker.calls == [4, 4, 4]
+    assert not decisions["early_stop"]
+    assert ranked[0]["chunk_id"] == "chunk_004"
+
+
+def test_default_stages_stop_early_on_a_fused_top_15(monkeypatch):
+    monkeypatch.delenv("RAG_CASCADE_STAGE_SIZE", raising=False)
+    reranker = _ScoringReranker()
+    cascade = RerankCascade(max_context_chunks=5, min_retriever_score=0.15)
+
+    ranked, decisions = cascade.run("q", _candidates([0.7 - 0.01 * i for i in range(15)]), reranker)
+
+    assert reranker.calls == [5, 5]
+    assert decisions["early_stop"] and decisions["reranked"] == 10
+    assert [r["chunk_id"] for r in ranked[:5]] == [f"chunk_{i:03d}" for i in range(5)]
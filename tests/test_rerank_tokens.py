@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+import torch
+from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors
+from transformers import BertConfig, BertForSequenceClassification, PreTrainedTokenizerFast
+
+from retrieval import reranker as reranker_module
+from retrieval.chunk_store import ChunkHit, ChunkStore
+from retrieval.rerank_cache import RerankScoreCache
+from retrieval.rerank_tokens import RerankTokenizer, rerank_document_text
+
+WORDS = "what was revenue growth ? results risks : grew fell 15 % to 1 , 200 crore . the margin".split()
+
+
+def _bert_tokenizer():
+    vocab = {token: i for i, token in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]"] + WORDS)}
+    backend = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    backend.normalizer = normalizers.BertNormalizer(lowercase=True)
+    backend.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    backend.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)],
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="[UNK]",
+        pad_token="[PAD]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+        model_input_names=["input_ids", "token_type_ids", "attention_mask"],
+    )
+
+
+class _TinyCrossEncoder:
+    """CrossEncoder stand-in that scores text pairs the way predict() does."""
+
+    def __init__(self):
+        torch.manual_seed(0)
+        self.tokenizer = _bert_tokenizer()
+        self.model = BertForSequenceClassification(
+            BertConfig(
+                vocab_size=len(WORDS) + 4,
+                hidden_size=16,
+                num_hidden_layers=1,
+                num_attention_heads=2,
+                intermediate_size=32,
+                num_labels=1,
+            )
+        ).eval()
+        self.max_length = 64
+        self.default_activation_function = torch.nn.Sigmoid()
+        self.predicted_pairs = 0
+
+    def predict(self, pairs):
+        self.predicted_pairs += len(pairs)
+        features = self.tokenizer(
+            [q for q, _d in pairs],
+            [d for _q, d in pairs],
+            padding=True,
+            truncation="longest_first",
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        with torch.inference_mode():
+            return self.default_activation_function(self.model(**features).logits)[:, 0].numpy()
+
+
+RECORDS = [
+    {"chunk_id": "chunk_001", "section": "Results", "chunk_text": "revenue grew 15 % to 1,200 crore."},
+    {"chunk_id": "chunk_002", "section": "Risks", "chunk_text": "the margin fell."},
+]
+
+
+@pytest.fixture
+def cross_encoder():
+    return _TinyCrossEncoder()
+
+
+def test_token_pairs_match_tokenizer_pair_encoding(cross_encoder):
+    tokens = RerankTokenizer(cross_encoder)
+    document = rerank_document_text(RECORDS[0])
+
+    ids, type_ids = tokens.pair_inputs(tokens.query_ids("What was revenue?"), tokens.document_ids([document])[0])
+    expected = cross_encoder.tokenizer("What was revenue?", document)
+
+    assert tokens.supported
+    assert ids == expected["input_ids"]
+    assert type_ids == expected["token_type_ids"]
+
+
+def test_pretokenized_scores_match_text_scores(cross_encoder, monkeypatch):
+    tokens = RerankTokenizer(cross_encoder)
+    monkeypatch.setattr(reranker_module, "get_cross_encoder", lambda _name: cross_encoder)
+    monkeypatch.setattr(reranker_module, "get_rerank_cache", lambda: RerankScoreCache(max_size=8))
+    monkeypatch.setattr(reranker_module, "get_rerank_tokenizer", lambda _name: tokens)
+    monkeypatch.setattr(reranker_module, "batching_enabled", lambda: False)
+
+    records = [
+        {**meta, "rerank_token_ids": ids}
+        for meta, ids in zip(RECORDS, tokens.document_ids(rerank_document_text(m) for m in RECORDS))
+    ]
+    store = ChunkStore.from_records(records)
+    hits = [ChunkHit(store, row, score=0.5) for row in range(len(store))]
+
+    reranked = reranker_module.Reranker().rerank("what was revenue growth?", hits)
+    expected = cross_encoder.predict([["what was revenue growth?", rerank_document_text(m)] for m in RECORDS])
+
+    assert cross_encoder.predicted_pairs == 2  # only the reference call above
+    np.testing.assert_allclose(
+        [hit["rerank_score"] for hit in sorted(reranked, key=lambda hit: hit.row)], expected, atol=1e-5
+    )
+
+
+def test_unsupported_pair_format_is_detected(cross_encoder):
+    cross_encoder.tokenizer.cls_token = None
+
+    assert not RerankTokenizer(cross_encoder).supported
@@ -0,0 +1,129 @@
+import faiss
+import numpy as np
+import pytest
+
+from retrieval import retriever as retriever_module
+from retrieval.bm25 import BM25Index
+from retrieval.chunk_store import ChunkStore
+from retrieval.index_factory import write_index
+from retrieval.query_cache import QueryEmbeddingCache
+from retrieval.retriever import Retriever
+
+VOCAB = ["revenue", "margin", "risk", "vision", "employees", "dividend"]
+
+
+class _BagOfWordsModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, normalize_embeddings=True, **_kwargs):
+        self.calls.append(list(texts))
+        vectors = np.array(
+            [[float(word in text.lower()) for word in VOCAB] for text in texts],
+            dtype=np.float32,
+        ) + 0.01
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = _BagOfWordsModel()
+    monkeypatch.setattr(retriever_module, "get_embedding_model", lambda _name: fake)
+    monkeypatch.setattr(retriever_module, "get_query_cache", lambda: QueryEmbeddingCache(max_size=16))
+    return fake
+
+
+@pytest.fixture
+def corpus(model):
+    texts = [
+        "Revenue grew 15 percent",
+        "Operating margin improved",
+        "Key risk factors",
+        "Our vision for 6G",
+        "Employees and culture",
+        "Dividend policy",
+    ]
+    metadata = [
+        {
+            "chunk_id": f"chunk_{i:03d}",
+            "section": "Section",
+            "pages": [i + 1],
+            "tables": [],
+            "images": [],
+            "chunk_text": text,
+        }
+        for i, text in enumerate(texts)
+    ]
+    embeddings = model.encode(texts)
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    model.calls.clear()
+    return index, metadata
+
+
+def test_retrieve_returns_best_chunk_first(corpus):
+    index, metadata = corpus
+    retriever = Retriever(index_object=index, metadata_object=metadata, initial_top_k=3)
+
+    results = retriever.retrieve("What was revenue?")
+
+    assert len(results) == 3
+    assert results[0]["chunk_id"] == "chunk_000"
+    assert results[0]["chunk_text"] == "Revenue grew 15 percent"
+
+
+def test_retrieve_many_batches_and_matches_single_queries(corpus, model):
+    index, metadata = corpus
+    retriever = Retriever(index_object=index, metadata_object=metadata, initial_top_k=2)
+    queries = ["revenue growth", "dividend payout", "risk outlook"]
+
+    batched = retriever.retrieve_many(queries)
+
+    assert model.calls == [queries]
+    assert [r[0]["chunk_id"] for r in batched] == ["chunk_000", "chunk_005", "chunk_002"]
+    assert batched == [retriever.retrieve(q) for q in queries]
+
+
+def test_repeated_queries_hit_the_query_cache(corpus, model):
+    index, metadata = corpus
+    retriever = Retriever(index_object=index, metadata_object=metadata)
+
+    retriever.retrieve("Revenue")
+    retriever.retrieve("  revenue ")
+
+    assert len(model.calls) == 1
+    assert retriever.query_cache.stats()["hits"] == 1
+
+
+def test_disk_mode_reads_memory_mapped_index_and_chunk_store(corpus, tmp_path):
+    index, metadata = corpus
+    index_path = str(tmp_path / "chunks.faiss")
+    meta_path = str(tmp_path / "chunks_meta")
+    write_index(index, index_path, {"type": "flat"})
+    ChunkStore.from_records(metadata).save(meta_path)
+
+    retriever = Retriever(index_path=index_path, meta_path=meta_path, initial_top_k=2)
+
+    assert isinstance(retriever.meta, ChunkStore)
+    assert retriever.retrieve("dividend")[0]["chunk_id"] == "chunk_005"
+
+
+def test_hybrid_retrieval_surfaces_exact_term_matches(corpus):
+    index, metadata = corpus
+    metadata[2]["chunk_text"] = "Key risk factors for INFY"
+    bm25 = BM25Index.from_texts([meta["chunk_text"] for meta in metadata])
+    retriever = Retriever(
+        index_object=index,
+        metadata_object=metadata,
+        initial_top_k=1,
+        lexical_index=bm25,
+        fused_top_k=2,
+    )
+
+    results = {r["chunk_id"]: r for r in retriever.retrieve("INFY exposure")}
+
+    # "INFY" is invisible to the dense model but an exact lexical match
+    assert len(results) == 2
+    assert results["chunk_002"]["bm25_score"] > 0
+    assert results["chunk_002"]["score"] is not None
+    assert all("fusion_score" in r for r in results.values())
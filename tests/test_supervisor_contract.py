@@ -1,12 +1,32 @@
-﻿import json
+﻿import asyncio
+import json
+import threading
 
 import pytest
 
 from agent.supervisor import AgentSupervisor
 
 
-class _DummyRetriever:
-    def retrieve(self, _query):
+class _DummyStore:
+    def snapshot(self):
+        return self
+
+    def __len__(self):
+        return 1
+
+    def tables(self, _doc_id):
+        return []
+
+    def document_ids(self):
+        return ["default"]
+
+    def table_texts(self, _doc_id, _table_ids):
+        return []
+
+    def encode_query(self, _query):
+        return None
+
+    def retrieve(self, _query, doc_ids=None):
         return [
             {
                 "score": 0.9,
@@ -29,9 +49,7 @@ class _DummyReranker:
 def supervisor(monkeypatch):
     monkeypatch.setattr("agent.supervisor.Reranker", lambda: _DummyReranker())
     sup = AgentSupervisor()
-    sup.retriever = _DummyRetriever()
-    sup.tables_raw = []
-    sup.doc_loaded = True
+    sup.store = _DummyStore()
     return sup
 
 
@@ -76,3 +94,77 @@ def test_action_output_contract(supervisor, monkeypatch):
 
     assert "issue_summary" not in output
     assert output["description"] == "VPN not working"
+
+
+def test_streaming_output_contract(supervisor, monkeypatch):
+    monkeypatch.setattr("agent.supervisor.classify_intent", lambda _q: "INFORMATION")
+    monkeypatch.setattr(
+        supervisor.generation_client,
+        "generate_stream",
+        lambda _prompt: iter(["This is ", "a grounded ", "answer."]),
+    )
+
+    events = list(supervisor.handle_stream("What is in the report?"))
+
+    assert [event for event, _payload in events] == ["token", "token", "token", "done"]
+    assert "".join(payload for event, payload in events if event == "token") == "This is a grounded answer."
+    assert events[-1][1]["answer"] == "This is a grounded answer."
+
+
+def test_streamed_refusal_is_not_emitted_as_tokens(supervisor, monkeypatch):
+    monkeypatch.setattr("agent.supervisor.classify_intent", lambda _q: "INFORMATION")
+    monkeypatch.setattr(
+        supervisor.generation_client,
+        "generate_stream",
+        lambda _prompt: iter(["Information not ", "found in the document."]),
+    )
+
+    events = list(supervisor.handle_stream("What is the CEO's salary?"))
+
+    assert events == [("done", {"type": "information", "answer": "Information not found in the document."})]
+
+
+def test_async_output_contract(supervisor, monkeypatch):
+    monkeypatch.setattr("agent.supervisor.classify_intent", lambda _q: "INFORMATION")
+
+    async def agenerate(_prompt):
+        return "This is a grounded answer."
+
+    monkeypatch.setattr(supervisor.generation_client, "agenerate", agenerate)
+
+    output = asyncio.run(supervisor.ahandle("What is in the report?"))
+
+    assert output == {"type": "information", "answer": "This is a grounded answer.", "cached": False}
+
+
+def test_debug_timings_block(supervisor, monkeypatch):
+    monkeypatch.setattr("agent.supervisor.classify_intent", lambda _q: "INFORMATION")
+    monkeypatch.setattr(supervisor.hf_client, "generate", lambda _prompt: "This is a grounded answer.")
+    supervisor.debug_timings = True
+
+    output = supervisor.handle("What is in the report?")
+    stages = [span["stage"] for span in output["timings"]["stages"]]
+
+    assert stages[0] == "intent"
+    assert stages[-1] == "generate"
+    assert {"rerank", "context_build", "context_pack", "prompt_build"} <= set(stages)
+    assert output["timings"]["total_ms"] >= sum(span["ms"] for span in output["timings"]["stages"]) * 0.99
+
+
+def test_async_intent_fallback_stays_off_the_cpu_pool(supervisor, monkeypatch):
+    threads = {}
+
+    def local_intent(_query):
+        threads["local"] = threading.current_thread().name
+        return "INFORMATION", True
+
+    async def allm_intent(_query):
+        threads["llm"] = threading.current_thread().name
+        return "ACTION"
+
+    monkeypatch.setattr("agent.supervisor.local_intent", local_intent)
+    monkeypatch.setattr("agent.supervisor.allm_intent", allm_intent)
+
+    assert asyncio.run(supervisor._aclassify("Printer broken?")) == "ACTION"
+    assert threads["local"].startswith("rag-cpu")
+    assert not threads["llm"].startswith("rag-cpu")
@@ -0,0 +1,17 @@
+from ingestion.table_processor import render_table_text
+
+
+def test_structured_tables_render_one_line_per_row():
+    table = {
+        "table_type": "structured",
+        "table_html": "<table><tr><th>Year</th><th>Revenue</th></tr><tr><td>FY24</td><td>1,200 &amp; up</td></tr></table>",
+    }
+
+    assert render_table_text(table) == "Year | Revenue\nFY24 | 1,200 & up"
+
+
+def test_structured_tables_without_cells_keep_their_text():
+    assert render_table_text({"table_type": "structured", "table_html": None}) == ""
+
+    table = {"table_type": "structured", "table_html": "<div>Revenue 1,200</div><p>FY24</p>"}
+    assert render_table_text(table) == "Revenue 1,200 FY24"
@@ -0,0 +1,62 @@
+import asyncio
+
+from utils import tracing
+
+
+def test_spans_join_the_active_trace_and_feed_the_histogram():
+    with tracing.trace("test_query") as trace:
+        with tracing.span("embed", queries=1):
+            pass
+
+        with tracing.span("generate"):
+            tracing.count_retry()
+            tracing.count_retry()
+
+        with tracing.trace("nested") as nested:
+            with tracing.span("rerank"):
+                pass
+
+    assert nested is trace
+    assert [span["stage"] for span in trace.spans] == ["embed", "generate", "rerank"]
+    assert trace.spans[0]["queries"] == 1
+    assert trace.spans[1]["retries"] == 2
+    assert trace.timings()["total_ms"] >= 0
+
+    metrics = tracing.REGISTRY.render()
+
+    assert 'rag_stage_duration_seconds_count{path="test_query",stage="embed"} 1' in metrics
+    assert 'rag_stage_duration_seconds_bucket{path="test_query",stage="total",le="+Inf"} 1' in metrics
+    assert 'rag_llm_retries_total{path="test_query"} 2' in metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = tracing.Histogram("h_seconds", "help", labels=("stage",), buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage='a"b')
+
+    assert histogram.render()[2:] == [
+        'h_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+        'h_seconds_bucket{stage="a\\"b",le="1.0"} 2',
+        'h_seconds_bucket{stage="a\\"b",le="+Inf"} 3',
+        'h_seconds_sum{stage="a\\"b"} 5.55',
+        'h_seconds_count{stage="a\\"b"} 3',
+    ]
+
+
+def test_traces_are_isolated_between_concurrent_tasks():
+    async def request(name):
+        with tracing.trace(name) as trace:
+            await asyncio.sleep(0.01)
+            with tracing.span(name):
+                await asyncio.sleep(0.01)
+        return trace
+
+    async def main():
+        return await asyncio.gather(request("a"), request("b"))
+
+    first, second = asyncio.run(main())
+
+    assert [span["stage"] for span in first.spans] == ["a"]
+    assert [span["stage"] for span in second.spans] == ["b"]
+    assert tracing.current_trace() is None
@@ -0,0 +1,18 @@
+import hashlib
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    """
+    Short content fingerprint for cache keys.
+    """
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:16]
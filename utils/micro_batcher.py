@@ -0,0 +1,132 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Runs concurrent calls of a batched function as one call.
+
+    Callers submit a list of items and block; a single worker thread collects
+    pending jobs for up to max_wait_ms (or until max_batch_size items are
+    queued), calls fn once on the concatenated items and hands each caller
+    its slice of the output. Jobs are only merged when their keyword
+    arguments are identical. Jobs at least max_batch_size long run directly
+    on the caller's thread.
+    """
+
+    def __init__(self, fn, max_batch_size: int = 64, max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self.batches = 0
+        self.items = 0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, items, **kwargs):
+        items = list(items)
+
+        if not items or len(items) >= self.max_batch_size:
+            return self.fn(items, **kwargs)
+
+        try:
+            key = tuple(sorted(kwargs.items()))
+            hash(key)
+        except TypeError:
+            return self.fn(items, **kwargs)
+
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((key, kwargs, items, future))
+
+        return future.result()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork (e.g. preloading WSGI servers)
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            return
+
+        with self._lock:
+            if self._worker is None or self._pid != os.getpid() or not self._worker.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self, carried):
+        first = carried.pop(0) if carried else self._queue.get()
+        batch = [first]
+        size = len(first[2])
+        deadline = time.monotonic() + self.max_wait
+
+        # Jobs held back from an earlier batch go first
+        for job in list(carried):
+            if job[0] == first[0] and size + len(job[2]) <= self.max_batch_size:
+                carried.remove(job)
+                batch.append(job)
+                size += len(job[2])
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+
+            if timeout <= 0:
+                break
+
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if job[0] != first[0]:
+                carried.append(job)
+                continue
+
+            if size + len(job[2]) > self.max_batch_size:
+                carried.append(job)
+                break
+
+            batch.append(job)
+            size += len(job[2])
+
+        return batch
+
+    def _run(self):
+        carried = []
+
+        while True:
+            batch = self._collect(carried)
+            items = [item for _key, _kwargs, job_items, _future in batch for item in job_items]
+
+            try:
+                outputs = self.fn(items, **batch[0][1])
+            except BaseException as exc:
+                for _key, _kwargs, _items, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+
+            start = 0
+            for _key, _kwargs, job_items, future in batch:
+                end = start + len(job_items)
+                future.set_result(outputs[start:end])
+                start = end
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
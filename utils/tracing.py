@@ -0,0 +1,260 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans range from sub-millisecond lookups to multi-minute PDF parses
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def timings_enabled() -> bool:
+    """
+    RAG_DEBUG_TIMINGS: add a `timings` block to chat and upload responses.
+    """
+    return os.getenv("RAG_DEBUG_TIMINGS", "").strip().lower() in {
+        "1", "true", "yes", "on"
+    }
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+
+    if not pairs:
+        return ""
+
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Histogram:
+    """
+    Labelled cumulative histogram in the Prometheus text format.
+    """
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds",
+    "Wall time of each query / upload pipeline stage.",
+    labels=("path", "stage"),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "rag_llm_retries_total",
+    "LLM generation attempts beyond the first.",
+    labels=("path",),
+)
+EMBEDDING_CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_embedding_cache_lookups_total",
+    "Chunk embedding cache lookups, by result (hit / miss).",
+    labels=("path", "result"),
+)
+
+
+class Trace:
+    """
+    Spans of one query or upload. Every finished span is observed in
+    STAGE_SECONDS and kept here for the optional `timings` block.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.spans = []
+        self.started = time.perf_counter()
+        self.total = None
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, **attrs):
+        STAGE_SECONDS.observe(seconds, path=self.path, stage=stage)
+
+        with self._lock:
+            self.spans.append({"stage": stage, "ms": round(seconds * 1000.0, 2), **attrs})
+
+    @contextmanager
+    def active(self):
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self):
+        if self.total is None:
+            self.total = time.perf_counter() - self.started
+            STAGE_SECONDS.observe(self.total, path=self.path, stage="total")
+        return self
+
+    def timings(self):
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+
+        with self._lock:
+            return {"total_ms": round(total * 1000.0, 2), "stages": [dict(span) for span in self.spans]}
+
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+_current_span = contextvars.ContextVar("rag_span", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(path):
+    """
+    Trace a query or upload. Nested calls join the enclosing trace.
+    """
+    existing = _current_trace.get()
+
+    if existing is not None:
+        yield existing
+        return
+
+    current = Trace(path)
+
+    with current.active():
+        try:
+            yield current
+        finally:
+            current.finish()
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Time a pipeline stage. Outside a trace it still feeds the
+    histogram, under path="untraced".
+    """
+    attrs = dict(attrs)
+    token = _current_span.set(attrs)
+    started = time.perf_counter()
+
+    try:
+        yield attrs
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_span.reset(token)
+        current = _current_trace.get()
+
+        if current is not None:
+            current.record(stage, elapsed, **attrs)
+        else:
+            STAGE_SECONDS.observe(elapsed, path="untraced", stage=stage)
+
+
+def annotate(**attrs):
+    """
+    Attach attributes to the innermost open span.
+    """
+    attrs_of_span = _current_span.get()
+
+    if attrs_of_span is not None:
+        attrs_of_span.update(attrs)
+
+
+def count_embedding_lookups(hits, misses):
+    """
+    Called by encode_texts once per batch; also annotates the open span.
+    """
+    current = _current_trace.get()
+    path = current.path if current is not None else "untraced"
+
+    EMBEDDING_CACHE_LOOKUPS.inc(hits, path=path, result="hit")
+    EMBEDDING_CACHE_LOOKUPS.inc(misses, path=path, result="miss")
+    annotate(cache_hits=hits, encoded=misses)
+
+
+def count_retry():
+    """
+    Called by LLM clients before every attempt after the first.
+    """
+    current = _current_trace.get()
+    LLM_RETRIES.inc(path=current.path if current is not None else "untraced")
+
+    attrs_of_span = _current_span.get()
+
+    if attrs_of_span is not None:
+        attrs_of_span["retries"] = attrs_of_span.get("retries", 0) + 1
@@ -1,12 +1,18 @@
+import json
 import os
 import tempfile
 import traceback
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from werkzeug.exceptions import RequestEntityTooLarge
 
+from agent.intent_classifier import get_intent_classifier, intent_mode
 from agent.supervisor import AgentSupervisor
 from ingestion.runtime_ingestion import ingest_pdf_to_runtime
+from llm.token_counter import get_token_counter
+from retrieval.model_registry import warmup_enabled, warmup_models
+from utils import tracing
+from utils.helpers import file_sha256
 
 
 app = Flask(__name__)
@@ -16,6 +22,18 @@ app.config["MAX_CONTENT_LENGTH"] = 20 * 1024 * 1024
 
 agent = AgentSupervisor()
 
+# Load shared embedder + reranker once per worker, before the first request
+if warmup_enabled():
+    warmup_models()
+    # Prompt-budget tokenizer; queries only read it from the local cache
+    get_token_counter(download=True)
+    if intent_mode() == "local":
+        get_intent_classifier()
+
+# Reload documents persisted by earlier runs / other workers
+if os.getenv("RAG_RESTORE_DOCUMENTS", "").strip().lower() in {"1", "true", "yes", "on"}:
+    agent.restore_documents(limit=int(os.getenv("RAG_RESTORE_MAX_DOCUMENTS", "20")))
+
 
 # =========================================================
 # ERROR HANDLERS
@@ -64,6 +82,46 @@ def home():
     })
 
 
+# =========================================================
+# METRICS
+# =========================================================
+
+@app.route("/metrics")
+def metrics():
+
+    # Prometheus text format: per-stage latency histograms of this worker
+    return Response(tracing.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _with_timings(data, trace):
+
+    if tracing.timings_enabled():
+        data["timings"] = trace.timings()
+
+    return data
+
+
+def valid_document_ids(document_ids):
+
+    # One id, "all", or a list of ids; anything else is a client error
+    if document_ids is None or isinstance(document_ids, str):
+        return True
+
+    return isinstance(document_ids, list) and all(isinstance(d, str) for d in document_ids)
+
+
+INVALID_DOCUMENT_IDS = {
+
+    "success": False,
+
+    "error": {
+        "code": "INVALID_REQUEST",
+        "message": "document_ids must be a document id, a list of ids or \"all\""
+    }
+
+}
+
+
 # =========================================================
 # CHAT
 # =========================================================
@@ -88,12 +146,20 @@ def chat():
 
     is_legacy = request.path == "/chat"
 
+    # One id, a list of ids, or "all"; defaults to the latest upload
+    document_ids = data.get("document_ids", data.get("document_id"))
+
+    if not valid_document_ids(document_ids):
+
+        return jsonify(INVALID_DOCUMENT_IDS), 400
+
 
     # -----------------------------------------
     # NO DOCUMENT
     # -----------------------------------------
 
-    if not agent.has_active_document():
+    # Explicit ids may still be loaded from persisted storage by the agent
+    if not document_ids and not agent.has_active_document():
 
         # pytest expects this exact format
         if is_legacy:
@@ -128,7 +194,7 @@ def chat():
     # HANDLE QUERY
     # -----------------------------------------
 
-    response = agent.handle(query)
+    response = agent.handle(query, document_ids=document_ids)
 
 
     if is_legacy:
@@ -149,6 +215,84 @@ def chat():
     }), 200
 
 
+def _sse(event, payload):
+
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.route("/api/v1/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Server-Sent Events: `token` events ({"text": ...}) while the answer is
+    generated, then one `done` event with the same body /api/v1/chat returns.
+    """
+
+    data = request.get_json() or {}
+    query = data.get("query", "").strip()
+
+    if not query:
+
+        return jsonify({
+            "success": False,
+            "error": {
+                "code": "EMPTY_QUERY",
+                "message": "Query cannot be empty"
+            }
+        }), 400
+
+
+    document_ids = data.get("document_ids", data.get("document_id"))
+
+    if not valid_document_ids(document_ids):
+
+        return jsonify(INVALID_DOCUMENT_IDS), 400
+
+    if not document_ids and not agent.has_active_document():
+
+        return jsonify({
+
+            "success": False,
+
+            "error": {
+                "code": "DOCUMENT_NOT_READY",
+                "message": "Please upload a PDF first."
+            }
+
+        }), 409
+
+
+    def events():
+
+        try:
+            for event, payload in agent.handle_stream(query, document_ids=document_ids):
+
+                if event == "token":
+                    yield _sse("token", {"text": payload})
+                else:
+                    yield _sse("done", {"success": True, "data": payload})
+
+        except Exception:
+            traceback.print_exc()
+            yield _sse("error", {
+                "success": False,
+                "error": {
+                    "code": "INTERNAL_ERROR",
+                    "message": "Internal server error"
+                }
+            })
+
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Keep reverse proxies from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 # =========================================================
 # UPLOAD
 # =========================================================
@@ -202,6 +346,24 @@ def upload():
         }), 400
 
 
+    # Optional: append this PDF to an existing document as a supplement
+    append_to = (request.form.get("append_to") or "").strip() or None
+
+
+    if append_to and not agent.has_document(append_to):
+
+        return jsonify({
+
+            "success": False,
+
+            "error": {
+                "code": "DOCUMENT_NOT_FOUND",
+                "message": "Unknown document id"
+            }
+
+        }), 404
+
+
     temp_path = None
 
 
@@ -225,16 +387,62 @@ def upload():
 
 
 
-        runtime_payload = ingest_pdf_to_runtime(temp_path)
+        document_id = file_sha256(temp_path)
+
+
+        with tracing.trace("upload") as upload_trace:
+
+            # Same PDF (by SHA-256) reuses the stored index instead of re-parsing
+            runtime_payload = ingest_pdf_to_runtime(
+
+                temp_path,
+                document_id=document_id,
+                name=file.filename,
+
+            )
+
+
+            with tracing.span("store"):
 
+                if append_to:
 
-        agent.set_active_document(
+                    agent.append_to_document(
 
-            runtime_payload["index"],
-            runtime_payload["metadata"],
-            runtime_payload["tables"],
+                        append_to,
+                        runtime_payload,
+                        supplement_id=document_id,
 
-        )
+                    )
+
+                else:
+
+                    agent.add_document(
+
+                        document_id,
+                        runtime_payload,
+                        name=file.filename,
+
+                    )
+
+
+        if append_to:
+
+            return jsonify({
+
+                "success": True,
+
+                "data": _with_timings({
+
+                    "status": "success",
+                    "filename": file.filename,
+                    "document_id": append_to,
+                    "supplement_id": document_id,
+                    "cached": bool(runtime_payload.get("cached")),
+                    "message": "PDF appended to document."
+
+                }, upload_trace)
+
+            }), 200
 
 
         # pytest expects this exact format
@@ -243,13 +451,15 @@ def upload():
 
             "success": True,
 
-            "data": {
+            "data": _with_timings({
 
                 "status": "success",
                 "filename": file.filename,
+                "document_id": document_id,
+                "cached": bool(runtime_payload.get("cached")),
                 "message": "PDF uploaded and indexed."
 
-            }
+            }, upload_trace)
 
         }), 200
 
@@ -278,6 +488,100 @@ def upload():
             os.remove(temp_path)
 
 
+# =========================================================
+# DOCUMENTS
+# =========================================================
+
+@app.route("/api/v1/documents", methods=["GET"])
+def list_documents():
+
+    return jsonify({
+
+        "success": True,
+
+        "data": {
+            "documents": agent.list_documents()
+        }
+
+    }), 200
+
+
+@app.route("/api/v1/documents/<document_id>", methods=["DELETE"])
+def delete_document(document_id):
+
+    if not agent.remove_document(document_id):
+
+        return jsonify({
+
+            "success": False,
+
+            "error": {
+                "code": "DOCUMENT_NOT_FOUND",
+                "message": "Unknown document id"
+            }
+
+        }), 404
+
+
+    return jsonify({
+
+        "success": True,
+
+        "data": {
+            "document_id": document_id,
+            "status": "deleted"
+        }
+
+    }), 200
+
+
+@app.route("/api/v1/documents/<document_id>/chunks", methods=["DELETE"])
+def delete_chunks(document_id):
+
+    data = request.get_json(silent=True) or {}
+    chunk_ids = data.get("chunk_ids")
+
+
+    if not isinstance(chunk_ids, list) or not chunk_ids:
+
+        return jsonify({
+
+            "success": False,
+
+            "error": {
+                "code": "INVALID_REQUEST",
+                "message": "chunk_ids must be a non-empty list"
+            }
+
+        }), 400
+
+
+    if not agent.has_document(document_id):
+
+        return jsonify({
+
+            "success": False,
+
+            "error": {
+                "code": "DOCUMENT_NOT_FOUND",
+                "message": "Unknown document id"
+            }
+
+        }), 404
+
+
+    return jsonify({
+
+        "success": True,
+
+        "data": {
+            "document_id": document_id,
+            "removed": agent.remove_chunks(document_id, chunk_ids)
+        }
+
+    }), 200
+
+
 # =========================================================
 # RUN
 # =========================================================